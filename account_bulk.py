@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+账号批量导入/导出
+
+导入源可以是 auth.json 文件、包含 JSON 文件的目录、tar/tar.gz 归档，
+或每行一个配置的 NDJSON 流（Web 上传多个文件时使用）。配置在线程池中并行
+校验、解码令牌声明，按 account_id（没有时按邮箱）去重后原子写入 accounts 目录。
+归档按流式读取，同时处理中的配置数量有上限，内存占用与导入数量无关。
+导出把 accounts 目录流式写成 tar.gz。
+"""
+
+import argparse
+import io
+import json
+import os
+import re
+import sys
+import tarfile
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from account_registry import AccountRegistry
+from atomic_io import atomic_write_json
+from config_utils import generate_account_name, get_config_paths
+from jwt_claims import auth_claims
+
+
+# 单个配置文件的大小上限（字节），超出的归档成员直接拒绝
+MAX_CONFIG_BYTES = 1024 * 1024
+DEFAULT_WORKERS = 8
+# 每个工作线程最多排队的配置数
+QUEUE_PER_WORKER = 4
+# 读取导入源时可能出现的错误（文件不存在、归档截断或损坏）
+SOURCE_ERRORS = (OSError, EOFError, tarfile.TarError, zlib.error)
+
+
+def _safe_name(name) -> Optional[str]:
+    if not isinstance(name, str):
+        return None
+    name = re.sub(r'[^a-zA-Z0-9_\-.@]', '_', name.strip()).strip('.')
+    return name or None
+
+
+def iter_tar(fileobj: BinaryIO) -> Iterator[Tuple[str, Optional[bytes]]]:
+    """流式读取 tar/tar.gz 中的 .json 成员，产生 (来源, 内容)；过大的成员内容为 None"""
+    with tarfile.open(fileobj=fileobj, mode='r|*') as tar:
+        for member in tar:
+            if not member.isfile() or not member.name.endswith('.json'):
+                continue
+            if member.size > MAX_CONFIG_BYTES:
+                yield member.name, None
+                continue
+            yield member.name, tar.extractfile(member).read()
+        # 流式读取截断的归档时 tarfile 会静默结束：完整的归档在最后一个成员之后还有全零的结束块
+        if tar.fileobj.read(tarfile.BLOCKSIZE) != tarfile.NUL * tarfile.BLOCKSIZE:
+            raise tarfile.ReadError("归档不完整（文件被截断）")
+
+
+def iter_ndjson(fileobj: BinaryIO) -> Iterator[Tuple[str, Optional[bytes]]]:
+    """逐行读取 NDJSON：每行是一个配置，或 {"source": 文件名, "content": 文件内容}"""
+    for line_no, line in enumerate(fileobj, 1):
+        line = line.strip()
+        if not line:
+            continue
+        source = f"第 {line_no} 行"
+        if len(line) > MAX_CONFIG_BYTES:
+            yield source, None
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            yield source, line
+            continue
+        if isinstance(record, dict) and isinstance(record.get('content'), str):
+            yield str(record.get('source') or source), record['content'].encode('utf-8')
+        else:
+            yield source, line
+
+
+def iter_source(source: str, items: Iterator) -> Iterator[Tuple[str, object]]:
+    """产出 items，读取中途出错时再产生 (来源, 异常) 并结束，已读取的配置照常导入"""
+    try:
+        yield from items
+    except SOURCE_ERRORS as e:
+        yield source, e
+
+
+def iter_paths(paths: Iterable) -> Iterator[Tuple[str, object]]:
+    """展开命令行给出的文件、目录和归档，无法读取的导入源内容为对应的异常"""
+    for path in map(Path, paths):
+        source = str(path)
+        try:
+            if path.is_dir():
+                for child in sorted(path.glob('*.json')):
+                    yield from iter_paths([child])
+            elif path.suffix in ('.jsonl', '.ndjson'):
+                with open(path, 'rb') as f:
+                    yield from iter_source(source, iter_ndjson(f))
+            elif path.suffix != '.json' and tarfile.is_tarfile(path):
+                with open(path, 'rb') as f:
+                    yield from iter_source(source, iter_tar(f))
+            elif path.stat().st_size > MAX_CONFIG_BYTES:
+                yield source, None
+            else:
+                yield source, path.read_bytes()
+        except SOURCE_ERRORS as e:
+            yield source, e
+
+
+def parse_account(item: Tuple[str, Optional[bytes]]) -> Dict:
+    """校验一个配置并解码令牌声明，返回 {source, config, claims} 或 {source, error}"""
+    source, data = item
+    if isinstance(data, Exception):
+        return {'source': source, 'error': f"读取失败: {data}"}
+    if data is None:
+        return {'source': source, 'error': f"超过 {MAX_CONFIG_BYTES // 1024} KB"}
+    try:
+        config = json.loads(data)
+    except (ValueError, json.JSONDecodeError) as e:
+        return {'source': source, 'error': f"JSON 格式错误: {e}"}
+    if not isinstance(config, dict):
+        return {'source': source, 'error': "配置不是 JSON 对象"}
+    tokens = config.get('tokens')
+    if not isinstance(tokens, dict) or not (tokens.get('access_token') or tokens.get('id_token')):
+        return {'source': source, 'error': "缺少 tokens"}
+
+    claims = auth_claims(config)
+    if not claims['account_id'] and not claims['email']:
+        return {'source': source, 'error': "未能从令牌中提取 account_id 或邮箱"}
+    return {'source': source, 'config': config, 'claims': claims}
+
+
+def _identity(account_id, email) -> Optional[str]:
+    if account_id:
+        return f"id:{account_id}"
+    return f"email:{email.lower()}" if email else None
+
+
+def _ordered_map(executor: ThreadPoolExecutor, fn, items: Iterable, window: int) -> Iterator:
+    """按输入顺序产生 fn(item) 的结果，同时提交的任务不超过 window 个"""
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+class AccountImporter:
+    """把一批配置导入 accounts 目录"""
+
+    def __init__(self, accounts_dir=None, overwrite: bool = False, workers: int = DEFAULT_WORKERS):
+        self.accounts_dir = Path(accounts_dir) if accounts_dir else get_config_paths()['accounts_dir']
+        self.overwrite = overwrite
+        self.workers = max(1, workers)
+
+    def _existing_accounts(self) -> Tuple[Dict[str, str], set]:
+        """已保存账号：{身份: 账号名} 和全部账号名（casefold 后）"""
+        by_identity = {}
+        names = set()
+        _, entries = AccountRegistry(self.accounts_dir).list_accounts()
+        for entry in entries:
+            names.add(entry['name'].casefold())
+            identity = _identity(entry.get('account_id'), entry.get('email'))
+            if identity:
+                by_identity.setdefault(identity, entry['name'])
+        return by_identity, names
+
+    def _choose_name(self, parsed: Dict, names: set) -> str:
+        config = parsed['config']
+        base = (_safe_name(config.get('account_name'))
+                or (generate_account_name(parsed['claims']['email']) if parsed['claims']['email'] else None)
+                or _safe_name(Path(parsed['source']).stem)
+                or 'imported')
+        # names 中为 casefold 后的名称：大小写不敏感的文件系统（macOS 默认）上 Work 与 work 是同一个文件
+        name, suffix = base, 2
+        while name.casefold() in names:
+            name = f"{base}_{suffix}"
+            suffix += 1
+        return name
+
+    def _write(self, job: Tuple[str, Dict, str]) -> Tuple[str, str, Optional[str]]:
+        name, config, kind = job
+        try:
+            atomic_write_json(self.accounts_dir / f"{name}.json", config)
+            return name, kind, None
+        except (OSError, IOError, TimeoutError) as e:
+            return name, kind, str(e)
+
+    def run(self, items: Iterable[Tuple[str, Optional[bytes]]]) -> Dict:
+        """导入 (来源, 内容) 序列，返回 {imported, updated, duplicates, errors}"""
+        self.accounts_dir.mkdir(parents=True, exist_ok=True)
+        by_identity, names = self._existing_accounts()
+        seen = set()
+        result = {'imported': 0, 'updated': 0, 'duplicates': 0, 'errors': []}
+        window = self.workers * QUEUE_PER_WORKER
+        saved_at = datetime.now().isoformat()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            writes = deque()
+
+            def collect(future):
+                name, kind, error = future.result()
+                if error:
+                    result['errors'].append({'source': name, 'error': f"写入失败: {error}"})
+                else:
+                    result[kind] += 1
+
+            for parsed in _ordered_map(executor, parse_account, items, window):
+                if 'error' in parsed:
+                    result['errors'].append({'source': parsed['source'], 'error': parsed['error']})
+                    continue
+                claims = parsed['claims']
+                identity = _identity(claims['account_id'], claims['email'])
+                # 同一批中重复的账号只保留第一个
+                if identity in seen:
+                    result['duplicates'] += 1
+                    continue
+                seen.add(identity)
+
+                if identity in by_identity:
+                    if not self.overwrite:
+                        result['duplicates'] += 1
+                        continue
+                    name, kind = by_identity[identity], 'updated'
+                else:
+                    name, kind = self._choose_name(parsed, names), 'imported'
+                    names.add(name.casefold())
+
+                config = dict(parsed['config'], saved_at=saved_at, account_name=name)
+                if claims['email']:
+                    config['email'] = claims['email']
+                writes.append(executor.submit(self._write, (name, config, kind)))
+                if len(writes) >= window:
+                    collect(writes.popleft())
+            while writes:
+                collect(writes.popleft())
+
+        return result
+
+
+def export_accounts(fileobj: BinaryIO, accounts_dir=None, names: List[str] = None) -> int:
+    """把账号配置流式写成 tar.gz（每个账号一个 <名称>.json），返回导出的账号数"""
+    accounts_dir = Path(accounts_dir) if accounts_dir else get_config_paths()['accounts_dir']
+    wanted = set(names) if names else None
+    count = 0
+    with tarfile.open(fileobj=fileobj, mode='w|gz') as tar:
+        _, entries = AccountRegistry(accounts_dir).list_accounts()
+        for entry in entries:
+            if entry.get('error') or (wanted is not None and entry['name'] not in wanted):
+                continue
+            path = accounts_dir / f"{entry['name']}.json"
+            try:
+                data = path.read_bytes()
+                mtime = path.stat().st_mtime
+            except OSError:
+                continue
+            info = tarfile.TarInfo(f"{entry['name']}.json")
+            info.size = len(data)
+            info.mtime = int(mtime)
+            info.mode = 0o600
+            tar.addfile(info, io.BytesIO(data))
+            count += 1
+    return count
+
+
+def format_import_result(result: Dict) -> str:
+    return (f"新增 {result['imported']} 个，更新 {result['updated']} 个，"
+            f"跳过重复 {result['duplicates']} 个，失败 {len(result['errors'])} 个")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="账号批量导入/导出",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例:
+  python account_bulk.py import ~/exports/          # 导入目录下的全部 *.json
+  python account_bulk.py import accounts.tar.gz     # 导入归档
+  python account_bulk.py import a.json b.json --overwrite
+  python account_bulk.py export accounts.tar.gz     # 导出全部账号
+  python account_bulk.py export - > accounts.tar.gz # 导出到标准输出
+        """
+    )
+    subparsers = parser.add_subparsers(dest='command')
+    import_parser = subparsers.add_parser('import', help='导入 auth.json 文件、目录、tar 归档或 NDJSON')
+    import_parser.add_argument('paths', nargs='+', help="导入源，'-' 表示从标准输入读取 tar 归档")
+    import_parser.add_argument('--overwrite', action='store_true', help='覆盖已存在的相同账号')
+    import_parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                               help=f'并行校验/写入的线程数（默认{DEFAULT_WORKERS}）')
+    export_parser = subparsers.add_parser('export', help='导出账号为 tar.gz')
+    export_parser.add_argument('output', help="输出文件，'-' 表示标准输出")
+    export_parser.add_argument('--name', action='append', help='只导出指定账号（可重复）')
+    args = parser.parse_args()
+
+    if args.command == 'import':
+        importer = AccountImporter(overwrite=args.overwrite, workers=args.workers)
+        if args.paths == ['-']:
+            result = importer.run(iter_source('-', iter_tar(sys.stdin.buffer)))
+        else:
+            result = importer.run(iter_paths(args.paths))
+        for error in result['errors']:
+            print(f"❌ {error['source']}: {error['error']}")
+        print(f"✅ 导入完成: {format_import_result(result)}")
+        sys.exit(1 if result['errors'] else 0)
+    elif args.command == 'export':
+        if args.output == '-':
+            count = export_accounts(sys.stdout.buffer, names=args.name)
+            print(f"✅ 已导出 {count} 个账号", file=sys.stderr)
+        else:
+            with open(args.output, 'wb') as f:
+                os.chmod(args.output, 0o600)
+                count = export_accounts(f, names=args.name)
+            print(f"✅ 已导出 {count} 个账号到 {args.output}")
+    else:
+        parser.print_help()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+账号列表的内存排序索引
+
+Web 端 /api/accounts 的分页、搜索和排序都在这里完成：每种排序方式维护一份
+有序的 (排序键, 账号) 列表，游标记录上一页最后一个账号的排序键，翻页时二分定位。
+按名称、保存时间排序的索引在账号列表不变时一直复用；按剩余额度、重置时间排序
+依赖用量缓存和当前时间，索引最多复用 USAGE_INDEX_TTL 秒。
+"""
+
+import base64
+import bisect
+import json
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+SORT_ORDERS = ('name', 'saved_at', 'headroom', 'reset')
+# 用量相关排序索引的最长复用时间（秒）
+USAGE_INDEX_TTL = 30.0
+
+
+def encode_cursor(key: Tuple) -> str:
+    raw = json.dumps(list(key), ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> Optional[Tuple]:
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, TypeError, json.JSONDecodeError):
+        return None
+    return tuple(key) if isinstance(key, list) else None
+
+
+def usage_headroom(usage_data: Optional[Dict]) -> Optional[float]:
+    """剩余额度：100 减去各限额中最高的 used_percent，没有用量数据时返回 None"""
+    rate_limits = (usage_data or {}).get('rate_limits')
+    if not isinstance(rate_limits, dict):
+        return None
+    used = [limit.get('used_percent') for limit in rate_limits.values() if isinstance(limit, dict)]
+    used = [value for value in used if isinstance(value, (int, float))]
+    return 100.0 - max(used) if used else None
+
+
+def next_reset_at(usage_data: Optional[Dict]) -> Optional[float]:
+    """各限额中最早的重置时间（Unix 秒），没有时返回 None"""
+    rate_limits = (usage_data or {}).get('rate_limits')
+    if not isinstance(rate_limits, dict):
+        return None
+    resets = [limit.get('resets_at') for limit in rate_limits.values() if isinstance(limit, dict)]
+    resets = [value for value in resets if isinstance(value, (int, float))]
+    return min(resets) if resets else None
+
+
+def _saved_timestamp(saved_at) -> Optional[float]:
+    if not isinstance(saved_at, str) or not saved_at:
+        return None
+    try:
+        return datetime.fromisoformat(saved_at.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+
+class AccountIndex:
+    """一份账号列表及其各排序方式的有序索引
+
+    accounts 为页面展示用的账号字典（含 name/email/plan），entries 为注册表条目
+    {name: entry}，usage_loader(emails) 返回 {email: usage_data}，仅在按用量排序时调用。
+    """
+
+    def __init__(self, accounts: List[Dict], entries: Dict[str, Dict],
+                 usage_loader: Callable[[List[str]], Dict[str, Dict]] = None):
+        self.accounts = accounts
+        self.entries = entries
+        self.usage_loader = usage_loader
+        self.plans = sorted({account['plan'] for account in accounts if account.get('plan')})
+        self._search_text = {
+            account['name']: (account['name'].lower(), str(account.get('email') or '').lower())
+            for account in accounts
+        }
+        # sort -> (建立时间, 排序键列表, 账号列表)
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def _sort_key(self, sort: str, account: Dict, usage: Dict[str, Dict]) -> Tuple:
+        """排序键统一以账号名称结尾保证唯一；缺少数据的账号排在最后"""
+        name = account['name']
+        if sort == 'saved_at':
+            value = _saved_timestamp(self.entries.get(name, {}).get('saved_at'))
+            return (0, -value, name) if value is not None else (1, 0, name)
+        if sort == 'headroom':
+            value = usage_headroom(usage.get(account.get('email')))
+            return (0, -value, name) if value is not None else (1, 0, name)
+        if sort == 'reset':
+            value = next_reset_at(usage.get(account.get('email')))
+            return (0, value, name) if value is not None else (1, 0, name)
+        return (name,)
+
+    def _index(self, sort: str) -> Tuple[List[Tuple], List[Dict]]:
+        with self._lock:
+            cached = self._indexes.get(sort)
+            uses_usage = sort in ('headroom', 'reset')
+            if cached and (not uses_usage or time.time() - cached[0] < USAGE_INDEX_TTL):
+                return cached[1], cached[2]
+
+            usage = {}
+            if uses_usage and self.usage_loader:
+                usage = self.usage_loader([account['email'] for account in self.accounts
+                                           if account.get('email')])
+            ordered = sorted((self._sort_key(sort, account, usage), account) for account in self.accounts)
+            keys = [key for key, _ in ordered]
+            accounts = [account for _, account in ordered]
+            self._indexes[sort] = (time.time(), keys, accounts)
+            return keys, accounts
+
+    def _matches(self, account: Dict, q: str, plan: str) -> bool:
+        if plan and str(account.get('plan') or '').lower() != plan:
+            return False
+        if q:
+            name, email = self._search_text[account['name']]
+            return q in name or q in email
+        return True
+
+    def query(self, limit: int = 50, cursor: str = None, q: str = None,
+              plan: str = None, sort: str = 'name') -> Dict:
+        """分页查询，q 为名称/邮箱子串（不区分大小写），plan 为套餐类型
+
+        返回 {"accounts", "next_cursor", "total", "plans"}；参数无效时抛出 ValueError。
+        """
+        if sort not in SORT_ORDERS:
+            raise ValueError(f"不支持的排序方式: {sort}")
+        keys, accounts = self._index(sort)
+
+        start = 0
+        if cursor:
+            key = decode_cursor(cursor)
+            if key is None:
+                raise ValueError("游标无效")
+            # 其他排序方式产生的游标与当前排序键类型不同，无法比较
+            try:
+                start = bisect.bisect_right(keys, key)
+            except TypeError:
+                raise ValueError("游标与排序方式不匹配")
+
+        q = (q or '').strip().lower()
+        plan = (plan or '').strip().lower()
+        if q or plan:
+            total = sum(1 for account in accounts if self._matches(account, q, plan))
+        else:
+            total = len(accounts)
+
+        page = []
+        next_cursor = None
+        last_index = None
+        for i in range(start, len(accounts)):
+            if not self._matches(accounts[i], q, plan):
+                continue
+            if len(page) == limit:
+                next_cursor = encode_cursor(keys[last_index])
+                break
+            page.append(accounts[i])
+            last_index = i
+
+        return {"accounts": page, "next_cursor": next_cursor, "total": total, "plans": self.plans}
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+账号注册表索引
+
+把 accounts/*.json 中列表需要的字段（名称、邮箱、套餐、account_id、保存时间、
+令牌过期时间）连同文件的 (mtime, size) 保存在 account_registry.json 中。
+列出账号时只需 stat 各文件并读取这一个小文件，文件有变化时才重新解析对应账号；
+同一进程内目录快照 (name, mtime, size) 未变化时直接复用上次的列表。
+"""
+
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from atomic_io import update_json_entries
+from jwt_claims import auth_claims
+
+
+REGISTRY_VERSION = 1
+
+
+def describe_account(name: str, config: Dict) -> Dict:
+    """从账号配置中提取列表所需的字段"""
+    claims = auth_claims(config)
+    return {
+        'name': name,
+        'account_name': config.get('account_name') or name,
+        'email': claims['email'],
+        'plan_type': claims['plan_type'],
+        'account_id': claims['account_id'],
+        'saved_at': config.get('saved_at'),
+        'token_expires_at': claims['exp']
+    }
+
+
+class AccountRegistry:
+    """accounts 目录的增量索引"""
+
+    def __init__(self, accounts_dir=None, registry_file=None):
+        from config_utils import get_config_paths
+
+        paths = get_config_paths()
+        self.accounts_dir = Path(accounts_dir) if accounts_dir else paths['accounts_dir']
+        self.registry_file = Path(registry_file) if registry_file else paths['account_registry_file']
+        self._entries = None
+        self._listing = []
+        # 上次同步时的目录快照，未同步过为 None
+        self.snapshot = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Dict]:
+        try:
+            with open(self.registry_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if isinstance(data, dict) and data.get('version') == REGISTRY_VERSION:
+                return data.get('accounts') or {}
+        except (OSError, IOError, json.JSONDecodeError, ValueError):
+            pass
+        return {}
+
+    def _save(self, updates: Dict[str, Dict], removed: List[str]):
+        """只把本次同步变化的账号合并进索引文件，不覆盖其他进程的写入"""
+        try:
+            update_json_entries(self.registry_file, 'accounts', REGISTRY_VERSION, updates, removed)
+        except (OSError, IOError, TimeoutError) as e:
+            print(f"⚠️ 保存账号索引失败: {e}")
+
+    def scan(self) -> Tuple[Tuple[str, int, int], ...]:
+        """用 os.scandir 获取账号目录快照：按名称排序的 (name, st_mtime_ns, st_size)"""
+        snapshot = []
+        try:
+            with os.scandir(self.accounts_dir) as it:
+                for item in it:
+                    if not item.name.endswith('.json'):
+                        continue
+                    try:
+                        if not item.is_file():
+                            continue
+                        stat_result = item.stat()
+                    except OSError:
+                        continue
+                    snapshot.append((item.name[:-len('.json')], stat_result.st_mtime_ns, stat_result.st_size))
+        except OSError:
+            pass
+        snapshot.sort()
+        return tuple(snapshot)
+
+    def refresh(self) -> bool:
+        """与 accounts 目录同步，返回索引是否有变化
+
+        目录快照与上次相同时直接返回；否则只重新解析新增或变化的账号文件。
+        """
+        snapshot = self.scan()
+        if snapshot == self.snapshot:
+            return False
+        if self._entries is None:
+            self._entries = self._load()
+
+        updates = {}
+        for name, mtime_ns, size in snapshot:
+            entry = self._entries.get(name)
+            if entry and entry.get('mtime_ns') == mtime_ns and entry.get('size') == size:
+                continue
+            try:
+                with open(self.accounts_dir / f"{name}.json", 'r', encoding='utf-8') as f:
+                    config = json.load(f)
+                entry = describe_account(name, config if isinstance(config, dict) else {})
+            except (OSError, IOError, json.JSONDecodeError, ValueError) as e:
+                entry = {'name': name, 'account_name': name, 'error': str(e)}
+            entry['mtime_ns'] = mtime_ns
+            entry['size'] = size
+            self._entries[name] = entry
+            updates[name] = entry
+
+        seen = {name for name, _, _ in snapshot}
+        removed = [name for name in self._entries if name not in seen]
+        for name in removed:
+            del self._entries[name]
+
+        changed = bool(updates or removed)
+        if changed:
+            self._save(updates, removed)
+        # 快照一致时沿用上次排好序的列表
+        self.snapshot = snapshot
+        self._listing = [self._entries[name] for name in sorted(self._entries)]
+        return changed
+
+    def list_accounts(self) -> Tuple[Tuple[Tuple[str, int, int], ...], List[Dict]]:
+        """返回 (目录快照, 按名称排序的账号条目)，无法解析的账号带有 error 字段
+
+        快照与条目在同一次加锁中取得，可以用快照作为基于这批条目构建的缓存的键。
+        目录未变化时返回内存中的同一批条目，调用方不应修改。
+        """
+        with self._lock:
+            self.refresh()
+            return self.snapshot, list(self._listing)
+
+    def get(self, name: str) -> Optional[Dict]:
+        with self._lock:
+            self.refresh()
+            entry = self._entries.get(name)
+            return dict(entry) if entry else None
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+预先生成的账号切换
+
+每个账号去掉管理字段后的 auth.json 内容（clean config）提前序列化到
+auth_payloads/<账号名>.json，并在目录旁的 auth_payloads.json 中记录来源账号文件的
+(mtime_ns, size)、邮箱和 account_id；索引不放在目录内，任何账号名都不会与它冲突。
+切换时只需 stat 账号文件确认内容未变，读取已生成的字节，写入 auth.json 同目录的
+临时文件后 os.replace，
+不再解析和格式化 JSON；正在读取 auth.json 的 Codex 进程只会看到完整的旧文件或新文件。
+账号文件变化后对应内容在下一次生成或切换时自动重新生成。
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from atomic_io import atomic_write_bytes, file_lock, update_json
+from jwt_claims import auth_claims
+from stat_cache import shared_cache
+
+
+# 写入 auth.json 的字段，其余（saved_at、account_name、email 等）为管理字段
+AUTH_FIELDS = ("OPENAI_API_KEY", "tokens", "last_refresh")
+
+
+def build_auth_payload(config: Dict) -> bytes:
+    """生成写入 auth.json 的内容（只保留原始配置字段）"""
+    clean_config = {field: config.get(field) for field in AUTH_FIELDS}
+    return json.dumps(clean_config, indent=2, ensure_ascii=False).encode('utf-8')
+
+
+class AccountSwitcher:
+    """维护预生成的 auth.json 内容并执行切换"""
+
+    def __init__(self, accounts_dir=None, payload_dir=None):
+        from config_utils import get_config_paths
+
+        paths = get_config_paths()
+        self.accounts_dir = Path(accounts_dir) if accounts_dir else paths['accounts_dir']
+        self.payload_dir = Path(payload_dir) if payload_dir else paths['auth_payload_dir']
+        self.index_file = self.payload_dir.with_name(f"{self.payload_dir.name}.json")
+
+    def _index(self) -> Dict[str, Dict]:
+        """读取生成记录（按文件状态缓存，调用方不应修改）"""
+        def load():
+            try:
+                with open(self.index_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                return data if isinstance(data, dict) else {}
+            except (OSError, IOError, json.JSONDecodeError, ValueError):
+                return {}
+        return shared_cache.get(('auth_payload_index', str(self.index_file)), [self.index_file], load)
+
+    def _materialize_one(self, name: str, stat_result: os.stat_result) -> Optional[Dict]:
+        try:
+            with open(self.accounts_dir / f"{name}.json", 'r', encoding='utf-8') as f:
+                config = json.load(f)
+        except (OSError, IOError, json.JSONDecodeError, ValueError):
+            return None
+        if not isinstance(config, dict):
+            return None
+        atomic_write_bytes(self.payload_dir / f"{name}.json", build_auth_payload(config), mode=0o600)
+        claims = auth_claims(config)
+        return {
+            'mtime_ns': stat_result.st_mtime_ns,
+            'size': stat_result.st_size,
+            'email': claims['email'],
+            'account_id': claims['account_id']
+        }
+
+    def materialize(self, names: Iterable[str] = None) -> int:
+        """为新增或变化的账号生成 auth.json 内容，names 为空时处理全部账号并清理已删除的账号
+
+        返回重新生成的账号数。
+        """
+        self.payload_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+        if names is None:
+            try:
+                with os.scandir(self.accounts_dir) as it:
+                    names = [item.name[:-len('.json')] for item in it
+                             if item.name.endswith('.json') and item.is_file()]
+            except OSError:
+                names = []
+            prune = True
+        else:
+            names = list(names)
+            prune = False
+        names = set(names)
+
+        index = self._index()
+        updates = {}
+        for name in names:
+            try:
+                stat_result = os.stat(self.accounts_dir / f"{name}.json")
+            except OSError:
+                updates[name] = None
+                continue
+            record = index.get(name)
+            if (record and record.get('mtime_ns') == stat_result.st_mtime_ns
+                    and record.get('size') == stat_result.st_size
+                    and (self.payload_dir / f"{name}.json").exists()):
+                continue
+            updates[name] = self._materialize_one(name, stat_result)
+
+        removed = set(index) - set(names) if prune else set()
+        removed.update(name for name, record in updates.items() if record is None)
+        stale_files = {f"{name}.json" for name in removed}
+        if prune:
+            # 同时清理目录中没有对应账号的文件（包括旧版本放在目录内的索引文件）
+            try:
+                with os.scandir(self.payload_dir) as it:
+                    stale_files.update(item.name for item in it if item.name.endswith('.json')
+                                       and item.name[:-len('.json')] not in names)
+            except OSError:
+                pass
+        for filename in stale_files:
+            try:
+                os.unlink(self.payload_dir / filename)
+            except OSError:
+                pass
+
+        if updates or removed:
+            def apply(current):
+                current = dict(current) if isinstance(current, dict) else {}
+                for name, record in updates.items():
+                    if record is not None:
+                        current[name] = record
+                for name in removed:
+                    current.pop(name, None)
+                return current
+            update_json(self.index_file, apply, default={}, indent=None, separators=(',', ':'))
+        return sum(1 for record in updates.values() if record is not None)
+
+    def prepare(self, name: str) -> Optional[Dict]:
+        """确认账号的预生成内容是最新的，返回生成记录；账号不存在或无法解析时返回 None"""
+        try:
+            stat_result = os.stat(self.accounts_dir / f"{name}.json")
+        except OSError:
+            return None
+        record = self._index().get(name)
+        if not (record and record.get('mtime_ns') == stat_result.st_mtime_ns
+                and record.get('size') == stat_result.st_size):
+            self.materialize([name])
+            record = self._index().get(name)
+        return dict(record) if record else None
+
+    def switch(self, name: str, auth_files: Iterable) -> Optional[Dict]:
+        """把账号的预生成内容原子替换到 auth_files 中的每个文件，返回生成记录
+
+        账号不存在或配置无法解析时返回 None，不修改任何文件。
+        """
+        record = self.prepare(name)
+        if record is None:
+            return None
+        try:
+            with open(self.payload_dir / f"{name}.json", 'rb') as f:
+                payload = f.read()
+        except OSError:
+            # 预生成文件被外部删除，重新生成一次
+            self.materialize([name])
+            with open(self.payload_dir / f"{name}.json", 'rb') as f:
+                payload = f.read()
+
+        for auth_file in dict.fromkeys(map(Path, auth_files)):
+            with file_lock(auth_file):
+                atomic_write_bytes(auth_file, payload)
+        return record
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+原子写入与跨进程文件锁
+
+所有 JSON 状态文件（auth.json、账号配置、各类缓存）统一通过本模块写入：
+先写同目录临时文件并 fsync，再用 os.replace 替换，崩溃时不会留下截断的文件；
+读-改-写操作（update_json / update_json_entries）在 fcntl 咨询锁内读取并写回，
+Web 服务、CLI 和脚本可以同时运行。锁文件集中放在用量缓存目录下的 locks 目录
+（可通过环境变量 CODEX_LOCK_DIR 覆盖），不会在被保护文件旁边留下文件；
+只写一次的旁路文件（摘要、归档索引）以 lock=False 写入，不产生锁文件。
+获取锁或替换文件失败时按有上限的指数退避重试。
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl，退化为不加锁
+    fcntl = None
+
+
+# 获取锁的默认超时（秒）以及退避的初始/最大间隔
+LOCK_TIMEOUT = 10.0
+RETRY_INITIAL_DELAY = 0.01
+RETRY_MAX_DELAY = 0.5
+# os.replace 遇到临时性错误（如 Windows 上目标文件正被读取）时的重试次数
+REPLACE_ATTEMPTS = 5
+# 覆盖锁目录的环境变量，测试和基准测试用它把锁文件留在临时目录中
+LOCK_DIR_ENV = "CODEX_LOCK_DIR"
+
+
+def _backoff_delays(initial: float = RETRY_INITIAL_DELAY, maximum: float = RETRY_MAX_DELAY):
+    delay = initial
+    while True:
+        yield delay
+        delay = min(delay * 2, maximum)
+
+
+def get_lock_dir() -> Path:
+    """锁文件目录：优先使用 CODEX_LOCK_DIR，否则为配置中的 lock_dir"""
+    override = os.getenv(LOCK_DIR_ENV)
+    if override:
+        return Path(override)
+    from config_utils import get_config_paths
+    return get_config_paths()['lock_dir']
+
+
+def lock_path_for(path) -> Path:
+    """目标文件对应的锁文件：位于锁目录中，按目标文件的真实路径命名"""
+    path = os.path.realpath(path)
+    digest = hashlib.sha1(path.encode('utf-8')).hexdigest()[:16]
+    return get_lock_dir() / f"{os.path.basename(path)}.{digest}.lock"
+
+
+@contextmanager
+def file_lock(path, shared: bool = False, timeout: float = LOCK_TIMEOUT):
+    """持有 path 对应锁文件的 fcntl 咨询锁，超时抛出 TimeoutError"""
+    lock_file = lock_path_for(path)
+    lock_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_file, 'a') as f:
+        if fcntl is None:
+            yield
+            return
+        operation = (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | fcntl.LOCK_NB
+        deadline = time.monotonic() + timeout
+        for delay in _backoff_delays():
+            try:
+                fcntl.flock(f, operation)
+                break
+            except BlockingIOError:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"等待文件锁超时: {path}")
+                time.sleep(min(delay, remaining))
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _fsync_directory(directory: Path):
+    """把目录项的变化（rename）落盘，不支持时忽略"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write_bytes(path, data: bytes, mode: int = None):
+    """原子写入文件内容
+
+    mode 为空时沿用目标文件原有权限，新文件为 0600（auth.json 含有令牌）。
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if mode is None:
+        try:
+            mode = path.stat().st_mode & 0o777
+        except OSError:
+            mode = 0o600
+
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_name, mode)
+        for attempt, delay in zip(range(REPLACE_ATTEMPTS), _backoff_delays()):
+            try:
+                os.replace(tmp_name, path)
+                break
+            except PermissionError:
+                if attempt + 1 == REPLACE_ATTEMPTS:
+                    raise
+                time.sleep(delay)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except OSError:
+            pass
+        raise
+    _fsync_directory(path.parent)
+
+
+def _dump_json(data: Any, indent=2, **json_kwargs) -> bytes:
+    json_kwargs.setdefault('ensure_ascii', False)
+    return json.dumps(data, indent=indent, **json_kwargs).encode('utf-8')
+
+
+def atomic_write_json(path, data: Any, lock: bool = True, indent=2, **json_kwargs):
+    """原子写入 JSON 文件，lock 为 True 时写入期间持有该文件的锁"""
+    content = _dump_json(data, indent, **json_kwargs)
+    if not lock:
+        atomic_write_bytes(path, content)
+        return
+    with file_lock(path):
+        atomic_write_bytes(path, content)
+
+
+def atomic_copy(src, dst):
+    """把 src 的内容原子地复制到 dst（持有 dst 的锁），保留 src 的权限"""
+    with open(src, 'rb') as f:
+        data = f.read()
+    with file_lock(dst):
+        atomic_write_bytes(dst, data, mode=os.stat(src).st_mode & 0o777)
+
+
+def update_json(path, updater: Callable[[Any], Any], default: Any = None, indent=2, **json_kwargs) -> Any:
+    """在文件锁内读取 JSON、调用 updater 计算新内容并原子写回，返回新内容
+
+    文件不存在或内容无效时以 default 作为当前值。
+    """
+    with file_lock(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                current = json.load(f)
+        except (OSError, IOError, json.JSONDecodeError, ValueError):
+            current = default
+        updated = updater(current)
+        atomic_write_bytes(path, _dump_json(updated, indent, **json_kwargs))
+        return updated
+
+
+def update_json_entries(path, field: str, version: int, updates: Dict, removed: Iterable = ()):
+    """把 updates 合并进 {'version': version, field: {...}} 格式的缓存文件，并删除 removed 中的键
+
+    只改动本进程更新或删除的键，其他进程同时写入的键不会丢失；
+    文件不存在、内容无效或版本不符时从空字典开始。
+    """
+    def apply(current):
+        entries = current.get(field) if isinstance(current, dict) and current.get('version') == version else None
+        entries = dict(entries) if isinstance(entries, dict) else {}
+        entries.update(updates)
+        for key in removed:
+            entries.pop(key, None)
+        return {'version': version, field: entries}
+    update_json(path, apply, indent=None, separators=(',', ':'))
@@ -4,11 +4,11 @@
 """
 
 import json
-import shutil
 from datetime import datetime
 from pathlib import Path
 from usage_checker import extract_email_from_auth
 from config_utils import get_config_paths, generate_account_name
+from atomic_io import atomic_copy, atomic_write_json
 
 
 def backup_current_account(account_name=None):
@@ -26,7 +26,7 @@ def backup_current_account(account_name=None):
     if system_auth_file != auth_file and system_auth_file.exists():
         try:
             auth_file.parent.mkdir(exist_ok=True)
-            shutil.copy2(system_auth_file, auth_file)
+            atomic_copy(system_auth_file, auth_file)
             print(f"📥 已从系统同步配置")
         except Exception as e:
             print(f"⚠️ 同步失败: {e}")
@@ -58,8 +58,7 @@ def backup_current_account(account_name=None):
         
         # 保存到accounts目录
         account_file = accounts_dir / f"{account_name}.json"
-        with open(account_file, 'w', encoding='utf-8') as f:
-            json.dump(current_config, f, indent=2, ensure_ascii=False)
+        atomic_write_json(account_file, current_config)
         
         print(f"✅ 成功保存账号配置: {account_name}")
         print(f"📁 保存位置: {account_file}")
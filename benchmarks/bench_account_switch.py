@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+账号切换基准测试
+
+在临时目录中生成若干账号，分别用旧方式（读取账号 JSON、构造 clean config、
+格式化后原地覆盖 auth.json）和预生成方式（AccountSwitcher：写临时文件后 os.replace）
+反复切换，报告切换耗时的 p50/p99。切换期间有多个读取进程不断读取并解析 auth.json，
+统计读到空文件或不完整 JSON 的次数；预生成方式应当始终为 0。
+
+用法: python3 benchmarks/bench_account_switch.py [--accounts 50] [--switches 500] [--readers 4]
+"""
+
+import argparse
+import base64
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from account_switcher import AccountSwitcher  # noqa: E402
+from atomic_io import LOCK_DIR_ENV  # noqa: E402
+
+
+def fake_token(claims: dict, padding: int) -> str:
+    """生成与真实令牌长度相近的 JWT（签名部分为填充字符）"""
+    payload = base64.urlsafe_b64encode(json.dumps(claims).encode()).decode().rstrip('=')
+    return f"eyJhbGciOiJSUzI1NiJ9.{payload}.{'s' * padding}"
+
+
+def build_accounts(accounts_dir: Path, count: int):
+    accounts_dir.mkdir(parents=True, exist_ok=True)
+    for index in range(count):
+        email = f"user{index}@example.com"
+        config = {
+            "OPENAI_API_KEY": None,
+            "tokens": {
+                "id_token": fake_token({"email": email}, 1200),
+                "access_token": fake_token({
+                    "exp": 1900000000,
+                    "https://api.openai.com/auth": {"chatgpt_plan_type": "plus"}
+                }, 1500),
+                "refresh_token": "r" * 64,
+                "account_id": f"account-{index}"
+            },
+            "last_refresh": "2025-06-30T00:00:00Z",
+            "saved_at": "2025-06-30T00:00:00",
+            "account_name": f"account{index}",
+            "email": email
+        }
+        with open(accounts_dir / f"account{index}.json", 'w', encoding='utf-8') as f:
+            json.dump(config, f, indent=2)
+
+
+def legacy_switch(accounts_dir: Path, name: str, auth_file: Path):
+    """旧实现：读取并重新格式化账号配置，原地覆盖 auth.json"""
+    with open(accounts_dir / f"{name}.json", 'r', encoding='utf-8') as f:
+        target_config = json.load(f)
+    clean_config = {
+        "OPENAI_API_KEY": target_config.get("OPENAI_API_KEY"),
+        "tokens": target_config.get("tokens"),
+        "last_refresh": target_config.get("last_refresh")
+    }
+    with open(auth_file, 'w', encoding='utf-8') as f:
+        json.dump(clean_config, f, indent=2, ensure_ascii=False)
+
+
+def reader(auth_file: str, stop, counters):
+    """不断读取 auth.json，统计读取次数和读到不完整内容的次数"""
+    reads = partial = 0
+    while not stop.is_set():
+        try:
+            with open(auth_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if not isinstance(data, dict) or 'tokens' not in data:
+                partial += 1
+        except (json.JSONDecodeError, UnicodeDecodeError, FileNotFoundError):
+            partial += 1
+        reads += 1
+    with counters.get_lock():
+        counters[0] += reads
+        counters[1] += partial
+
+
+def percentile(samples, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run(method: str, accounts_dir: Path, auth_file: Path, names, switches: int, readers: int):
+    switcher = AccountSwitcher(accounts_dir, auth_file.parent / "auth_payloads")
+    if method == 'materialized':
+        switcher.materialize()
+    legacy_switch(accounts_dir, names[0], auth_file)
+
+    stop = multiprocessing.Event()
+    counters = multiprocessing.Array('q', 2)
+    processes = [multiprocessing.Process(target=reader, args=(str(auth_file), stop, counters))
+                 for _ in range(readers)]
+    for process in processes:
+        process.start()
+    time.sleep(0.2)
+
+    samples = []
+    for index in range(switches):
+        name = names[index % len(names)]
+        start = time.perf_counter()
+        if method == 'materialized':
+            switcher.switch(name, [auth_file])
+        else:
+            legacy_switch(accounts_dir, name, auth_file)
+        samples.append((time.perf_counter() - start) * 1000)
+
+    stop.set()
+    for process in processes:
+        process.join()
+    return {
+        'p50': statistics.median(samples),
+        'p99': percentile(samples, 0.99),
+        'reads': counters[0],
+        'partial': counters[1]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="账号切换基准测试")
+    parser.add_argument('--accounts', type=int, default=50)
+    parser.add_argument('--switches', type=int, default=500)
+    parser.add_argument('--readers', type=int, default=4, help='并发读取 auth.json 的进程数')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # 锁文件也留在临时目录中，不写入真实配置目录
+        os.environ[LOCK_DIR_ENV] = str(Path(tmp) / "locks")
+        accounts_dir = Path(tmp) / "accounts"
+        build_accounts(accounts_dir, args.accounts)
+        names = [f"account{index}" for index in range(args.accounts)]
+
+        print(f"账号数 {args.accounts}，切换 {args.switches} 次，读取进程 {args.readers} 个")
+        print(f"{'方式':<14}{'p50 (ms)':>10}{'p99 (ms)':>10}{'读取次数':>12}{'不完整读取':>12}")
+        failed = False
+        for method in ('legacy', 'materialized'):
+            auth_dir = Path(tmp) / method
+            auth_dir.mkdir()
+            result = run(method, accounts_dir, auth_dir / "auth.json", names, args.switches, args.readers)
+            print(f"{method:<14}{result['p50']:>10.3f}{result['p99']:>10.3f}"
+                  f"{result['reads']:>12}{result['partial']:>12}")
+            if method == 'materialized' and result['partial']:
+                failed = True
+
+    if failed:
+        print("❌ 预生成切换期间读取到了不完整的 auth.json")
+        sys.exit(1)
+    print("✅ 预生成切换期间没有读取到不完整的 auth.json")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+session 查找基准测试
+
+在临时目录中生成不同天数的 sessions/YYYY/MM/DD 历史，对比旧的全量
+glob + stat 排序方式与按日期分区剪枝查找的耗时。分区查找的耗时应当
+基本不随历史长度增长。
+
+用法: python3 benchmarks/bench_session_discovery.py [--files-per-day 20] [--repeat 5]
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from atomic_io import LOCK_DIR_ENV  # noqa: E402
+from usage_checker import CodexUsageChecker  # noqa: E402
+
+
+TOKEN_COUNT_LINE = json.dumps({
+    "timestamp": "2025-01-01T00:00:00Z",
+    "type": "event_msg",
+    "payload": {
+        "type": "token_count",
+        "info": {"total_token_usage": {"input_tokens": 1, "output_tokens": 1, "total_tokens": 2}},
+        "rate_limits": {"primary": {"used_percent": 1.0, "window_minutes": 300, "resets_in_seconds": 60}}
+    }
+}) + "\n"
+MESSAGE_LINE = json.dumps({"type": "response_item", "payload": {"type": "message", "content": "x" * 200}}) + "\n"
+
+
+def build_history(sessions_dir: Path, days: int, files_per_day: int):
+    """生成 days 天的 rollout 历史，每个文件包含若干消息和一个 token_count 事件"""
+    end = datetime(2025, 6, 30)
+    for day in range(days):
+        date = end - timedelta(days=day)
+        partition = sessions_dir / date.strftime('%Y') / date.strftime('%m') / date.strftime('%d')
+        partition.mkdir(parents=True, exist_ok=True)
+        for index in range(files_per_day):
+            session_file = partition / f"rollout-{date.strftime('%Y-%m-%d')}T00-00-{index:02d}.jsonl"
+            with open(session_file, 'w', encoding='utf-8') as f:
+                f.write(MESSAGE_LINE * 5)
+                f.write(TOKEN_COUNT_LINE)
+            mtime = date.timestamp() + index
+            os.utime(session_file, (mtime, mtime))
+
+
+def legacy_find_latest(sessions_dir: Path):
+    """旧实现：递归 glob 全部文件并逐个 stat 后排序"""
+    session_files = glob.glob(str(sessions_dir / "**" / "rollout-*.jsonl"), recursive=True)
+    session_files.sort(key=lambda x: Path(x).stat().st_mtime, reverse=True)
+    return session_files[0] if session_files else None
+
+
+def timed(func, repeat: int) -> float:
+    """返回多次运行中的最短耗时（毫秒）"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="session 查找基准测试")
+    parser.add_argument('--files-per-day', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--days', type=int, nargs='+', default=[30, 180, 730])
+    args = parser.parse_args()
+
+    rows = []
+    for days in args.days:
+        with tempfile.TemporaryDirectory() as tmp:
+            # 锁文件也留在临时目录中，不写入真实配置目录
+            os.environ[LOCK_DIR_ENV] = str(Path(tmp) / "locks")
+            sessions_dir = Path(tmp) / "sessions"
+            build_history(sessions_dir, days, args.files_per_day)
+            checker = CodexUsageChecker(usage_cache_dir=Path(tmp) / "usage_cache")
+            checker.codex_sessions_dir = sessions_dir
+
+            legacy_ms = timed(lambda: legacy_find_latest(sessions_dir), args.repeat)
+            cold_start = time.perf_counter()
+            checker.find_latest_session_file()
+            cold_ms = (time.perf_counter() - cold_start) * 1000
+            warm_ms = timed(checker.find_latest_session_file, args.repeat)
+            rows.append((days, days * args.files_per_day, legacy_ms, cold_ms, warm_ms))
+
+    print(f"{'天数':>6} {'文件数':>8} {'旧实现(ms)':>12} {'分区首次(ms)':>14} {'分区复用索引(ms)':>18}")
+    for days, files, legacy_ms, cold_ms, warm_ms in rows:
+        print(f"{days:>6} {files:>8} {legacy_ms:>12.2f} {cold_ms:>14.2f} {warm_ms:>18.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,8 +8,11 @@ import sys
 import argparse
 from pathlib import Path
 from datetime import datetime, timedelta
-from usage_checker import OpenAIUsageChecker, extract_access_token_from_auth, extract_email_from_auth
+from usage_checker import OpenAIUsageChecker, extract_access_token_from_auth, extract_email_from_auth, format_gc_report
 from config_utils import get_config_paths
+from usage_analytics import UsageAnalytics, format_report
+from rate_limits import parse_check_time, project_rate_limits
+from account_registry import AccountRegistry
 import json
 
 
@@ -98,6 +101,7 @@ def check_usage(config_path=None, account_name=None, show_details=False):
     print("⏳ 正在查询...")
     
     # 创建用量检查器并获取摘要
+    checker = None
     try:
         checker = OpenAIUsageChecker()
         
@@ -105,8 +109,12 @@ def check_usage(config_path=None, account_name=None, show_details=False):
             # 当前账号：实时查询并保存到缓存
             summary = checker.get_account_summary(email)
         else:
-            # 其他账号：只从缓存读取
+            # 其他账号：从缓存读取，没有缓存时根据切换日志查找该账号活跃期间的历史 session
             cached_data = checker.load_usage_data(email)
+            if not cached_data:
+                history = checker.get_account_usage_from_history(email)
+                if history["status"] == "success":
+                    cached_data = history
             if cached_data:
                 summary = {
                     "email": email,
@@ -151,15 +159,15 @@ def check_usage(config_path=None, account_name=None, show_details=False):
             
             # 速率限制
             if summary.get('rate_limits'):
-                limits = summary['rate_limits']
+                limits = project_rate_limits(summary['rate_limits'], parse_check_time(summary.get('check_time')))
                 if limits.get('primary'):
                     primary = limits['primary']
-                    reset_seconds = primary.get('resets_in_seconds', 0)
+                    reset_seconds = primary.get('resets_in_seconds') or 0
                     reset_time = datetime.now() + timedelta(seconds=reset_seconds)
                     print(f"5h限制: {primary.get('used_percent', 0):.1f}% (重置时间: {reset_time.strftime('%H:%M:%S')})")
                 if limits.get('secondary'):
                     secondary = limits['secondary']
-                    reset_seconds = secondary.get('resets_in_seconds', 0)
+                    reset_seconds = secondary.get('resets_in_seconds') or 0
                     reset_time = datetime.now() + timedelta(seconds=reset_seconds)
                     print(f"周限制: {secondary.get('used_percent', 0):.1f}% (重置时间: {reset_time.strftime('%m-%d %H:%M')})")
             
@@ -176,6 +184,9 @@ def check_usage(config_path=None, account_name=None, show_details=False):
     except Exception as e:
         print(f"❌ 查询失败: {e}")
         return False
+    finally:
+        if checker is not None:
+            checker.close()
 
 
 def list_all_accounts():
@@ -186,31 +197,33 @@ def list_all_accounts():
         print("❌ 账号配置目录不存在")
         return False
     
-    account_files = list(accounts_dir.glob("*.json"))
-    if not account_files:
+    _, entries = AccountRegistry(accounts_dir).list_accounts()
+    if not entries:
         print("❌ 没有保存的账号配置")
         return False
     
-    print(f"📊 查询所有账号用量 ({len(account_files)} 个账号)")
+    print(f"📊 查询所有账号用量 ({len(entries)} 个账号)")
     print("=" * 80)
     
-    for i, account_file in enumerate(sorted(account_files), 1):
-        account_name = account_file.stem
-        print(f"\n[{i}/{len(account_files)}] {account_name}")
+    # 所有账号共用一个检查器（一个数据库连接）
+    checker = OpenAIUsageChecker()
+    for i, entry in enumerate(entries, 1):
+        account_name = entry['name']
+        print(f"\n[{i}/{len(entries)}] {account_name}")
         print("-" * 40)
         
         try:
-            with open(account_file, 'r') as f:
-                config = json.load(f)
+            if entry.get('error'):
+                print(f"❌ 错误: {entry['error']}")
+                continue
             
-            # 从配置中提取邮箱
-            email = config.get('email') or extract_email_from_auth(config)
+            # 邮箱来自账号注册表索引
+            email = entry.get('email')
             
             if not email:
                 print("❌ 无法提取邮箱信息")
                 continue
             
-            checker = OpenAIUsageChecker()
             summary = checker.get_account_summary(email)
             
             if summary.get('status') in ['success', 'success (cached)']:
@@ -230,15 +243,15 @@ def list_all_accounts():
                 
                 # 速率限制
                 if summary.get('rate_limits'):
-                    limits = summary['rate_limits']
+                    limits = project_rate_limits(summary['rate_limits'], parse_check_time(summary.get('check_time')))
                     if limits.get('primary'):
                         primary = limits['primary']
-                        reset_seconds = primary.get('resets_in_seconds', 0)
+                        reset_seconds = primary.get('resets_in_seconds') or 0
                         reset_time = datetime.now() + timedelta(seconds=reset_seconds)
                         print(f"   5h限制: {primary.get('used_percent', 0):.1f}% ({reset_time.strftime('%H:%M')}重置)")
                     if limits.get('secondary'):
                         secondary = limits['secondary']
-                        reset_seconds = secondary.get('resets_in_seconds', 0)
+                        reset_seconds = secondary.get('resets_in_seconds') or 0
                         reset_time = datetime.now() + timedelta(seconds=reset_seconds)
                         print(f"   周限制: {secondary.get('used_percent', 0):.1f}% ({reset_time.strftime('%m-%d %H:%M')}重置)")
             else:
@@ -249,10 +262,40 @@ def list_all_accounts():
         except Exception as e:
             print(f"❌ 错误: {e}")
     
+    checker.close()
     print("\n" + "=" * 80)
     return True
 
 
+def show_usage_report(group_by='day', since=None, until=None):
+    """按日期/模型/工作目录统计全部 session 历史用量"""
+    group_titles = {'day': '日期', 'model': '模型', 'cwd': '工作目录'}
+    print(f"📈 统计全部 session 历史用量（按{group_titles[group_by]}）")
+    print("⏳ 正在统计...")
+    try:
+        report = UsageAnalytics().report(group_by=group_by, since=since, until=until)
+    except Exception as e:
+        print(f"❌ 统计失败: {e}")
+        return False
+    
+    if not report['rows']:
+        print("📭 没有找到用量数据")
+        return False
+    
+    print("\n" + "=" * 60)
+    print(format_report(report))
+    print("=" * 60)
+    return True
+
+
+def collect_usage_garbage():
+    """回收用量缓存并显示回收结果"""
+    with OpenAIUsageChecker() as checker:
+        report = checker.collect_usage_garbage()
+    print(f"🧹 用量缓存回收: {format_gc_report(report)}")
+    return True
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="OpenAI 账号用量查询工具",
@@ -264,6 +307,9 @@ def main():
   python check_usage.py --all              # 查询所有账号
   python check_usage.py -d                 # 显示详细信息
   python check_usage.py -c auth.json       # 指定配置文件
+  python check_usage.py --report day       # 按日期统计全部历史用量
+  python check_usage.py --report model --since 2025-01-01  # 按模型统计
+  python check_usage.py --gc               # 回收过期和已删除账号的用量缓存
         """
     )
     
@@ -275,13 +321,25 @@ def main():
                        help='显示详细信息')
     parser.add_argument('--all', action='store_true',
                        help='查询所有账号')
+    parser.add_argument('--report', choices=['day', 'model', 'cwd'],
+                       help='统计全部 session 历史用量（按日期/模型/工作目录）')
+    parser.add_argument('--since',
+                       help='统计起始日期 (YYYY-MM-DD)')
+    parser.add_argument('--until',
+                       help='统计结束日期 (YYYY-MM-DD)')
+    parser.add_argument('--gc', action='store_true',
+                       help='回收过期、已删除账号及超出大小上限的用量缓存')
     
     args = parser.parse_args()
     
     print("🔍 OpenAI 用量查询工具")
     print("-" * 30)
     
-    if args.all:
+    if args.gc:
+        success = collect_usage_garbage()
+    elif args.report:
+        success = show_usage_report(args.report, args.since, args.until)
+    elif args.all:
         success = list_all_accounts()
     else:
         success = check_usage(
@@ -1,5 +1,5 @@
 // Tauri API 导入
-import { readTextFile, writeTextFile, readDir, mkdir, exists, remove, stat } from '@tauri-apps/plugin-fs';
+import { readTextFile, writeTextFile, readDir, mkdir, exists, remove, rename, stat } from '@tauri-apps/plugin-fs';
 import { homeDir, join, appDataDir } from '@tauri-apps/api/path';
 import { message, ask, confirm } from '@tauri-apps/plugin-dialog';
 
@@ -91,6 +91,7 @@ async function initPaths() {
         systemAuthFile,
         codexConfigDir,
         accountsDir: await join(codexConfigDir, 'accounts'),
+        authPayloadDir: await join(codexConfigDir, 'auth_payloads'),
         usageCacheDir: await join(codexConfigDir, 'usage_cache'),
         sessionDir: await join(home, '.codex', 'sessions')
     };
@@ -141,6 +142,24 @@ async function writeJsonSafe(path, data) {
     }
 }
 
+// 原子写入：先写同目录临时文件再 rename，正在读取的 Codex 进程只会看到完整的旧文件或新文件 (与 Python atomic_write_bytes 一致)
+async function writeJsonAtomic(path, data) {
+    const tmpPath = `${path}.${Date.now()}.tmp`;
+    try {
+        await writeTextFile(tmpPath, JSON.stringify(data, null, 2));
+        await rename(tmpPath, path);
+        return true;
+    } catch (e) {
+        console.error(`原子写入JSON失败 ${path}:`, e);
+        try {
+            await remove(tmpPath);
+        } catch (_) {
+            // 临时文件可能未创建
+        }
+        throw e;
+    }
+}
+
 // =============================================================================
 // 账号名生成 (与 Python generate_account_name 一致)
 // =============================================================================
@@ -436,7 +455,7 @@ async function quickSwitchAccount(accountName) {
         };
         
         console.log('准备写入系统配置:', PATHS.systemAuthFile);
-        await writeJsonSafe(PATHS.systemAuthFile, cleanConfig);
+        await writeJsonAtomic(PATHS.systemAuthFile, cleanConfig);
         console.log('✅ 系统配置写入成功');
         
         showMessage(`已切换到账号 ${accountName}，请用 codex 发送消息后刷新用量`, 'success');
@@ -476,6 +495,12 @@ async function quickDeleteAccount(accountName) {
 
         await remove(account.path);
         
+        // 同时删除 Python 端为该账号预生成的 auth.json 内容（其中包含令牌）
+        const payloadFile = await join(PATHS.authPayloadDir, `${accountName}.json`);
+        if (await exists(payloadFile)) {
+            await remove(payloadFile);
+        }
+        
         showMessage(`成功删除账号: ${accountName}`, 'success');
         if (selectedAccount === accountName) {
             selectedAccount = null;
@@ -7,13 +7,18 @@ OpenAI Codex 账号配置管理器
 
 import json
 import os
-import shutil
 import sys
-import time
+from contextlib import nullcontext
 from datetime import datetime, timedelta
 from pathlib import Path
-from usage_checker import CodexUsageChecker, extract_email_from_auth
+from usage_checker import (CodexUsageChecker, SessionFollower, extract_email_from_auth, format_gc_report,
+                           snapshot_outgoing_account)
 from config_utils import get_config_paths, generate_account_name
+from session_watcher import create_session_watcher
+from switch_journal import record_switch
+from atomic_io import atomic_copy, atomic_write_json
+from account_registry import AccountRegistry
+from account_switcher import AccountSwitcher
 
 
 class CodexAccountManager:
@@ -41,8 +46,7 @@ class CodexAccountManager:
     def _save_config(self, file_path, config):
         """保存 JSON 配置文件"""
         try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(config, f, indent=2, ensure_ascii=False)
+            atomic_write_json(file_path, config)
             return True
         except (OSError, IOError) as e:
             print(f"❌ 保存配置失败: {e}")
@@ -53,7 +57,7 @@ class CodexAccountManager:
         try:
             if self.auth_file.exists():
                 self.system_auth_file.parent.mkdir(parents=True, exist_ok=True)
-                shutil.copy2(self.auth_file, self.system_auth_file)
+                atomic_copy(self.auth_file, self.system_auth_file)
         except (OSError, IOError) as e:
             print(f"❌ 复制到系统失败: {e}")
             return False
@@ -105,15 +109,14 @@ class CodexAccountManager:
     
     def list_accounts(self):
         """列出所有保存的账号"""
-        account_files = list(self.accounts_dir.glob("*.json"))
+        _, entries = AccountRegistry(self.accounts_dir).list_accounts()
         
-        if not account_files:
+        if not entries:
             print("📭 没有保存的账号配置")
             return []
         
         accounts = []
         rows = []
-        checker = CodexUsageChecker()
         now = datetime.now()
 
         def get_used_percent(limit_data):
@@ -130,6 +133,8 @@ class CodexAccountManager:
             used_percent = limit_data.get('used_percent')
             if isinstance(used_percent, (int, float)):
                 used_str = f"{used_percent:.1f}%"
+                if limit_data.get('reset_elapsed'):
+                    used_str += " 已重置"
             else:
                 used_str = "未知"
 
@@ -161,17 +166,22 @@ class CodexAccountManager:
 
         print("\n📋 已保存的账号配置:")
         
-        for account_file in sorted(account_files):
+        for entry in entries:
+            if entry.get('error'):
+                print(f"❌ 读取 {entry['name']}.json 失败: {entry['error']}")
+        entries = [entry for entry in entries if not entry.get('error')]
+
+        # 一次查询取出所有账号的缓存用量
+        with CodexUsageChecker() as checker:
+            usage_caches = checker.load_usage_many(entry.get('email') for entry in entries)
+
+        for entry in entries:
             try:
-                with open(account_file, 'r', encoding='utf-8') as f:
-                    config = json.load(f)
-                
-                account_name = config.get('account_name') or account_file.stem
-                saved_at = config.get('saved_at', '未知时间')
-                account_id = config.get('tokens', {}).get('account_id', '未知ID')
+                account_name = entry['account_name']
+                saved_at = entry.get('saved_at') or '未知时间'
+                account_id = entry.get('account_id') or '未知ID'
 
-                email = extract_email_from_auth(config)
-                usage_cache = checker.load_usage_data(email) if email else None
+                usage_cache = usage_caches.get(entry.get('email'))
                 rate_limits = usage_cache.get('rate_limits', {}) if usage_cache else {}
 
                 five_hour_limit = None
@@ -204,7 +214,7 @@ class CodexAccountManager:
                 accounts.append(account_name)
                 
             except Exception as e:
-                print(f"❌ 读取 {account_file.name} 失败: {e}")
+                print(f"❌ 读取 {entry['name']}.json 失败: {e}")
 
         if rows:
             headers = ["账号名称", "账号ID", "保存时间", "5小时窗口", "周限制"]
@@ -227,33 +237,31 @@ class CodexAccountManager:
     
     def switch_account(self, account_name):
         """切换到指定账号"""
-        account_file = self.accounts_dir / f"{account_name}.json"
-        
-        if not account_file.exists():
-            print(f"❌ 账号配置不存在: {account_name}")
-            return False
+        switcher = AccountSwitcher(self.accounts_dir)
         
         try:
-            # 读取目标账号配置
-            target_config = self._load_config(account_file)
+            # 确认预生成的 auth.json 内容可用（账号文件变化时重新生成）
+            if switcher.prepare(account_name) is None:
+                print(f"❌ 账号配置不存在或无法解析: {account_name}")
+                return False
             
-            # 移除管理字段，只保留原始配置
-            clean_config = {
-                "OPENAI_API_KEY": target_config.get("OPENAI_API_KEY"),
-                "tokens": target_config.get("tokens"),
-                "last_refresh": target_config.get("last_refresh")
-            }
+            # 覆盖 auth.json 前保存切出账号的最新用量
+            snapshot_outgoing_account(self.system_auth_file)
             
-            # 直接写入系统 Codex 配置
-            self.system_auth_file.parent.mkdir(parents=True, exist_ok=True)
-            if self._save_config(self.system_auth_file, clean_config):
-                print(f"✅ 成功切换到账号: {account_name}")
-                
-                # 显示账号信息
-                account_id = target_config.get('tokens', {}).get('account_id', '未知')
-                print(f"🔹 账号ID: {account_id}")
-                print(f"📂 系统配置: {self.system_auth_file}")
-                return True
+            # 预生成内容原子替换系统 Codex 配置
+            record = switcher.switch(account_name, [self.system_auth_file])
+            if record is None:
+                print(f"❌ 账号配置不存在或无法解析: {account_name}")
+                return False
+            
+            # 记录切换时间，用于把历史 session 用量归属到对应账号
+            record_switch(account_name, email=record.get('email'), account_id=record.get('account_id'))
+            print(f"✅ 成功切换到账号: {account_name}")
+            
+            # 显示账号信息
+            print(f"🔹 账号ID: {record.get('account_id') or '未知'}")
+            print(f"📂 系统配置: {self.system_auth_file}")
+            return True
             
         except Exception as e:
             print(f"❌ 切换失败: {e}")
@@ -270,6 +278,8 @@ class CodexAccountManager:
         
         try:
             account_file.unlink()
+            # 同时删除该账号预生成的 auth.json 内容（其中包含令牌）
+            AccountSwitcher(self.accounts_dir).materialize([account_name])
             print(f"🗑️ 已删除账号配置: {account_name}")
             return True
         except Exception as e:
@@ -297,8 +307,11 @@ class CodexAccountManager:
         except Exception as e:
             print(f"❌ 读取当前配置失败: {e}")
 
-    def check_account_usage(self, account_name=None, force_refresh=False):
-        """检查账号用量"""
+    def check_account_usage(self, account_name=None, force_refresh=False, follower=None):
+        """检查账号用量
+
+        follower 用于自动刷新：只解析最新 session 自上次刷新以来追加的内容
+        """
         try:
             # 如果指定了账号名称，读取该账号配置
             if account_name:
@@ -325,36 +338,35 @@ class CodexAccountManager:
                 print("❌ 未能提取账号邮箱信息")
                 return False
             
-            # 创建用量检查器
-            checker = CodexUsageChecker()
-            
-            if force_refresh:
-                # 强制从session刷新
-                summary = checker.get_usage_summary(email)
-            else:
-                # 先尝试从缓存读取
-                cached_data = checker.load_usage_data(email)
-                if cached_data:
-                    print("📁 从缓存读取用量数据...")
-                    summary = {
-                        "email": email,
-                        "check_time": cached_data.get("check_time", ""),
-                        "status": "success",
-                        "token_usage": cached_data.get("token_usage", {}),
-                        "rate_limits": cached_data.get("rate_limits", {}),
-                        "errors": cached_data.get("errors", []),
-                        "from_cache": True
-                    }
+            # 自动刷新时复用 follower 的用量检查器，否则创建后用完关闭
+            with (nullcontext(follower.checker) if follower else CodexUsageChecker()) as checker:
+                if force_refresh:
+                    # 强制从session刷新
+                    summary = checker.get_usage_summary(email, follower=follower)
                 else:
-                    print("⚠️ 没有缓存数据，请先用 codex 发送消息")
-                    print("💡 提示: 你可以选择菜单项进行强制刷新")
-                    return False
-            
-            # 显示格式化的结果
-            print("\n" + "=" * 60)
-            formatted_summary = checker.format_usage_summary(summary)
-            print(formatted_summary)
-            print("=" * 60)
+                    # 先尝试从缓存读取
+                    cached_data = checker.load_usage_data(email)
+                    if cached_data:
+                        print("📁 从缓存读取用量数据...")
+                        summary = {
+                            "email": email,
+                            "check_time": cached_data.get("check_time", ""),
+                            "status": "success",
+                            "token_usage": cached_data.get("token_usage", {}),
+                            "rate_limits": cached_data.get("rate_limits", {}),
+                            "errors": cached_data.get("errors", []),
+                            "from_cache": True
+                        }
+                    else:
+                        print("⚠️ 没有缓存数据，请先用 codex 发送消息")
+                        print("💡 提示: 你可以选择菜单项进行强制刷新")
+                        return False
+                
+                # 显示格式化的结果
+                print("\n" + "=" * 60)
+                formatted_summary = checker.format_usage_summary(summary)
+                print(formatted_summary)
+                print("=" * 60)
             
             return True
             
@@ -370,6 +382,12 @@ def main():
     
     manager = CodexAccountManager()
     
+    # 启动时回收过期和已删除账号的用量缓存
+    with CodexUsageChecker() as checker:
+        gc_report = checker.collect_usage_garbage()
+    if gc_report['expired'] or gc_report['orphaned'] or gc_report['evicted'] or gc_report['bytes_reclaimed']:
+        print(f"🧹 用量缓存回收: {format_gc_report(gc_report)}")
+    
     while True:
         print("\n" + "=" * 50)
         print("🚀 OpenAI Codex 账号管理器")
@@ -381,7 +399,7 @@ def main():
         print("5. 删除账号配置")
         print("6. 显示当前账号")
         print("7. 刷新当前账号用量（从 session）")
-        print("8. 启动自动刷新当前账号用量（每5秒）")
+        print("8. 启动自动刷新当前账号用量（监听 session 变化）")
         print("0. 退出")
         print("-" * 50)
         
@@ -475,18 +493,30 @@ def main():
 
         elif choice == "8":
             print("\n🔁 已启动自动刷新。按 Ctrl+C 停止。")
+            # 记住当前 session 文件的读取位置，每次只解析新追加的内容
+            checker = CodexUsageChecker()
+            follower = SessionFollower(checker)
+            # 监听 session 目录，有新写入时才刷新，取代定时重扫
+            watcher = create_session_watcher(checker.codex_sessions_dir)
             try:
                 while True:
                     # 清屏以回显最新数据而不滚动
                     print("\033c", end="")
-                    print("🔁 自动刷新当前账号用量（每5秒）\n")
-                    manager.check_account_usage(force_refresh=True)
+                    print("🔁 自动刷新当前账号用量（有新用量事件时刷新）\n")
+                    manager.check_account_usage(force_refresh=True, follower=follower)
                     sys.stdout.flush()
-                    print("\n⏳ 将在 5 秒后再次刷新（Ctrl+C 停止）")
-                    time.sleep(5)
+                    follower.changed = False
+                    print("\n⏳ 等待新的用量事件（Ctrl+C 停止）")
+                    # 有 session 写入时检查是否出现新的 token_count 事件，否则继续等待
+                    while not follower.changed:
+                        if watcher.wait(timeout=60):
+                            follower.poll()
             except KeyboardInterrupt:
                 print("\n⏹️ 自动刷新已停止")
+                checker.close()
                 continue
+            finally:
+                watcher.close()
         
         elif choice == "0":
             print("👋 再见!")
@@ -5,16 +5,32 @@ OpenAI Codex 账号配置管理器 - Web版本
 用于管理和切换多个 OpenAI 账号配置
 """
 
+import hmac
+import io
 import json
+import secrets
 import shutil
-import base64
+import tarfile
+import threading
 import webbrowser
 from datetime import datetime
 from pathlib import Path
-from http.server import HTTPServer, BaseHTTPRequestHandler
-from urllib.parse import parse_qs
-from usage_checker import OpenAIUsageChecker
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import parse_qs, urlparse
+from usage_checker import OpenAIUsageChecker, format_gc_report, snapshot_outgoing_account
 from config_utils import generate_account_name, get_config_paths
+from session_watcher import UsageEventNotifier
+from token_event_store import TokenEventStore
+from switch_journal import record_switch, parse_event_timestamp
+from rate_limits import normalize_rate_limits
+from session_catalog import SessionCatalog
+from stat_cache import file_signature, load_json
+from atomic_io import atomic_write_json
+from account_registry import AccountRegistry
+from account_index import AccountIndex
+from account_switcher import AccountSwitcher
+from account_bulk import AccountImporter, export_accounts, format_import_result, iter_ndjson, iter_source, iter_tar
+from jwt_claims import email_from_auth
 
 
 class CodexAccountManagerWeb:
@@ -29,124 +45,187 @@ class CodexAccountManagerWeb:
         # 确保目录存在
         self.codex_dir.mkdir(parents=True, exist_ok=True)
         self.accounts_dir.mkdir(parents=True, exist_ok=True)
+        
+        # 用量事件通知：session 中出现新的 token_count 事件时推送给页面
+        self.usage_notifier = None
+        self.usage_event_id = 0
+        self.usage_event = None
+        self.usage_event_condition = threading.Condition()
+        
+        # session 元数据目录，首次查询时创建
+        self.session_catalog = None
+        self.session_catalog_lock = threading.Lock()
+        
+        # 账号注册表索引
+        self.account_registry = AccountRegistry(self.accounts_dir)
+        self.accounts_data_cache = None
+        self.account_index = None
+        self.account_switcher = AccountSwitcher(self.accounts_dir)
+        self.accounts_data_lock = threading.Lock()
+        
+        # 各请求共用的用量检查器，避免每次请求重新初始化
+        self.usage_checker = None
+        self.usage_checker_lock = threading.Lock()
+        # 创建检查器单独加锁：usage_checker_lock 持有期间也会调用 get_usage_checker
+        self.usage_checker_init_lock = threading.Lock()
+        
+        # 后台维护线程（用量历史压缩、用量缓存回收）
+        self.maintenance_thread = None
+        self.maintenance_stop = threading.Event()
+        
+        # 本次运行的访问令牌：嵌入主页，导入/导出账号（含令牌）时必须携带
+        self.session_token = secrets.token_urlsafe(32)
+    
+    def start_usage_watcher(self):
+        """监听 session 目录，出现新的用量事件时更新当前账号缓存并通知页面"""
+        if self.usage_notifier is None:
+            self.usage_notifier = UsageEventNotifier(OpenAIUsageChecker(), self._on_usage_event).start()
+    
+    def stop_usage_watcher(self):
+        if self.usage_notifier is not None:
+            self.usage_notifier.stop()
+            self.usage_notifier = None
+    
+    def _on_usage_event(self, token_data):
+        """新的 token_count 事件：写入当前账号的用量缓存并唤醒等待中的页面连接"""
+        try:
+            current_config = load_json(self.system_auth_file)
+        except (OSError, IOError, json.JSONDecodeError):
+            return
+        email = self.extract_email_from_token(current_config)
+        if not email:
+            return
+        
+        payload = token_data.get('payload', {})
+        info = payload.get('info')
+        usage_data = {
+            "check_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "token_usage": info.get('total_token_usage', {}) if isinstance(info, dict) else {},
+            # resets_in_seconds 相对事件发生时刻，换算为绝对重置时间
+            "rate_limits": normalize_rate_limits(payload.get('rate_limits', {}),
+                                                 parse_event_timestamp(token_data.get('timestamp')))
+        }
+        self.usage_notifier.checker.save_usage_data(email, usage_data)
+        
+        with self.usage_event_condition:
+            self.usage_event_id += 1
+            self.usage_event = {"email": email, "check_time": usage_data["check_time"]}
+            self.usage_event_condition.notify_all()
+    
+    def wait_usage_event(self, last_event_id, timeout=None):
+        """等待比 last_event_id 更新的用量事件，返回 (事件ID, 事件)"""
+        with self.usage_event_condition:
+            self.usage_event_condition.wait_for(lambda: self.usage_event_id != last_event_id, timeout)
+            return self.usage_event_id, self.usage_event
+    
+    def start_background_maintenance(self, interval=3600):
+        """启动后台维护线程：启动时执行一次，之后每 interval 秒执行一次"""
+        if self.maintenance_thread is not None:
+            return
+        self.maintenance_stop.clear()
+        self.maintenance_thread = threading.Thread(
+            target=self._maintenance_loop, args=(interval,), name="usage-maintenance", daemon=True)
+        self.maintenance_thread.start()
+    
+    def stop_background_maintenance(self):
+        if self.maintenance_thread is not None:
+            self.maintenance_stop.set()
+            self.maintenance_thread.join()
+            self.maintenance_thread = None
+    
+    def _maintenance_loop(self, interval):
+        while True:
+            try:
+                checker = self.get_usage_checker()
+                result = checker.usage_store.compact_history()
+                if result['compacted'] or result['deleted']:
+                    print(f"🗜️ 用量历史压缩: 合并 {result['compacted']} 条，删除 {result['deleted']} 条")
+                report = checker.collect_usage_garbage()
+                if report['expired'] or report['orphaned'] or report['evicted'] or report['bytes_reclaimed']:
+                    print(f"🧹 用量缓存回收: {format_gc_report(report)}")
+                # 为新增或变化的账号预先生成切换用的 auth.json 内容
+                self.account_switcher.materialize()
+                # 把新增的 token_count 事件追加到列式存储（只读取上次导入之后追加的部分）
+                added = TokenEventStore().ingest_all()
+                if added:
+                    print(f"📥 导入 token 事件 {added} 个")
+            except Exception as e:
+                print(f"⚠️ 后台维护失败: {e}")
+            if self.maintenance_stop.wait(interval):
+                return
+    
+    def get_usage_checker(self):
+        if self.usage_checker is None:
+            with self.usage_checker_init_lock:
+                if self.usage_checker is None:
+                    self.usage_checker = OpenAIUsageChecker()
+        return self.usage_checker
     
     def extract_email_from_token(self, config):
         """从token中提取邮箱地址"""
-        try:
-            if not config or not isinstance(config, dict):
-                return None
-                
-            # 首先尝试从id_token中提取
-            if 'tokens' in config and 'id_token' in config['tokens']:
-                id_token = config['tokens']['id_token']
-                if not id_token:
-                    return None
-                parts = id_token.split('.')
-                if len(parts) >= 2:
-                    payload = parts[1]
-                    padding = 4 - (len(payload) % 4)
-                    if padding != 4:
-                        payload += '=' * padding
-                    
-                    try:
-                        decoded = base64.b64decode(payload)
-                        token_data = json.loads(decoded.decode('utf-8'))
-                        if token_data and isinstance(token_data, dict) and 'email' in token_data:
-                            return token_data['email']
-                    except:
-                        pass
-            
-            # 备用方法：从access_token中提取
-            if 'tokens' in config and 'access_token' in config['tokens']:
-                access_token = config['tokens']['access_token']
-                if not access_token:
-                    return None
-                parts = access_token.split('.')
-                if len(parts) >= 2:
-                    payload = parts[1]
-                    padding = 4 - (len(payload) % 4)
-                    if padding != 4:
-                        payload += '=' * padding
-                    
-                    try:
-                        decoded = base64.b64decode(payload)
-                        token_data = json.loads(decoded.decode('utf-8'))
-                        if (token_data and isinstance(token_data, dict) and 
-                            'https://api.openai.com/profile' in token_data):
-                            profile = token_data['https://api.openai.com/profile']
-                            if profile and isinstance(profile, dict) and 'email' in profile:
-                                return profile['email']
-                    except:
-                        pass
-            
-            return None
-        except Exception:
-            return None
-
+        return email_from_auth(config)
 
     def get_accounts_data(self):
-        """获取所有账号数据"""
+        """获取所有账号数据
+        
+        账号目录快照和 auth.json 都没有变化时直接返回内存中上次构建的列表。
+        """
+        with self.accounts_data_lock:
+            # 快照与条目在注册表的同一次加锁中取得，其他线程刷新注册表不会让二者错位
+            snapshot, entries = self.account_registry.list_accounts()
+            cache_key = (snapshot, file_signature([self.system_auth_file]))
+            if self.accounts_data_cache is not None and self.accounts_data_cache[0] == cache_key:
+                return self.accounts_data_cache[1]
+            accounts = self._build_accounts_data(entries)
+            self.accounts_data_cache = (cache_key, accounts)
+            self.account_index = AccountIndex(accounts, {entry['name']: entry for entry in entries},
+                                              self.get_usage_checker().load_usage_many)
+            return accounts
+
+    def query_accounts(self, limit=50, cursor=None, q=None, plan=None, sort='name'):
+        """分页、搜索、排序账号列表，参数无效时抛出 ValueError"""
+        self.get_accounts_data()
+        return self.account_index.query(limit, cursor, q, plan, sort)
+
+    def _build_accounts_data(self, entries):
         accounts = []
-        account_files = list(self.accounts_dir.glob("*.json"))
         
         # 获取当前账号邮箱用于标记
         current_email = None
         try:
             if self.system_auth_file.exists():
-                with open(self.system_auth_file, 'r', encoding='utf-8') as f:
-                    current_config = json.load(f)
+                current_config = load_json(self.system_auth_file)
                 current_email = self.extract_email_from_token(current_config)
         except:
             pass
         
-        for account_file in sorted(account_files):
+        # 账号字段来自注册表索引，只有变化过的账号文件才会重新解析
+        for entry in entries:
+            if entry.get('error'):
+                print(f"读取 {entry['name']}.json 失败: {entry['error']}")
+                continue
+            
+            email = entry.get('email') or '未知'
+            saved_at = entry.get('saved_at') or '未知时间'
+            
+            # 检查是否是当前账号
+            is_current = email == current_email if current_email else False
+            
+            # 格式化时间
             try:
-                with open(account_file, 'r', encoding='utf-8') as f:
-                    config = json.load(f)
-                
-                account_name = account_file.stem
-                email = config.get('email', self.extract_email_from_token(config) or '未知')
-                saved_at = config.get('saved_at', '未知时间')
-                
-                # 检查是否是当前账号
-                is_current = email == current_email if current_email else False
-                
-                # 获取账号状态
-                plan_type = "未知"
-                try:
-                    if 'tokens' in config and 'access_token' in config['tokens']:
-                        access_token = config['tokens']['access_token']
-                        parts = access_token.split('.')
-                        if len(parts) >= 2:
-                            payload = parts[1]
-                            padding = 4 - (len(payload) % 4)
-                            if padding != 4:
-                                payload += '=' * padding
-                            decoded = base64.b64decode(payload)
-                            token_data = json.loads(decoded.decode('utf-8'))
-                            auth_info = token_data.get('https://api.openai.com/auth', {})
-                            plan_type = auth_info.get('chatgpt_plan_type', '未知')
-                except:
-                    pass
-                
-                # 格式化时间
-                try:
-                    if saved_at != '未知时间':
-                        dt = datetime.fromisoformat(saved_at.replace('Z', '+00:00'))
-                        saved_at = dt.strftime('%m-%d %H:%M')
-                except:
-                    pass
-                
-                accounts.append({
-                    'name': account_name,
-                    'email': email,
-                    'plan': plan_type,
-                    'saved_at': saved_at,
-                    'is_current': is_current
-                })
-                
-            except Exception as e:
-                print(f"读取 {account_file.name} 失败: {e}")
+                if saved_at != '未知时间':
+                    dt = datetime.fromisoformat(saved_at.replace('Z', '+00:00'))
+                    saved_at = dt.strftime('%m-%d %H:%M')
+            except:
+                pass
+            
+            accounts.append({
+                'name': entry['name'],
+                'email': email,
+                'plan': entry.get('plan_type') or '未知',
+                'saved_at': saved_at,
+                'is_current': is_current
+            })
         
         return accounts
 
@@ -156,8 +235,7 @@ class CodexAccountManagerWeb:
             if not self.system_auth_file.exists():
                 return {"error": "系统 auth.json 文件不存在"}
             
-            with open(self.system_auth_file, 'r', encoding='utf-8') as f:
-                current_config = json.load(f)
+            current_config = load_json(self.system_auth_file)
             
             email = self.extract_email_from_token(current_config)
             if email:
@@ -167,8 +245,7 @@ class CodexAccountManagerWeb:
                 current_config['email'] = email
                 
                 account_file = self.accounts_dir / f"{account_name}.json"
-                with open(account_file, 'w', encoding='utf-8') as f:
-                    json.dump(current_config, f, indent=2, ensure_ascii=False)
+                atomic_write_json(account_file, current_config)
                 
                 return {"success": f"成功保存账号: {account_name} ({email})"}
             else:
@@ -181,26 +258,21 @@ class CodexAccountManagerWeb:
     def switch_account(self, account_name):
         """切换到指定账号"""
         try:
-            account_file = self.accounts_dir / f"{account_name}.json"
+            # 确认预生成的 auth.json 内容可用（账号文件变化时重新生成）
+            if self.account_switcher.prepare(account_name) is None:
+                return {"error": f"账号配置不存在或无法解析: {account_name}"}
             
-            if not account_file.exists():
-                return {"error": f"账号配置不存在: {account_name}"}
+            # 覆盖 auth.json 前保存切出账号的最新用量
+            with self.usage_checker_lock:
+                snapshot_outgoing_account(self.system_auth_file, self.get_usage_checker())
             
-            # 读取目标账号配置
-            with open(account_file, 'r', encoding='utf-8') as f:
-                target_config = json.load(f)
+            # 预生成内容原子替换系统 Codex 配置
+            record = self.account_switcher.switch(account_name, [self.system_auth_file])
+            if record is None:
+                return {"error": f"账号配置不存在或无法解析: {account_name}"}
             
-            # 移除管理字段，只保留原始配置
-            clean_config = {
-                "OPENAI_API_KEY": target_config.get("OPENAI_API_KEY"),
-                "tokens": target_config.get("tokens"),
-                "last_refresh": target_config.get("last_refresh")
-            }
-            
-            # 直接写入系统 Codex 配置
-            self.system_auth_file.parent.mkdir(parents=True, exist_ok=True)
-            with open(self.system_auth_file, 'w', encoding='utf-8') as f:
-                json.dump(clean_config, f, indent=2, ensure_ascii=False)
+            # 记录切换时间，用于把历史 session 用量归属到对应账号
+            record_switch(account_name, email=record.get('email'), account_id=record.get('account_id'))
             
             return {"success": f"成功切换到账号: {account_name}"}
             
@@ -213,6 +285,8 @@ class CodexAccountManagerWeb:
             account_file = self.accounts_dir / f"{account_name}.json"
             if account_file.exists():
                 account_file.unlink()
+                # 同时删除该账号预生成的 auth.json 内容（其中包含令牌）
+                self.account_switcher.materialize([account_name])
                 return {"success": f"成功删除账号: {account_name}"}
             else:
                 return {"error": f"账号不存在: {account_name}"}
@@ -226,8 +300,7 @@ class CodexAccountManagerWeb:
             current_email = None
             try:
                 if self.system_auth_file.exists():
-                    with open(self.system_auth_file, 'r', encoding='utf-8') as f:
-                        current_config = json.load(f)
+                    current_config = load_json(self.system_auth_file)
                     current_email = self.extract_email_from_token(current_config)
             except:
                 pass
@@ -238,8 +311,7 @@ class CodexAccountManagerWeb:
                 if not account_file.exists():
                     return {"error": f"账号配置不存在: {account_name}"}
                 
-                with open(account_file, 'r', encoding='utf-8') as f:
-                    config = json.load(f)
+                config = load_json(account_file)
                 
                 # 提取邮箱
                 email = config.get('email') or self.extract_email_from_token(config)
@@ -251,8 +323,7 @@ class CodexAccountManagerWeb:
                 if not self.auth_file.exists():
                     return {"error": "当前没有活跃的账号配置"}
                 
-                with open(self.auth_file, 'r', encoding='utf-8') as f:
-                    config = json.load(f)
+                config = load_json(self.auth_file)
                 
                 # 提取邮箱
                 email = self.extract_email_from_token(config)
@@ -262,10 +333,16 @@ class CodexAccountManagerWeb:
                 return {"error": "未能提取账号邮箱信息"}
             
             # 创建用量检查器
-            checker = OpenAIUsageChecker()
+            checker = self.get_usage_checker()
             
             # 所有账号都只从缓存读取，不自动查询session
             cached_data = checker.load_usage_data(email)
+            if not cached_data and not is_current_account:
+                # 没有缓存时根据切换日志从该账号活跃期间的历史 session 中查找
+                with self.usage_checker_lock:
+                    history = checker.get_account_usage_from_history(email)
+                if history["status"] == "success":
+                    cached_data = history
             if cached_data:
                 summary = {
                     "email": email,
@@ -288,6 +365,54 @@ class CodexAccountManagerWeb:
             return {"error": f"检查用量失败: {e}"}
 
 
+    def get_usage_history(self, days=30):
+        """从 token 事件列式存储按日汇总最近 days 天的用量"""
+        try:
+            start_ms = int((datetime.now().timestamp() - days * 86400) * 1000)
+            rows = TokenEventStore().aggregate(start_ms=start_ms, bucket='day')
+            return {"success": True, "data": rows}
+        except Exception as e:
+            return {"error": f"查询历史用量失败: {e}"}
+
+    def get_usage_trend(self, account_name, days=7):
+        """读取账号最近 days 天的 used_percent 变化历史"""
+        try:
+            account_file = self.accounts_dir / f"{account_name}.json"
+            if not account_file.exists():
+                return {"error": f"账号配置不存在: {account_name}"}
+            config = load_json(account_file)
+            email = config.get('email') or self.extract_email_from_token(config)
+            if not email:
+                return {"error": "未能提取账号邮箱信息"}
+            since = datetime.now().timestamp() - days * 86400
+            rows = self.get_usage_checker().load_usage_history(email, since)
+            return {"success": True, "email": email, "data": rows}
+        except Exception as e:
+            return {"error": f"查询用量历史失败: {e}"}
+
+    def import_accounts(self, items):
+        """批量导入账号配置，items 为 (来源, 内容) 序列"""
+        try:
+            result = AccountImporter(self.accounts_dir).run(items)
+            self.account_switcher.materialize()
+        except (tarfile.TarError, OSError) as e:
+            return {"error": f"导入失败: {e}"}
+        message = format_import_result(result)
+        if result['errors'] and not (result['imported'] or result['updated']):
+            return dict(result, error=f"导入失败: {message}")
+        return dict(result, success=f"导入完成: {message}")
+
+    def export_accounts(self, fileobj):
+        """把全部账号配置写成 tar.gz，返回导出的账号数"""
+        return export_accounts(fileobj, self.accounts_dir)
+
+    def query_sessions(self, limit=100, cursor=None, since=None, until=None, account=None):
+        """分页查询 session 元数据，返回 (本页记录, 下一页游标)"""
+        with self.session_catalog_lock:
+            if self.session_catalog is None:
+                self.session_catalog = SessionCatalog()
+        return self.session_catalog.query(limit, cursor, since, until, account)
+
     def add_config(self, account_name, config_content):
         """添加配置文件"""
         try:
@@ -300,8 +425,7 @@ class CodexAccountManagerWeb:
                 config['email'] = email
             
             account_file = self.accounts_dir / f"{account_name}.json"
-            with open(account_file, 'w', encoding='utf-8') as f:
-                json.dump(config, f, indent=2, ensure_ascii=False)
+            atomic_write_json(account_file, config)
             
             return {"success": f"成功保存账号配置: {account_name}"}
             
@@ -317,28 +441,18 @@ class CodexAccountManagerWeb:
                 return {"error": "未找到当前账号配置"}
             
             # 获取当前账号邮箱
-            with open(self.system_auth_file, 'r', encoding='utf-8') as f:
-                current_config = json.load(f)
+            current_config = load_json(self.system_auth_file)
             
             email = self.extract_email_from_token(current_config)
             if not email:
                 return {"error": "未能提取当前账号邮箱信息"}
             
-            # 从session读取最新用量数据
-            from usage_checker import OpenAIUsageChecker
-            checker = OpenAIUsageChecker()
-            summary = checker.get_usage_summary(email)
+            # 从session读取最新用量数据（成功时 get_usage_summary 已写入缓存和用量历史）
+            checker = self.get_usage_checker()
+            with self.usage_checker_lock:
+                summary = checker.get_usage_summary(email)
             
             if summary["status"] == "success":
-                # 保存到缓存
-                cache_data = {
-                    "check_time": summary["check_time"],
-                    "status": summary["status"],
-                    "token_usage": summary.get("token_usage", {}),
-                    "rate_limits": summary.get("rate_limits", {}),
-                    "errors": summary.get("errors", [])
-                }
-                checker.save_usage_data(email, cache_data)
                 return {"success": f"已刷新账号 {email} 的用量数据"}
             else:
                 errors = summary.get("errors", [])
@@ -349,7 +463,52 @@ class CodexAccountManagerWeb:
             return {"error": f"刷新失败: {e}"}
 
 
+class RequestBody(io.RawIOBase):
+    """按 Content-Length 读取请求体的流，不会读到下一个请求"""
+    
+    def __init__(self, rfile, length):
+        self.rfile = rfile
+        self.remaining = length
+    
+    def readable(self):
+        return True
+    
+    def readinto(self, buffer):
+        if self.remaining <= 0:
+            return 0
+        data = self.rfile.read(min(len(buffer), self.remaining))
+        self.remaining -= len(data)
+        buffer[:len(data)] = data
+        return len(data)
+
+
+class ChunkedWriter(io.RawIOBase):
+    """把写入的数据按 HTTP/1.1 分块传输编码发送"""
+    
+    def __init__(self, wfile):
+        self.wfile = wfile
+    
+    def writable(self):
+        return True
+    
+    def write(self, data):
+        if data:
+            self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + bytes(data) + b"\r\n")
+        return len(data)
+    
+    def close(self):
+        if not self.closed:
+            self.wfile.write(b"0\r\n\r\n")
+        super().close()
+
+
 class WebHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 以支持分块传输；普通响应都带 Content-Length
+    protocol_version = 'HTTP/1.1'
+    SESSIONS_PAGE_MAX = 1000
+    SESSIONS_CHUNK_LINES = 100
+    ACCOUNTS_PAGE_MAX = 500
+
     def __init__(self, manager, *args, **kwargs):
         self.manager = manager
         super().__init__(*args, **kwargs)
@@ -357,21 +516,49 @@ class WebHandler(BaseHTTPRequestHandler):
     def do_GET(self):
         if self.path == '/' or self.path == '/index.html':
             self.serve_main_page()
-        elif self.path == '/api/accounts':
-            self.serve_accounts_api()
+        elif urlparse(self.path).path == '/api/accounts':
+            self.serve_accounts_api(parse_qs(urlparse(self.path).query))
         elif self.path.startswith('/api/usage/'):
             account_name = self.path.split('/')[-1]
             self.serve_account_usage_api(account_name)
         elif self.path == '/api/refresh_usage':
             self.serve_refresh_usage_api()
+        elif self.path == '/api/usage_events':
+            self.serve_usage_events()
+        elif self.path == '/api/usage_history':
+            self.serve_usage_history_api()
+        elif self.path.startswith('/api/usage_trend/'):
+            url = urlparse(self.path)
+            params = parse_qs(url.query)
+            try:
+                days = int(params.get('days', ['7'])[0])
+            except ValueError:
+                days = 7
+            self.send_json_response(self.manager.get_usage_trend(url.path.split('/')[-1], days))
+        elif urlparse(self.path).path == '/api/sessions':
+            self.serve_sessions_api(parse_qs(urlparse(self.path).query))
         else:
             self.send_error(404)
 
     def do_POST(self):
+        if self.path == '/api/import':
+            if not self.is_trusted_request(self.headers.get('X-Session-Token')):
+                self.close_connection = True
+                self.send_error(403)
+                return
+            # 上传内容可能很大，不一次性读入内存
+            self.serve_import_api()
+            return
         content_length = int(self.headers['Content-Length'])
         post_data = self.rfile.read(content_length).decode('utf-8')
         
-        if self.path == '/api/quick_save':
+        if self.path == '/api/export':
+            data = parse_qs(post_data)
+            if not self.is_trusted_request(data.get('token', [''])[0]):
+                self.send_error(403)
+                return
+            self.serve_export_api()
+        elif self.path == '/api/quick_save':
             result = self.manager.quick_save_account()
             self.send_json_response(result)
         elif self.path == '/api/switch':
@@ -393,16 +580,46 @@ class WebHandler(BaseHTTPRequestHandler):
         else:
             self.send_error(404)
 
+    def is_trusted_request(self, token) -> bool:
+        """请求来自本机管理页面：Host/Origin 指向本服务且携带本次运行的访问令牌
+
+        检查 Host 防止 DNS 重绑定，检查 Origin 和令牌防止其他网页跨站提交。
+        """
+        port = self.server.server_address[1]
+        local_hosts = {f"localhost:{port}", f"127.0.0.1:{port}"}
+        if self.headers.get('Host') not in local_hosts:
+            return False
+        origin = self.headers.get('Origin')
+        if origin is not None and origin not in {f"http://{host}" for host in local_hosts}:
+            return False
+        return bool(token) and hmac.compare_digest(token, self.manager.session_token)
+
     def serve_main_page(self):
-        html = self.get_main_html()
+        html = self.get_main_html().replace('__SESSION_TOKEN__', self.manager.session_token).encode('utf-8')
         self.send_response(200)
         self.send_header('Content-type', 'text/html; charset=utf-8')
+        self.send_header('Cache-Control', 'no-store')
+        self.send_header('Content-Length', str(len(html)))
         self.end_headers()
-        self.wfile.write(html.encode('utf-8'))
+        self.wfile.write(html)
 
-    def serve_accounts_api(self):
-        accounts = self.manager.get_accounts_data()
-        self.send_json_response(accounts)
+    def serve_accounts_api(self, params):
+        """不带参数时返回全部账号；带 limit/cursor/q/plan/sort 时分页返回"""
+        if not params:
+            self.send_json_response(self.manager.get_accounts_data())
+            return
+        
+        def param(name):
+            return params.get(name, [None])[0] or None
+        
+        try:
+            limit = min(max(int(param('limit') or 50), 1), self.ACCOUNTS_PAGE_MAX)
+            result = self.manager.query_accounts(
+                limit, param('cursor'), param('q'), param('plan'), param('sort') or 'name')
+        except ValueError as e:
+            self.send_json_response({"error": f"参数无效: {e}"})
+            return
+        self.send_json_response(result)
 
     def serve_account_usage_api(self, account_name):
         result = self.manager.check_account_usage(account_name)
@@ -412,11 +629,105 @@ class WebHandler(BaseHTTPRequestHandler):
         result = self.manager.refresh_current_usage()
         self.send_json_response(result)
 
+    def serve_usage_history_api(self):
+        result = self.manager.get_usage_history()
+        self.send_json_response(result)
+
+    def serve_usage_events(self):
+        """以 Server-Sent Events 推送新的用量事件"""
+        self.send_response(200)
+        self.send_header('Content-type', 'text/event-stream; charset=utf-8')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        
+        last_event_id = self.manager.usage_event_id
+        try:
+            while True:
+                event_id, event = self.manager.wait_usage_event(last_event_id, timeout=30)
+                if event_id == last_event_id:
+                    # 心跳，及时发现已断开的连接
+                    self.wfile.write(b': ping\n\n')
+                else:
+                    last_event_id = event_id
+                    data = json.dumps(event, ensure_ascii=False)
+                    self.wfile.write(f"id: {event_id}\ndata: {data}\n\n".encode('utf-8'))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def serve_sessions_api(self, params):
+        """以 NDJSON 分块流式返回 session 元数据，下一页游标放在 X-Next-Cursor 响应头"""
+        def param(name):
+            return params.get(name, [None])[0] or None
+        
+        try:
+            limit = min(max(int(param('limit') or 100), 1), self.SESSIONS_PAGE_MAX)
+            page, next_cursor = self.manager.query_sessions(
+                limit, param('cursor'), param('since'), param('until'), param('account'))
+        except ValueError:
+            self.send_json_response({"error": "参数无效: limit 须为整数，since/until 格式为 YYYY-MM-DD"})
+            return
+        
+        self.send_response(200)
+        self.send_header('Content-type', 'application/x-ndjson; charset=utf-8')
+        self.send_header('Transfer-Encoding', 'chunked')
+        if next_cursor:
+            self.send_header('X-Next-Cursor', next_cursor)
+        self.end_headers()
+        try:
+            for start in range(0, len(page), self.SESSIONS_CHUNK_LINES):
+                lines = page[start:start + self.SESSIONS_CHUNK_LINES]
+                chunk = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in lines).encode('utf-8')
+                self.wfile.write(f"{len(chunk):x}\r\n".encode('ascii') + chunk + b"\r\n")
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def serve_import_api(self):
+        """批量导入：请求体为 tar/tar.gz 归档，或 Content-Type 为 application/x-ndjson 的多文件流"""
+        try:
+            content_length = int(self.headers['Content-Length'])
+        except (TypeError, ValueError):
+            self.send_json_response({"error": "缺少 Content-Length"})
+            return
+        
+        body = io.BufferedReader(RequestBody(self.rfile, content_length))
+        content_type = (self.headers.get('Content-Type') or '').split(';')[0].strip()
+        items = iter_source("上传内容", iter_ndjson(body) if content_type == 'application/x-ndjson' else iter_tar(body))
+        result = self.manager.import_accounts(items)
+        # 出错时丢弃未读完的请求体，保持连接可复用
+        try:
+            while body.read(65536):
+                pass
+        except (OSError, ValueError):
+            self.close_connection = True
+        self.send_json_response(result)
+
+    def serve_export_api(self):
+        """以分块传输流式返回全部账号的 tar.gz"""
+        self.send_response(200)
+        self.send_header('Content-type', 'application/gzip')
+        self.send_header('Content-Disposition', 'attachment; filename="codex-accounts.tar.gz"')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        writer = ChunkedWriter(self.wfile)
+        try:
+            self.manager.export_accounts(writer)
+            writer.close()
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
     def send_json_response(self, data):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
         self.send_response(200)
         self.send_header('Content-type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
         self.end_headers()
-        self.wfile.write(json.dumps(data, ensure_ascii=False).encode('utf-8'))
+        self.wfile.write(body)
 
     def get_main_html(self):
         return '''<!DOCTYPE html>
@@ -534,6 +845,20 @@ class WebHandler(BaseHTTPRequestHandler):
             flex-wrap: wrap;
         }
         
+        .list-filters input,
+        .list-filters select {
+            padding: 8px 12px;
+            border: 2px solid var(--border);
+            border-radius: 8px;
+            font-size: 14px;
+            background: var(--card-bg);
+        }
+        
+        .list-filters input {
+            flex: 1;
+            min-width: 160px;
+        }
+        
         .accounts-grid { 
             display: grid; 
             gap: 16px; 
@@ -913,12 +1238,28 @@ class WebHandler(BaseHTTPRequestHandler):
                     <div class="alert" style="background: #f0f9ff; border-color: #0ea5e9; color: #0c4a6e; margin-bottom: 20px;">
                         只能刷新当前账号的用量数据。刷新数据前请先用 codex 发送消息后点击「刷新用量」按钮。
                     </div>
+                    <div class="toolbar list-filters">
+                        <input type="search" id="account-search" placeholder="搜索名称或邮箱" oninput="scheduleAccountSearch()">
+                        <select id="account-plan" onchange="loadAccounts()">
+                            <option value="">全部套餐</option>
+                        </select>
+                        <select id="account-sort" onchange="loadAccounts()">
+                            <option value="name">按名称</option>
+                            <option value="headroom">按剩余额度</option>
+                            <option value="reset">按重置时间</option>
+                            <option value="saved_at">按保存时间</option>
+                        </select>
+                        <span id="accounts-total" style="align-self: center; color: var(--text-light); font-size: 13px;"></span>
+                    </div>
                     <div id="accounts-list" class="accounts-grid">
                         <div class="empty-state">
                             <div class="empty-state-icon"></div>
                             <div>正在加载账号列表...</div>
                         </div>
                     </div>
+                    <button class="btn btn-secondary" id="load-more-btn" onclick="loadMoreAccounts()" style="display: none; width: 100%; margin-top: 16px;">
+                        加载更多
+                    </button>
                 </div>
             </div>
 
@@ -962,6 +1303,28 @@ class WebHandler(BaseHTTPRequestHandler):
                         </button>
                     </div>
                 </div>
+                
+                <div class="collapsible" id="bulk-section">
+                    <div class="collapsible-header" onclick="toggleCollapsible('bulk-section')">
+                        <span>批量导入/导出</span>
+                        <span>▼</span>
+                    </div>
+                    <div class="collapsible-content">
+                        <div class="input-group">
+                            <label>选择多个 auth.json 或一个 tar/tar.gz 归档:</label>
+                            <input type="file" id="bulk-files" multiple accept=".json,.tar,.gz,.tgz">
+                        </div>
+                        <button class="btn btn-success" id="bulk-import-btn" onclick="importAccounts()" style="width: 100%;">
+                            批量导入
+                        </button>
+                        <form method="post" action="/api/export">
+                            <input type="hidden" name="token" value="__SESSION_TOKEN__">
+                            <button type="submit" class="btn btn-secondary" style="width: 100%; margin-top: 12px;">
+                                导出全部账号
+                            </button>
+                        </form>
+                    </div>
+                </div>
             </div>
         </div>
     </div>
@@ -970,9 +1333,16 @@ class WebHandler(BaseHTTPRequestHandler):
 
     <script>
         let selectedAccount = null;
+        // 本次运行的访问令牌，导入/导出账号时携带
+        const SESSION_TOKEN = '__SESSION_TOKEN__';
 
         // 全局变量
-        let isLoading = false;
+        // 当前账号列表请求；新的筛选会中止尚未完成的旧请求，而不是被丢弃
+        let accountsController = null;
+        // 账号列表分页：每页只加载可见的账号
+        const ACCOUNTS_PAGE_SIZE = 50;
+        let accountsCursor = null;
+        let accountSearchTimer = null;
         
         function showMessage(message, type = 'success') {
             const messageArea = document.getElementById('message-area');
@@ -1023,36 +1393,8 @@ class WebHandler(BaseHTTPRequestHandler):
             }
         }
 
-        async function loadAccounts() {
-            if (isLoading) return;
-            isLoading = true;
-            
-            try {
-                const container = document.getElementById('accounts-list');
-                container.innerHTML = `
-                    <div class="empty-state">
-                        <div class="loading-spinner"></div>
-                        <div style="margin-top: 12px;">正在加载账号列表...</div>
-                    </div>
-                `;
-
-                const response = await fetch('/api/accounts');
-                const accounts = await response.json();
-                
-                if (accounts.length === 0) {
-                    container.innerHTML = `
-                        <div class="empty-state">
-                            <div class="empty-state-icon"></div>
-                            <div>还没有保存的账号配置</div>
-                            <button class="btn btn-primary" onclick="toggleCollapsible('add-config-section')" style="margin-top: 16px;">
-                                添加第一个账号
-                            </button>
-                        </div>
-                    `;
-                    return;
-                }
-
-                container.innerHTML = accounts.map(account => `
+        function renderAccountCard(account) {
+            return `
                     <div class="account-card ${account.is_current ? 'current-account' : ''}" onclick="selectAccount('${account.name}')" data-account="${account.name}">
                         <div class="account-header">
                             <div class="account-name">${account.name}</div>
@@ -1093,14 +1435,98 @@ class WebHandler(BaseHTTPRequestHandler):
                             `}
                         </div>
                     </div>
-                `).join('');
+                `;
+        }
+
+        async function fetchAccountsPage(cursor, signal) {
+            const params = new URLSearchParams({
+                limit: ACCOUNTS_PAGE_SIZE,
+                sort: document.getElementById('account-sort').value
+            });
+            const q = document.getElementById('account-search').value.trim();
+            const plan = document.getElementById('account-plan').value;
+            if (q) params.set('q', q);
+            if (plan) params.set('plan', plan);
+            if (cursor) params.set('cursor', cursor);
+            const response = await fetch(`/api/accounts?${params}`, { signal });
+            const result = await response.json();
+            if (result.error) throw new Error(result.error);
+            return result;
+        }
+
+        function showAccountsPage(result, append) {
+            const container = document.getElementById('accounts-list');
+            const html = result.accounts.map(renderAccountCard).join('');
+            if (append) {
+                container.insertAdjacentHTML('beforeend', html);
+            } else {
+                container.innerHTML = html;
+            }
+            
+            // 更新套餐筛选项，保留当前选择
+            const planSelect = document.getElementById('account-plan');
+            const selectedPlan = planSelect.value;
+            planSelect.innerHTML = '<option value="">全部套餐</option>' +
+                result.plans.map(plan => `<option value="${plan}">${plan}</option>`).join('');
+            planSelect.value = selectedPlan;
+            
+            accountsCursor = result.next_cursor;
+            document.getElementById('load-more-btn').style.display = accountsCursor ? 'block' : 'none';
+            document.getElementById('accounts-total').textContent = `共 ${result.total} 个账号`;
+            
+            // 只为本页账号加载用量信息，错开请求避免一次性请求过多
+            result.accounts.forEach((account, index) => {
+                setTimeout(() => loadAccountUsage(account.name), index * 50);
+            });
+        }
+
+        function scheduleAccountSearch() {
+            clearTimeout(accountSearchTimer);
+            accountSearchTimer = setTimeout(loadAccounts, 300);
+        }
+
+        async function loadAccounts() {
+            if (accountsController) accountsController.abort();
+            const controller = new AbortController();
+            accountsController = controller;
+            
+            try {
+                const container = document.getElementById('accounts-list');
+                container.innerHTML = `
+                    <div class="empty-state">
+                        <div class="loading-spinner"></div>
+                        <div style="margin-top: 12px;">正在加载账号列表...</div>
+                    </div>
+                `;
+
+                const result = await fetchAccountsPage(null, controller.signal);
+                if (controller !== accountsController) return;
                 
-                // 延迟加载用量信息，避免一次性请求过多
-                accounts.forEach((account, index) => {
-                    setTimeout(() => loadAccountUsage(account.name), index * 200);
-                });
+                if (result.accounts.length === 0) {
+                    const filtered = document.getElementById('account-search').value.trim() || document.getElementById('account-plan').value;
+                    document.getElementById('load-more-btn').style.display = 'none';
+                    document.getElementById('accounts-total').textContent = '';
+                    container.innerHTML = filtered ? `
+                        <div class="empty-state">
+                            <div class="empty-state-icon"></div>
+                            <div>没有匹配的账号</div>
+                        </div>
+                    ` : `
+                        <div class="empty-state">
+                            <div class="empty-state-icon"></div>
+                            <div>还没有保存的账号配置</div>
+                            <button class="btn btn-primary" onclick="toggleCollapsible('add-config-section')" style="margin-top: 16px;">
+                                添加第一个账号
+                            </button>
+                        </div>
+                    `;
+                    return;
+                }
+
+                showAccountsPage(result, false);
                 
             } catch (error) {
+                if (controller !== accountsController) return;
                 const container = document.getElementById('accounts-list');
                 container.innerHTML = `
                     <div class="empty-state">
@@ -1112,7 +1538,24 @@ class WebHandler(BaseHTTPRequestHandler):
                     </div>
                 `;
             } finally {
-                isLoading = false;
+                if (controller === accountsController) accountsController = null;
+            }
+        }
+
+        async function loadMoreAccounts() {
+            // 进行中的请求完成后会给出新的游标，此时再翻页
+            if (accountsController || !accountsCursor) return;
+            const controller = new AbortController();
+            accountsController = controller;
+            setButtonLoading('load-more-btn', true);
+            try {
+                const result = await fetchAccountsPage(accountsCursor, controller.signal);
+                if (controller === accountsController) showAccountsPage(result, true);
+            } catch (error) {
+                if (controller === accountsController) showMessage('加载失败: ' + error.message, 'error');
+            } finally {
+                setButtonLoading('load-more-btn', false, '加载更多');
+                if (controller === accountsController) accountsController = null;
             }
         }
 
@@ -1398,6 +1841,48 @@ class WebHandler(BaseHTTPRequestHandler):
             }
         }
 
+        async function importAccounts() {
+            const files = Array.from(document.getElementById('bulk-files').files);
+            if (files.length === 0) {
+                showMessage('请先选择要导入的文件', 'error');
+                return;
+            }
+            
+            setButtonLoading('bulk-import-btn', true);
+            try {
+                let body, contentType;
+                if (files.length === 1 && /\.(tar|tgz|gz)$/i.test(files[0].name)) {
+                    // 归档直接上传，由服务端流式解包
+                    body = files[0];
+                    contentType = 'application/x-tar';
+                } else {
+                    // 多个文件按 NDJSON 逐行上传
+                    const lines = await Promise.all(files.map(async file =>
+                        JSON.stringify({source: file.name, content: await file.text()}) + '\n'));
+                    body = new Blob(lines);
+                    contentType = 'application/x-ndjson';
+                }
+                const response = await fetch('/api/import', {
+                    method: 'POST',
+                    headers: {'Content-Type': contentType, 'X-Session-Token': SESSION_TOKEN},
+                    body: body
+                });
+                const result = await response.json();
+                
+                if (result.success) {
+                    showMessage(result.success);
+                    document.getElementById('bulk-files').value = '';
+                    await loadAccounts();
+                } else {
+                    showMessage(result.error, 'error');
+                }
+            } catch (error) {
+                showMessage('网络错误: ' + error.message, 'error');
+            } finally {
+                setButtonLoading('bulk-import-btn', false, '批量导入');
+            }
+        }
+
         async function refreshUsage() {
             try {
                 setButtonLoading('refresh-usage-btn', true);
@@ -1444,11 +1929,9 @@ class WebHandler(BaseHTTPRequestHandler):
         }
 
         function refreshData() {
-            if (!isLoading) {
-                selectedAccount = null;
-                updateActionButtons();
-                loadAccounts();
-            }
+            selectedAccount = null;
+            updateActionButtons();
+            loadAccounts();
         }
 
         // 页面加载完成后初始化
@@ -1461,6 +1944,17 @@ class WebHandler(BaseHTTPRequestHandler):
         window.addEventListener('focus', function() {
             refreshData();
         });
+
+        // 服务端在 session 中出现新的用量事件时推送通知，只刷新当前账号的用量
+        if (window.EventSource) {
+            const usageEvents = new EventSource('/api/usage_events');
+            usageEvents.onmessage = function() {
+                const currentCard = document.querySelector('.account-card.current-account');
+                if (currentCard) {
+                    loadAccountUsage(currentCard.dataset.account);
+                }
+            };
+        }
     </script>
 </body>
 </html>'''
@@ -1481,7 +1975,10 @@ def main():
     manager = CodexAccountManagerWeb()
     
     port = 8890
-    server = HTTPServer(('localhost', port), create_handler(manager))
+    server = ThreadingHTTPServer(('localhost', port), create_handler(manager))
+    server.daemon_threads = True
+    manager.start_usage_watcher()
+    manager.start_background_maintenance()
     
     print(f"OpenAI Codex 账号管理器已启动")
     print(f"配置存储: {Path(__file__).parent / 'codex-config'}")
@@ -1498,6 +1995,8 @@ def main():
         server.serve_forever()
     except KeyboardInterrupt:
         print("\n👋 服务已停止")
+        manager.stop_usage_watcher()
+        manager.stop_background_maintenance()
         server.shutdown()
 
 
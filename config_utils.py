@@ -40,6 +40,10 @@ def get_config_paths():
         'auth_file': codex_dir / "auth.json",
         'accounts_dir': codex_dir / "accounts",
         'usage_cache_dir': usage_cache_dir,
+        'switch_journal_file': codex_dir / "switch_journal.jsonl",
+        'account_registry_file': codex_dir / "account_registry.json",
+        'auth_payload_dir': codex_dir / "auth_payloads",
+        'lock_dir': usage_cache_dir / "locks",
         'system_auth_file': system_auth_file
     }
 
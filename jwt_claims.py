@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+JWT 声明解码
+
+id_token / access_token 的 payload 只做 base64 + JSON 解码（不校验签名）。
+每个不同的令牌只解码一次，结果按令牌的 SHA-256 摘要缓存在有上限的 LRU 中，
+缓存里不保存令牌原文。账号列表、用量查询等路径统一通过 auth_claims 取邮箱、
+套餐、account_id、exp 和 iat。
+"""
+
+import base64
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+# 最多缓存的令牌数（每个账号两个令牌）
+CLAIMS_CACHE_SIZE = 4096
+
+AUTH_CLAIM = 'https://api.openai.com/auth'
+PROFILE_CLAIM = 'https://api.openai.com/profile'
+
+_cache: 'OrderedDict[bytes, Optional[Dict]]' = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _decode_payload(token: str) -> Optional[Dict]:
+    parts = token.split('.')
+    if len(parts) < 3:
+        return None
+    payload = parts[1] + '=' * (-len(parts[1]) % 4)
+    try:
+        data = json.loads(base64.urlsafe_b64decode(payload))
+    except (ValueError, TypeError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def decode_jwt_payload(token) -> Optional[Dict]:
+    """解码 JWT 的 payload，结果按令牌摘要缓存；返回的字典为共享对象，调用方不应修改"""
+    if not isinstance(token, str) or not token:
+        return None
+    key = hashlib.sha256(token.encode('utf-8')).digest()
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    claims = _decode_payload(token)
+    with _cache_lock:
+        _cache[key] = claims
+        _cache.move_to_end(key)
+        while len(_cache) > CLAIMS_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return claims
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
+
+
+def _decode_tokens(config):
+    tokens = config.get('tokens') if isinstance(config, dict) and isinstance(config.get('tokens'), dict) else {}
+    id_claims = decode_jwt_payload(tokens.get('id_token')) or {}
+    access_claims = decode_jwt_payload(tokens.get('access_token')) or {}
+    return tokens, id_claims, access_claims
+
+
+def _token_email(id_claims: Dict, access_claims: Dict) -> Optional[str]:
+    profile = access_claims.get(PROFILE_CLAIM)
+    return id_claims.get('email') or (profile.get('email') if isinstance(profile, dict) else None)
+
+
+def auth_claims(config) -> Dict:
+    """从账号配置 / auth.json 中提取 email、plan_type、account_id、exp、iat
+
+    邮箱优先取配置中的 email，其次 id_token，最后 access_token 的 profile；
+    exp/iat 取自 access_token（缺失时回退到 id_token）。
+    """
+    tokens, id_claims, access_claims = _decode_tokens(config)
+    auth_info = access_claims.get(AUTH_CLAIM) or id_claims.get(AUTH_CLAIM)
+    auth_info = auth_info if isinstance(auth_info, dict) else {}
+
+    def timestamp(name):
+        value = access_claims.get(name, id_claims.get(name))
+        return value if isinstance(value, (int, float)) else None
+
+    return {
+        'email': (config.get('email') if isinstance(config, dict) else None) or _token_email(id_claims, access_claims),
+        'plan_type': auth_info.get('chatgpt_plan_type'),
+        'account_id': tokens.get('account_id') or auth_info.get('chatgpt_account_id'),
+        'exp': timestamp('exp'),
+        'iat': timestamp('iat')
+    }
+
+
+def email_from_auth(config) -> Optional[str]:
+    """只从令牌中提取邮箱（不使用配置中的 email 字段）"""
+    _, id_claims, access_claims = _decode_tokens(config)
+    return _token_email(id_claims, access_claims)
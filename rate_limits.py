@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+速率限制快照的重置时间换算
+
+token_count 事件中的 resets_in_seconds 是相对事件发生时刻的秒数。保存快照时
+统一换算为绝对时间 resets_at（Unix 秒），读取时再按当前时间推算：
+窗口已经重置的限额视为 0% 并顺延到下一次重置，resets_in_seconds 重新按当前时间计算。
+"""
+
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+
+def parse_check_time(check_time) -> Optional[float]:
+    """解析快照的 check_time（%Y-%m-%d %H:%M:%S 或 ISO 格式）"""
+    if not isinstance(check_time, str) or not check_time:
+        return None
+    try:
+        return datetime.fromisoformat(check_time).timestamp()
+    except ValueError:
+        return None
+
+
+def normalize_rate_limits(rate_limits: Dict, captured_at: float = None) -> Dict:
+    """为每个限额补充绝对重置时间 resets_at，captured_at 为数据采集时刻（默认当前时间）
+
+    已带有数值 resets_at 的限额保持不变，因此可以重复调用。
+    """
+    if not isinstance(rate_limits, dict):
+        return rate_limits
+    captured_at = time.time() if captured_at is None else captured_at
+    normalized = {}
+    for name, limit in rate_limits.items():
+        if isinstance(limit, dict) and not isinstance(limit.get('resets_at'), (int, float)):
+            resets_in_seconds = limit.get('resets_in_seconds')
+            if isinstance(resets_in_seconds, (int, float)):
+                limit = dict(limit, resets_at=captured_at + float(resets_in_seconds))
+        normalized[name] = limit
+    return normalized
+
+
+def project_limit(limit: Dict, now: float = None) -> Dict:
+    """按当前时间推算单个限额
+
+    重置时间已过时 used_percent 记为 0，并按窗口长度顺延 resets_at；
+    原始值保留在 captured_used_percent 中，reset_elapsed 标记窗口是否已重置。
+    """
+    if not isinstance(limit, dict) or not isinstance(limit.get('resets_at'), (int, float)):
+        return limit
+    now = time.time() if now is None else now
+    resets_at = float(limit['resets_at'])
+    projected = dict(limit)
+    # 已经推算过的快照再次推算时保留已重置标记
+    projected['reset_elapsed'] = bool(limit.get('reset_elapsed')) or resets_at <= now
+    if resets_at <= now:
+        projected['captured_used_percent'] = limit.get('used_percent')
+        projected['used_percent'] = 0.0
+        window_minutes = limit.get('window_minutes')
+        if isinstance(window_minutes, (int, float)) and window_minutes > 0:
+            window = float(window_minutes) * 60
+            resets_at += ((now - resets_at) // window + 1) * window
+        else:
+            resets_at = None
+    projected['resets_at'] = resets_at
+    projected['resets_in_seconds'] = int(max(resets_at - now, 0)) if resets_at is not None else None
+    return projected
+
+
+def project_rate_limits(rate_limits: Dict, captured_at: float = None, now: float = None) -> Dict:
+    """推算全部限额当前的有效用量；缺少 resets_at 的旧快照以 captured_at 为采集时刻换算"""
+    if not isinstance(rate_limits, dict):
+        return rate_limits
+    normalized = normalize_rate_limits(rate_limits, captured_at)
+    return {name: project_limit(limit, now) for name, limit in normalized.items()}
+
+
+def project_usage_data(usage_data: Dict, now: float = None) -> Dict:
+    """推算缓存快照中 rate_limits 的当前有效值，采集时刻取自 check_time"""
+    if not isinstance(usage_data, dict) or not isinstance(usage_data.get('rate_limits'), dict):
+        return usage_data
+    captured_at = parse_check_time(usage_data.get('check_time'))
+    return dict(usage_data, rate_limits=project_rate_limits(usage_data['rate_limits'], captured_at, now))
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Codex session 归档工具
+
+将超过指定天数的 rollout-*.jsonl 原地压缩为 .jsonl.gz / .jsonl.xz，
+并写入 .idx.json 索引旁路文件，记录最后一个 token_count 事件，
+之后查询归档文件的用量时无需完整解压。
+
+用法: python3 session_archive.py [--days 30] [--format gz|xz] [--dry-run]
+"""
+
+import argparse
+import gzip
+import json
+import lzma
+import os
+import shutil
+import sys
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from atomic_io import atomic_write_json
+
+
+COMPRESSED_SUFFIXES = {
+    '.jsonl.gz': gzip.open,
+    '.jsonl.xz': lzma.open,
+}
+ROLLOUT_SUFFIXES = ('.jsonl',) + tuple(COMPRESSED_SUFFIXES)
+# 读取损坏或截断的归档时可能出现的异常（gzip.BadGzipFile 属于 OSError）
+ARCHIVE_READ_ERRORS = (OSError, EOFError, lzma.LZMAError, zlib.error)
+SIDECAR_SUFFIX = '.idx.json'
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+
+def is_rollout_name(name: str) -> bool:
+    """判断文件名是否为 rollout 文件（包括已压缩的归档）"""
+    return name.startswith('rollout-') and name.endswith(ROLLOUT_SUFFIXES)
+
+
+def is_compressed_rollout(path) -> bool:
+    return str(path).endswith(tuple(COMPRESSED_SUFFIXES))
+
+
+def open_rollout(path):
+    """以二进制模式打开 rollout 文件，压缩文件通过流式解压透明读取"""
+    for suffix, opener in COMPRESSED_SUFFIXES.items():
+        if str(path).endswith(suffix):
+            return opener(path, 'rb')
+    return open(path, 'rb')
+
+
+def sidecar_path(path) -> Path:
+    return Path(str(path) + SIDECAR_SUFFIX)
+
+
+def _load_sidecar(path, stat_result: os.stat_result) -> Optional[Dict]:
+    """读取与归档文件大小一致的索引旁路文件"""
+    try:
+        with open(sidecar_path(path), 'r', encoding='utf-8') as f:
+            sidecar = json.load(f)
+    except (OSError, IOError, json.JSONDecodeError, ValueError):
+        return None
+    if not isinstance(sidecar, dict) or sidecar.get('archive_size') != stat_result.st_size:
+        return None
+    return sidecar
+
+
+def _write_sidecar(path, archive_size: int, offset: Optional[int], event: Optional[Dict]) -> bool:
+    sidecar = {
+        'archive_size': archive_size,
+        'offset': offset,
+        'last_token_count': event
+    }
+    try:
+        atomic_write_json(sidecar_path(path), sidecar, lock=False, indent=None)
+        return True
+    except (OSError, IOError):
+        return False
+
+
+def stream_last_usage_event(stream) -> Tuple[Optional[int], Optional[Dict]]:
+    """流式读取整个文件，返回最后一个 token_count 事件的 (解压后偏移, 事件)"""
+    from usage_checker import find_last_usage_event
+
+    found = (None, None)
+    base = 0
+    remainder = b""
+    while True:
+        chunk = stream.read(STREAM_CHUNK_SIZE)
+        if not chunk:
+            break
+        buffer = remainder + chunk
+        last_newline = buffer.rfind(b"\n")
+        if last_newline < 0:
+            remainder = buffer
+            continue
+        offset, event = find_last_usage_event(buffer, last_newline)
+        if event:
+            found = (base + offset, event)
+        remainder = buffer[last_newline + 1:]
+        base += last_newline + 1
+    if remainder:
+        offset, event = find_last_usage_event(remainder)
+        if event:
+            found = (base + offset, event)
+    return found
+
+
+def read_archived_usage_event(path) -> Tuple[Optional[int], Optional[Dict]]:
+    """查找压缩 rollout 中最后一个 token_count 事件，优先使用索引旁路文件"""
+    stat_result = os.stat(path)
+    sidecar = _load_sidecar(path, stat_result)
+    if sidecar is not None:
+        return sidecar.get('offset'), sidecar.get('last_token_count')
+
+    # 没有可用的旁路文件时完整解压一次，并补写旁路文件
+    with open_rollout(path) as stream:
+        offset, event = stream_last_usage_event(stream)
+    _write_sidecar(path, stat_result.st_size, offset, event)
+    return offset, event
+
+
+def archive_session_file(session_file: Path, fmt: str = 'gz') -> Optional[int]:
+    """原地压缩单个 rollout 文件，返回节省的字节数，失败返回 None"""
+    from usage_checker import scan_last_usage_event
+    from session_summary import build_session_summary, summary_path
+
+    suffix = f'.jsonl.{fmt}'
+    opener = COMPRESSED_SUFFIXES[suffix]
+    target = session_file.with_name(session_file.name[:-len('.jsonl')] + suffix)
+    tmp_target = target.with_name(target.name + '.tmp')
+
+    try:
+        stat_result = os.stat(session_file)
+        offset, event = scan_last_usage_event(session_file)
+        summary = build_session_summary(session_file)
+        with open(session_file, 'rb') as src, opener(tmp_target, 'wb') as dst:
+            shutil.copyfileobj(src, dst, STREAM_CHUNK_SIZE)
+        # 保留原始修改时间，查找最新 session 时的排序不受归档影响
+        os.utime(tmp_target, ns=(stat_result.st_atime_ns, stat_result.st_mtime_ns))
+        archive_size = os.stat(tmp_target).st_size
+        if not _write_sidecar(target, archive_size, offset, event):
+            raise OSError("无法写入索引文件")
+        os.replace(tmp_target, target)
+        # 摘要随文件一起迁移到归档文件名下
+        summary['source_size'] = archive_size
+        atomic_write_json(summary_path(target), summary, lock=False, indent=None)
+        session_file.unlink()
+        try:
+            summary_path(session_file).unlink()
+        except FileNotFoundError:
+            pass
+        return stat_result.st_size - archive_size
+    except (OSError, IOError, EOFError, lzma.LZMAError) as e:
+        print(f"❌ 归档 {session_file.name} 失败: {e}")
+        try:
+            tmp_target.unlink()
+        except OSError:
+            pass
+        return None
+
+
+def archive_sessions(sessions_dir, older_than_days: int = 30, fmt: str = 'gz',
+                     dry_run: bool = False) -> Dict:
+    """压缩超过 older_than_days 天未修改的 rollout 文件"""
+    sessions_dir = Path(sessions_dir)
+    cutoff = time.time() - older_than_days * 86400
+    result = {'archived': 0, 'failed': 0, 'saved_bytes': 0, 'candidates': []}
+    if not sessions_dir.exists():
+        return result
+
+    for session_file in sorted(sessions_dir.rglob("rollout-*.jsonl")):
+        try:
+            if session_file.stat().st_mtime >= cutoff:
+                continue
+        except OSError:
+            continue
+        result['candidates'].append(session_file)
+        if dry_run:
+            continue
+        saved = archive_session_file(session_file, fmt)
+        if saved is None:
+            result['failed'] += 1
+        else:
+            result['archived'] += 1
+            result['saved_bytes'] += saved
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="压缩归档旧的 Codex session 文件",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例:
+  python session_archive.py                 # 压缩 30 天前的 session
+  python session_archive.py --days 7 -f xz  # 使用 xz 压缩 7 天前的 session
+  python session_archive.py --dry-run       # 只列出将被压缩的文件
+        """
+    )
+    parser.add_argument('--days', type=int, default=30,
+                        help='压缩超过多少天未修改的 session（默认30）')
+    parser.add_argument('-f', '--format', choices=['gz', 'xz'], default='gz',
+                        help='压缩格式（默认 gz）')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='只列出将被压缩的文件')
+    parser.add_argument('--sessions-dir',
+                        help='session 目录（默认 ~/.codex/sessions）')
+    args = parser.parse_args()
+
+    sessions_dir = Path(args.sessions_dir) if args.sessions_dir else Path.home() / ".codex" / "sessions"
+    print(f"📦 归档 {args.days} 天前的 session: {sessions_dir}")
+    result = archive_sessions(sessions_dir, args.days, args.format, args.dry_run)
+
+    if args.dry_run:
+        for session_file in result['candidates']:
+            print(f"  - {session_file}")
+        print(f"共 {len(result['candidates'])} 个文件待压缩")
+    else:
+        print(f"✅ 已压缩 {result['archived']} 个文件，节省 {result['saved_bytes'] / 1024 / 1024:.1f} MB")
+        if result['failed']:
+            print(f"⚠️ {result['failed']} 个文件压缩失败")
+    sys.exit(1 if result['failed'] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Codex session 元数据目录
+
+为每个 rollout 记录开始/结束时间、cwd、model 和最终 token 用量，
+按 (mtime, size) 增量维护并持久化到 usage_cache_dir。查询时结合切换日志
+得到每个 session 归属的账号，支持按日期范围/账号过滤与游标分页。
+"""
+
+import base64
+import json
+import os
+import threading
+import time
+from bisect import bisect_right
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from atomic_io import update_json_entries
+from session_archive import ARCHIVE_READ_ERRORS, is_rollout_name
+from session_summary import build_session_summary, load_session_summary
+from switch_journal import SwitchJournal, parse_event_timestamp
+
+
+CATALOG_FILENAME = "session_catalog.json"
+CATALOG_VERSION = 1
+# 两次扫描 sessions 目录之间的最短间隔（秒）
+REFRESH_INTERVAL = 5.0
+
+
+def encode_cursor(key: Tuple[float, str]) -> str:
+    raw = json.dumps(list(key), ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> Optional[Tuple[float, str]]:
+    try:
+        start_key, path = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return float(start_key), str(path)
+    except (ValueError, TypeError, json.JSONDecodeError):
+        return None
+
+
+class SessionCatalog:
+    """rollout 元数据目录，按开始时间从新到旧排序"""
+
+    def __init__(self, sessions_dir=None, cache_dir=None):
+        from config_utils import get_config_paths
+
+        self.sessions_dir = Path(sessions_dir) if sessions_dir else Path.home() / ".codex" / "sessions"
+        cache_dir = Path(cache_dir) if cache_dir else get_config_paths()['usage_cache_dir']
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        self.catalog_file = cache_dir / CATALOG_FILENAME
+        self.journal = SwitchJournal()
+        self._records = None
+        self._sorted = []
+        self._keys = []
+        self._last_refresh = 0.0
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Dict]:
+        try:
+            with open(self.catalog_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if isinstance(data, dict) and data.get('version') == CATALOG_VERSION:
+                return data.get('records') or {}
+        except (OSError, IOError, json.JSONDecodeError, ValueError):
+            pass
+        return {}
+
+    def _save(self, updates: Dict[str, Dict], removed: List[str]):
+        """只把本次刷新新增、变化和删除的记录合并进目录文件，不覆盖其他进程的写入"""
+        try:
+            update_json_entries(self.catalog_file, 'records', CATALOG_VERSION, updates, removed)
+        except (OSError, IOError, TimeoutError) as e:
+            print(f"⚠️ 保存 session 目录失败: {e}")
+
+    def _iter_rollouts(self) -> Iterator[os.DirEntry]:
+        pending = [str(self.sessions_dir)]
+        while pending:
+            directory = pending.pop()
+            try:
+                with os.scandir(directory) as it:
+                    for item in it:
+                        if item.is_dir(follow_symlinks=False):
+                            pending.append(item.path)
+                        elif is_rollout_name(item.name):
+                            yield item
+            except OSError:
+                continue
+
+    @staticmethod
+    def _build_record(path: str, stat_result: os.stat_result) -> Dict:
+        summary = load_session_summary(path, stat_result) or build_session_summary(path)
+        start = summary.get('first_timestamp')
+        start_ts = parse_event_timestamp(start)
+        return {
+            'path': path,
+            'mtime_ns': stat_result.st_mtime_ns,
+            'size': stat_result.st_size,
+            'session_id': summary.get('session_id'),
+            'start': start,
+            'end': summary.get('last_timestamp'),
+            'start_ts': start_ts if start_ts is not None else stat_result.st_mtime,
+            'cwd': summary.get('cwd'),
+            'model': summary.get('model'),
+            'total_token_usage': summary.get('total_token_usage')
+        }
+
+    def refresh(self, force: bool = False):
+        """扫描 sessions 目录，只为新增或变化的 rollout 重新生成元数据"""
+        with self._lock:
+            if self._records is None:
+                self._records = self._load()
+                force = True
+            if not force and time.monotonic() - self._last_refresh < REFRESH_INTERVAL:
+                return
+
+            seen = set()
+            updates = {}
+            for item in self._iter_rollouts():
+                seen.add(item.path)
+                try:
+                    stat_result = item.stat()
+                except OSError:
+                    continue
+                record = self._records.get(item.path)
+                if (record and record.get('mtime_ns') == stat_result.st_mtime_ns
+                        and record.get('size') == stat_result.st_size):
+                    continue
+                try:
+                    updates[item.path] = self._build_record(item.path, stat_result)
+                except (*ARCHIVE_READ_ERRORS, ValueError):
+                    # 损坏或截断的归档不进入列表
+                    continue
+            removed = [path for path in self._records if path not in seen]
+            self._records.update(updates)
+            for path in removed:
+                del self._records[path]
+            changed = bool(updates or removed)
+
+            if changed or not self._sorted:
+                # 排序键 (-开始时间, 路径)，游标分页时用二分查找定位
+                self._sorted = sorted(self._records.values(), key=lambda r: (-r['start_ts'], r['path']))
+                self._keys = [(-r['start_ts'], r['path']) for r in self._sorted]
+            if changed:
+                self._save(updates, removed)
+            self._last_refresh = time.monotonic()
+
+    def _with_account(self, record: Dict) -> Dict:
+        # 切换日志已在 query 开始时刷新
+        owner = self.journal.account_at(record['start_ts'], refresh=False)
+        result = {key: value for key, value in record.items() if key not in ('mtime_ns', 'size')}
+        result['account_email'] = owner.get('email') if owner else None
+        result['account_name'] = owner.get('account_name') if owner else None
+        return result
+
+    def query(self, limit: int = 100, cursor: str = None, since: str = None, until: str = None,
+              account: str = None) -> Tuple[List[Dict], Optional[str]]:
+        """按开始时间从新到旧分页查询，返回 (本页记录, 下一页游标)
+
+        since/until 为 YYYY-MM-DD（按本地日期，包含两端），account 匹配邮箱或账号名称。
+        """
+        self.refresh()
+        self.journal.refresh()
+        with self._lock:
+            records, keys = self._sorted, self._keys
+
+        position = 0
+        if cursor:
+            key = decode_cursor(cursor)
+            if key is not None:
+                position = bisect_right(keys, key)
+        if until:
+            # 跳过开始时间晚于 until 当天结束的记录
+            until_ts = datetime.strptime(until, '%Y-%m-%d').timestamp() + 86400
+            position = max(position, bisect_right(keys, (-until_ts, '\uffff')))
+        since_ts = datetime.strptime(since, '%Y-%m-%d').timestamp() if since else None
+
+        page = []
+        next_cursor = None
+        last_index = None
+        for index in range(position, len(records)):
+            record = records[index]
+            if since_ts is not None and record['start_ts'] < since_ts:
+                break
+            result = self._with_account(record)
+            if account and account not in (result['account_email'], result['account_name']):
+                continue
+            if len(page) == limit:
+                # 还有更多匹配记录时，游标指向本页最后一条
+                next_cursor = encode_cursor(keys[last_index])
+                break
+            page.append(result)
+            last_index = index
+        return page, next_cursor
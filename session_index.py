@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Codex session 扫描索引
+
+将每个 rollout 文件的 (mtime, size)、最后一个 token_count 事件的字节偏移
+以及解析结果持久化到 usage_cache_dir 下，文件未变化时无需再次打开解析。
+保存时只把本进程新增、更新或移除的索引项合并进索引文件，多个进程可以同时使用。
+索引过大时按最近使用时间淘汰最久未用的索引项。
+"""
+
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from atomic_io import update_json_entries
+
+
+INDEX_FILENAME = "session_index.json"
+INDEX_VERSION = 1
+# 命中的索引项距上次记录使用时间超过该秒数时才更新，避免每次读取都重写索引
+TOUCH_INTERVAL = 24 * 3600
+
+
+class SessionIndex:
+    """以 (路径, mtime, size) 为键的 session 文件解析结果索引"""
+
+    def __init__(self, index_file):
+        self.index_file = Path(index_file)
+        self._entries = None
+        # 尚未保存的改动：更新的索引项与移除的路径
+        self._updates = {}
+        self._removed = set()
+
+    def _load(self) -> Dict[str, Dict]:
+        """按需加载索引文件，损坏或版本不符时视为空索引"""
+        if self._entries is not None:
+            return self._entries
+        self._entries = {}
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if isinstance(data, dict) and data.get('version') == INDEX_VERSION:
+                entries = data.get('entries')
+                if isinstance(entries, dict):
+                    self._entries = entries
+        except (OSError, IOError, json.JSONDecodeError, ValueError):
+            pass
+        return self._entries
+
+    def lookup(self, session_file, stat_result: os.stat_result) -> Optional[Dict]:
+        """查找与当前 stat 一致的索引项，文件有变化时返回 None"""
+        entry = self._load().get(str(session_file))
+        if not entry:
+            return None
+        if entry.get('mtime_ns') != stat_result.st_mtime_ns or entry.get('size') != stat_result.st_size:
+            return None
+        now = int(time.time())
+        if now - (entry.get('used') or 0) > TOUCH_INTERVAL:
+            entry['used'] = now
+            self._updates[str(session_file)] = entry
+        return entry
+
+    def update(self, session_file, stat_result: os.stat_result,
+               offset: Optional[int], event: Optional[Dict]) -> Dict:
+        """记录文件最后一个 token_count 事件的偏移与内容"""
+        entry = {
+            'mtime_ns': stat_result.st_mtime_ns,
+            'size': stat_result.st_size,
+            'offset': offset,
+            'event': event,
+            'used': int(time.time())
+        }
+        self._load()[str(session_file)] = entry
+        self._updates[str(session_file)] = entry
+        self._removed.discard(str(session_file))
+        return entry
+
+    def prune(self, existing_files: Iterable) -> int:
+        """移除已不存在的文件对应的索引项，返回移除数量"""
+        entries = self._load()
+        existing = {str(path) for path in existing_files}
+        stale = [path for path in entries if path not in existing]
+        for path in stale:
+            del entries[path]
+            self._updates.pop(path, None)
+            self._removed.add(path)
+        return len(stale)
+
+    def trim(self, max_bytes: int) -> int:
+        """按最近使用时间从旧到新淘汰索引项，直到索引大致不超过 max_bytes，返回淘汰数量"""
+        entries = self._load()
+        sizes = {path: len(path) + len(json.dumps(entry, separators=(',', ':'))) + 4
+                 for path, entry in entries.items()}
+        total = sum(sizes.values())
+        evicted = 0
+        for path in sorted(entries, key=lambda p: entries[p].get('used') or 0):
+            if total <= max_bytes:
+                break
+            total -= sizes[path]
+            del entries[path]
+            self._updates.pop(path, None)
+            self._removed.add(path)
+            evicted += 1
+        return evicted
+
+    def save(self) -> bool:
+        """有改动时在文件锁内把改动合并进索引文件"""
+        if not self._updates and not self._removed:
+            return True
+        try:
+            update_json_entries(self.index_file, 'entries', INDEX_VERSION, self._updates, self._removed)
+            self._updates = {}
+            self._removed = set()
+            return True
+        except (OSError, IOError, TimeoutError):
+            return False
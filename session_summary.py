@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Codex session 摘要压缩工具
+
+为已结束（一段时间内不再写入）的 rollout 文件生成 .summary.json 摘要旁路文件，
+记录首末时间戳、最终 total_token_usage、最后的 rate_limits 以及会话的
+model/cwd。用量查询优先读取摘要，已结束的 session 只需读取一个小 JSON 文件。
+
+用法: python3 session_summary.py [--idle-minutes 60] [--force]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from atomic_io import atomic_write_json
+from stat_cache import load_json
+
+
+SUMMARY_SUFFIX = '.summary.json'
+SUMMARY_VERSION = 1
+SESSION_META_MARKER = b'"session_meta"'
+TURN_CONTEXT_MARKER = b'"turn_context"'
+
+
+def summary_path(session_file) -> Path:
+    return Path(str(session_file) + SUMMARY_SUFFIX)
+
+
+def load_session_summary(session_file, stat_result: os.stat_result = None) -> Optional[Dict]:
+    """读取与 rollout 文件当前 (mtime, size) 一致的摘要，文件有变化时返回 None"""
+    try:
+        if stat_result is None:
+            stat_result = os.stat(session_file)
+        summary = load_json(summary_path(session_file))
+    except (OSError, IOError, json.JSONDecodeError, ValueError):
+        return None
+    if not isinstance(summary, dict) or summary.get('version') != SUMMARY_VERSION:
+        return None
+    if (summary.get('source_size') != stat_result.st_size
+            or summary.get('source_mtime_ns') != stat_result.st_mtime_ns):
+        return None
+    return summary
+
+
+def build_session_summary(session_file) -> Dict:
+    """流式读取 rollout 文件生成摘要，只解码包含关心事件的行"""
+    from session_archive import open_rollout
+    from usage_checker import TOKEN_COUNT_MARKER, _decode_json_line, _is_usage_event
+
+    stat_result = os.stat(session_file)
+    summary = {
+        'version': SUMMARY_VERSION,
+        'source_size': stat_result.st_size,
+        'source_mtime_ns': stat_result.st_mtime_ns,
+        'first_timestamp': None,
+        'last_timestamp': None,
+        'session_id': None,
+        'cwd': None,
+        'model': None,
+        'total_token_usage': None,
+        'rate_limits': None,
+        'offset': None,
+        'last_token_count': None
+    }
+
+    offset = 0
+    last_line = None
+    with open_rollout(session_file) as stream:
+        for line in stream:
+            line_offset = offset
+            offset += len(line)
+            if not line.strip():
+                continue
+            if last_line is None:
+                first = _decode_json_line(line)
+                if first:
+                    summary['first_timestamp'] = first.get('timestamp')
+            last_line = line
+
+            if SESSION_META_MARKER in line:
+                data = _decode_json_line(line)
+                if data and data.get('type') == 'session_meta':
+                    payload = data.get('payload') or {}
+                    summary['session_id'] = payload.get('id', summary['session_id'])
+                    summary['cwd'] = payload.get('cwd', summary['cwd'])
+            elif TURN_CONTEXT_MARKER in line:
+                data = _decode_json_line(line)
+                if data and data.get('type') == 'turn_context':
+                    payload = data.get('payload') or {}
+                    summary['model'] = payload.get('model', summary['model'])
+                    summary['cwd'] = summary['cwd'] or payload.get('cwd')
+            elif TOKEN_COUNT_MARKER in line:
+                data = _decode_json_line(line)
+                payload = (data or {}).get('payload') or {}
+                if payload.get('type') != 'token_count':
+                    continue
+                info = payload.get('info')
+                if isinstance(info, dict) and info.get('total_token_usage'):
+                    summary['total_token_usage'] = info['total_token_usage']
+                if _is_usage_event(data):
+                    summary['rate_limits'] = payload.get('rate_limits')
+                    summary['offset'] = line_offset
+                    summary['last_token_count'] = data
+
+    if last_line is not None:
+        last = _decode_json_line(last_line)
+        if last:
+            summary['last_timestamp'] = last.get('timestamp')
+    return summary
+
+
+def write_session_summary(session_file) -> Optional[Dict]:
+    """生成并原子写入摘要旁路文件"""
+    from session_archive import ARCHIVE_READ_ERRORS
+
+    try:
+        summary = build_session_summary(session_file)
+        atomic_write_json(summary_path(session_file), summary, lock=False, indent=None)
+        return summary
+    except ARCHIVE_READ_ERRORS + (ValueError,) as e:
+        print(f"❌ 生成 {Path(session_file).name} 摘要失败: {e}")
+        return None
+
+
+def compact_sessions(sessions_dir, idle_minutes: int = 60, force: bool = False) -> Dict:
+    """为超过 idle_minutes 分钟未写入、且没有有效摘要的 rollout 生成摘要"""
+    from session_archive import is_rollout_name
+
+    sessions_dir = Path(sessions_dir)
+    cutoff = time.time() - idle_minutes * 60
+    result = {'written': 0, 'skipped': 0, 'failed': 0}
+    if not sessions_dir.exists():
+        return result
+
+    for session_file in sorted(sessions_dir.rglob("rollout-*")):
+        if not is_rollout_name(session_file.name):
+            continue
+        try:
+            stat_result = session_file.stat()
+        except OSError:
+            continue
+        if stat_result.st_mtime >= cutoff:
+            # 仍可能在写入的 session 不生成摘要
+            continue
+        if not force and load_session_summary(session_file, stat_result) is not None:
+            result['skipped'] += 1
+            continue
+        if write_session_summary(session_file) is None:
+            result['failed'] += 1
+        else:
+            result['written'] += 1
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="为已结束的 Codex session 生成摘要文件",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例:
+  python session_summary.py                    # 为 60 分钟未写入的 session 生成摘要
+  python session_summary.py --idle-minutes 10  # 10 分钟未写入即视为已结束
+  python session_summary.py --force            # 重新生成所有摘要
+        """
+    )
+    parser.add_argument('--idle-minutes', type=int, default=60,
+                        help='多少分钟未写入视为已结束（默认60）')
+    parser.add_argument('--force', action='store_true',
+                        help='忽略已有摘要，全部重新生成')
+    parser.add_argument('--sessions-dir',
+                        help='session 目录（默认 ~/.codex/sessions）')
+    args = parser.parse_args()
+
+    sessions_dir = Path(args.sessions_dir) if args.sessions_dir else Path.home() / ".codex" / "sessions"
+    print(f"🗜️ 生成 session 摘要: {sessions_dir}")
+    result = compact_sessions(sessions_dir, args.idle_minutes, args.force)
+    print(f"✅ 新生成 {result['written']} 个摘要，{result['skipped']} 个已是最新")
+    if result['failed']:
+        print(f"⚠️ {result['failed']} 个文件处理失败")
+    sys.exit(1 if result['failed'] else 0)
+
+
+if __name__ == "__main__":
+    main()
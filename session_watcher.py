@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Codex session 目录监听模块
+
+Linux 上通过 ctypes 调用 inotify 订阅 ~/.codex/sessions 整棵目录树
+（包括新建的日期目录）；inotify 不可用时回退为基于 mtime 的轮询实现，
+轮询只扫描最新的日期分区，两者提供相同的接口。
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+
+# inotify 事件掩码（见 <sys/inotify.h>）
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_IGNORED = 0x00008000
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF
+EVENT_HEADER = struct.Struct('iIII')
+
+# 轮询时扫描的最新日期分区数（跨过午夜的 session 仍在前一天的分区中写入）
+POLL_PARTITIONS = 2
+# 后台通知线程每次等待的时长（秒），只用于检查是否需要退出
+NOTIFIER_WAIT_TIMEOUT = 30.0
+
+
+def _is_rollout_name(name: str) -> bool:
+    return name.startswith('rollout-') and name.endswith('.jsonl')
+
+
+def _numeric_subdirs(directory) -> List[str]:
+    """按数值从大到小返回名称为数字的子目录（YYYY / MM / DD）"""
+    try:
+        with os.scandir(directory) as it:
+            names = [item.name for item in it
+                     if item.name.isdigit() and item.is_dir(follow_symlinks=False)]
+    except OSError:
+        return []
+    return [os.path.join(directory, name) for name in sorted(names, key=int, reverse=True)]
+
+
+def _mtime_ns(path) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class PollingSessionWatcher:
+    """基于 mtime/size 轮询的 session 目录监听器（inotify 不可用时使用）
+
+    每 interval 秒只扫描 sessions 目录本身和最新的 POLL_PARTITIONS 个
+    YYYY/MM/DD 分区；通过 sessions、年、月目录的 mtime 判断是否出现了新分区，
+    空闲时的开销与 session 历史的规模无关。
+    """
+
+    def __init__(self, sessions_dir, interval: float = 2.0):
+        self.sessions_dir = Path(sessions_dir)
+        self.interval = interval
+        self._closed = threading.Event()
+        self._partitions = []
+        self._partition_key = None
+        self._snapshot = self._scan()
+        self._next_scan = time.monotonic() + interval
+
+    def _parents_key(self, partitions) -> tuple:
+        """sessions 目录及分区所在年、月目录的 mtime，出现新分区时其中至少一个会变化"""
+        parents = {str(self.sessions_dir)}
+        for partition in partitions:
+            month_dir = os.path.dirname(partition)
+            parents.update((month_dir, os.path.dirname(month_dir)))
+        return tuple(sorted((parent, _mtime_ns(parent)) for parent in parents))
+
+    def _newest_partitions(self) -> List[str]:
+        """最新的日期分区；上层目录的 mtime 未变化时沿用上次的结果"""
+        if self._parents_key(self._partitions) != self._partition_key:
+            partitions = []
+            for year_dir in _numeric_subdirs(self.sessions_dir):
+                for month_dir in _numeric_subdirs(year_dir):
+                    partitions.extend(_numeric_subdirs(month_dir)[:POLL_PARTITIONS - len(partitions)])
+                    if len(partitions) >= POLL_PARTITIONS:
+                        break
+                if len(partitions) >= POLL_PARTITIONS:
+                    break
+            self._partitions = partitions
+            self._partition_key = self._parents_key(partitions)
+        return self._partitions
+
+    def _scan(self) -> Dict[str, tuple]:
+        """记录 sessions 目录和最新分区中每个 rollout 文件的 (mtime_ns, size)"""
+        snapshot = {}
+        for directory in [str(self.sessions_dir)] + self._newest_partitions():
+            try:
+                with os.scandir(directory) as it:
+                    for item in it:
+                        if not _is_rollout_name(item.name):
+                            continue
+                        try:
+                            st = item.stat()
+                        except OSError:
+                            continue
+                        snapshot[item.path] = (st.st_mtime_ns, st.st_size)
+            except OSError:
+                continue
+        return snapshot
+
+    def wait(self, timeout: Optional[float] = None) -> List[Path]:
+        """阻塞直到有 rollout 文件新增或变化，返回变化的文件列表（超时返回空列表）
+
+        两次扫描之间至少间隔 interval 秒，与调用方的 timeout 无关。
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._closed.is_set():
+            now = time.monotonic()
+            delay = self._next_scan - now
+            if deadline is not None and deadline - now < delay:
+                self._closed.wait(max(0.0, deadline - now))
+                return []
+            if delay > 0:
+                self._closed.wait(delay)
+                continue
+            self._next_scan = now + self.interval
+            snapshot = self._scan()
+            changed = [Path(path) for path, state in snapshot.items()
+                       if self._snapshot.get(path) != state]
+            self._snapshot = snapshot
+            if changed:
+                return changed
+        return []
+
+    def close(self):
+        self._closed.set()
+
+
+class InotifySessionWatcher:
+    """基于 inotify 的 session 目录监听器，空闲时不消耗 CPU"""
+
+    def __init__(self, sessions_dir):
+        self.sessions_dir = Path(sessions_dir)
+        libc_name = ctypes.util.find_library('c') or 'libc.so.6'
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._libc.inotify_init1.argtypes = [ctypes.c_int]
+        self._libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self._watches = {}
+        self._parent_wd = None
+        self._pending = []
+
+        if self.sessions_dir.is_dir():
+            self._watch_tree(self.sessions_dir)
+        else:
+            # sessions 目录尚未创建时先监听其父目录，等待其出现；
+            # 父目录（~/.codex）也不存在时不代为创建，由调用方回退为轮询
+            try:
+                self._parent_wd = self._add_watch(self.sessions_dir.parent)
+            except OSError:
+                self.close()
+                raise
+
+    def _add_watch(self, path: Path) -> int:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(str(path)), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), str(path))
+        self._watches[wd] = path
+        return wd
+
+    def _watch_tree(self, root: Path, report_existing: bool = False):
+        """为目录及其所有子目录添加监听
+
+        report_existing 为 True 时（新建目录），把监听建立前已写入的文件视为变化
+        """
+        pending = [root]
+        while pending:
+            directory = pending.pop()
+            try:
+                self._add_watch(directory)
+                with os.scandir(directory) as it:
+                    for item in it:
+                        if item.is_dir(follow_symlinks=False):
+                            pending.append(Path(item.path))
+                        elif report_existing and _is_rollout_name(item.name):
+                            self._pending.append(Path(item.path))
+            except OSError:
+                continue
+
+    def _read_events(self) -> List[Path]:
+        changed = []
+        try:
+            buffer = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return changed
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return changed
+            raise
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(buffer):
+            wd, mask, _, name_len = EVENT_HEADER.unpack_from(buffer, offset)
+            offset += EVENT_HEADER.size
+            name = buffer[offset:offset + name_len].rstrip(b'\0').decode('utf-8', 'replace')
+            offset += name_len
+
+            if mask & IN_Q_OVERFLOW:
+                # 事件队列溢出：以整个目录作为变化通知，调用方应当全量检查
+                changed.append(self.sessions_dir)
+                continue
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            directory = self._watches.get(wd)
+            if directory is None or not name:
+                continue
+            path = directory / name
+            if wd == self._parent_wd:
+                if mask & IN_ISDIR and path == self.sessions_dir:
+                    self._watch_tree(self.sessions_dir, report_existing=True)
+                continue
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self._watch_tree(path, report_existing=True)
+            elif _is_rollout_name(name):
+                changed.append(path)
+        changed.extend(self._pending)
+        self._pending = []
+        # 去重并保持顺序
+        return list(dict.fromkeys(changed))
+
+    def wait(self, timeout: Optional[float] = None) -> List[Path]:
+        """阻塞直到有 rollout 文件新增或变化，返回变化的文件列表（超时返回空列表）"""
+        if self._pending:
+            changed, self._pending = list(dict.fromkeys(self._pending)), []
+            return changed
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._fd is not None:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                readable, _, _ = select.select([self._fd], [], [], remaining)
+            except (OSError, ValueError):
+                return []
+            if not readable:
+                return []
+            changed = self._read_events()
+            if changed:
+                return changed
+        return []
+
+    def close(self):
+        if self._fd is not None:
+            try:
+                os.close(self._fd)
+            except OSError:
+                pass
+            self._fd = None
+
+
+def create_session_watcher(sessions_dir=None, interval: float = 2.0):
+    """创建 session 目录监听器，优先使用 inotify，不可用时回退为轮询"""
+    if sessions_dir is None:
+        sessions_dir = Path.home() / ".codex" / "sessions"
+    if sys.platform.startswith('linux'):
+        try:
+            return InotifySessionWatcher(sessions_dir)
+        except (OSError, AttributeError):
+            pass
+    return PollingSessionWatcher(sessions_dir, interval=interval)
+
+
+class UsageEventNotifier:
+    """监听 session 目录，在出现新的 token_count 事件时回调通知"""
+
+    def __init__(self, checker, on_event: Callable[[Dict], None], watcher=None):
+        from usage_checker import SessionFollower
+
+        self.checker = checker
+        self.on_event = on_event
+        self.watcher = watcher or create_session_watcher(checker.codex_sessions_dir)
+        self.follower = SessionFollower(checker)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def check(self) -> Optional[Dict]:
+        """检查一次最新 session，用量有变化时触发回调并返回事件"""
+        event = self.follower.poll()
+        if event and self.follower.changed:
+            self.follower.changed = False
+            try:
+                self.on_event(event)
+            except Exception as e:
+                print(f"⚠️ 用量事件处理失败: {e}")
+            return event
+        return None
+
+    def _run(self):
+        self.check()
+        while not self._stop.is_set():
+            if self.watcher.wait(timeout=NOTIFIER_WAIT_TIMEOUT):
+                self.check()
+
+    def start(self):
+        """在后台线程中开始监听"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='usage-event-notifier', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+        self.watcher.close()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+按文件状态校验的进程内 LRU 缓存
+
+缓存项记录读取时相关文件的 (st_mtime_ns, st_size)，再次读取时只需 stat()
+比较；Tauri 端或 CLI 在外部修改文件后签名变化，缓存项自动失效。
+CodexUsageChecker 与 CodexAccountManagerWeb 共用模块级的 shared_cache。
+"""
+
+import copy
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Iterable, Optional, Tuple
+
+
+DEFAULT_MAX_ENTRIES = 512
+_MISSING = object()
+
+
+def file_signature(paths: Iterable) -> Tuple:
+    """返回一组文件的 (mtime_ns, size) 签名，不存在的文件记为 None"""
+    signature = []
+    for path in paths:
+        try:
+            stat_result = os.stat(path)
+            signature.append((stat_result.st_mtime_ns, stat_result.st_size))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+
+class StatCache:
+    """线程安全的有界 LRU 缓存，缓存项按文件签名校验"""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, key: Hashable, signature: Tuple, default=None):
+        """签名一致时返回缓存值，否则返回 default"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != signature:
+                return default
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def store(self, key: Hashable, signature: Tuple, value: Any):
+        with self._lock:
+            self._entries[key] = (signature, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key: Hashable, paths: Iterable, loader: Callable[[], Any]):
+        """按 paths 的当前签名读取缓存，失效时调用 loader 重新加载"""
+        signature = file_signature(paths)
+        value = self.lookup(key, signature, _MISSING)
+        if value is _MISSING:
+            value = loader()
+            self.store(key, signature, value)
+        return value
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        """删除指定缓存项，key 为 None 时清空全部"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+
+shared_cache = StatCache()
+
+
+def _read_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_json(path) -> Any:
+    """读取 JSON 文件，文件未变化时直接返回缓存内容的副本
+
+    与 open() + json.load() 一样在文件不存在或格式错误时抛出异常。
+    """
+    path = os.fspath(path)
+    value = shared_cache.get(('json', path), (path,), lambda: _read_json(path))
+    return copy.deepcopy(value)
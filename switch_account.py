@@ -4,22 +4,14 @@
 用法: python3 switch_account.py <账号名称>
 """
 
-import json
 import sys
-import shutil
 from pathlib import Path
 from config_utils import get_config_paths
-
-
-def sync_to_system(auth_file, system_auth_file):
-    """同步配置到系统"""
-    if auth_file != system_auth_file and auth_file.exists():
-        try:
-            system_auth_file.parent.mkdir(exist_ok=True)
-            shutil.copy2(auth_file, system_auth_file)
-            print(f"✅ 已同步配置到系统")
-        except Exception as e:
-            print(f"⚠️ 同步到系统失败: {e}")
+from atomic_io import atomic_copy
+from switch_journal import record_switch
+from usage_checker import snapshot_outgoing_account
+from account_registry import AccountRegistry
+from account_switcher import AccountSwitcher
 
 
 def switch_account(account_name):
@@ -30,6 +22,7 @@ def switch_account(account_name):
     accounts_dir = paths['accounts_dir']
     system_auth_file = paths['system_auth_file']
     account_file = accounts_dir / f"{account_name}.json"
+    switcher = AccountSwitcher(accounts_dir)
     
     if not account_file.exists():
         print(f"❌ 账号配置不存在: {account_name}")
@@ -37,38 +30,35 @@ def switch_account(account_name):
         return False
     
     try:
+        # 确认预生成的 auth.json 内容可用（账号文件变化时重新生成）
+        if switcher.prepare(account_name) is None:
+            print(f"❌ 账号配置无法解析: {account_name}")
+            return False
+        
         # 备份当前配置
         if auth_file.exists():
             backup_file = auth_file.with_suffix('.json.backup')
-            shutil.copy2(auth_file, backup_file)
+            atomic_copy(auth_file, backup_file)
             print(f"📦 已备份当前配置")
         
-        # 读取目标账号配置
-        with open(account_file, 'r', encoding='utf-8') as f:
-            target_config = json.load(f)
-        
-        # 移除管理字段，只保留原始配置
-        clean_config = {
-            "OPENAI_API_KEY": target_config.get("OPENAI_API_KEY"),
-            "tokens": target_config.get("tokens"),
-            "last_refresh": target_config.get("last_refresh")
-        }
+        # 覆盖 auth.json 前保存切出账号的最新用量
+        snapshot_outgoing_account(system_auth_file)
         
-        # 确保目录存在
-        auth_file.parent.mkdir(exist_ok=True)
-        
-        # 写入配置
-        with open(auth_file, 'w', encoding='utf-8') as f:
-            json.dump(clean_config, f, indent=2, ensure_ascii=False)
+        # 预生成内容原子替换配置，并同步到系统配置
+        record = switcher.switch(account_name, [auth_file, system_auth_file])
+        if record is None:
+            print(f"❌ 账号配置无法解析: {account_name}")
+            return False
+        if auth_file != system_auth_file:
+            print(f"✅ 已同步配置到系统")
         
-        # 同步到系统配置
-        sync_to_system(auth_file, system_auth_file)
+        # 记录切换时间，用于把历史 session 用量归属到对应账号
+        record_switch(account_name, email=record.get('email'), account_id=record.get('account_id'))
         
         print(f"✅ 成功切换到账号: {account_name}")
         
         # 显示账号信息
-        account_id = target_config.get('tokens', {}).get('account_id', '未知')
-        print(f"🔹 账号ID: {account_id}")
+        print(f"🔹 账号ID: {record.get('account_id') or '未知'}")
         
         return True
         
@@ -79,32 +69,23 @@ def switch_account(account_name):
 
 def list_accounts():
     """列出所有可用账号"""
-    accounts_dir = get_config_paths()['accounts_dir']
-    account_files = list(accounts_dir.glob("*.json"))
+    _, entries = AccountRegistry().list_accounts()
     
-    if not account_files:
+    if not entries:
         print("📭 没有保存的账号配置")
         return []
     
     print("📋 可用的账号配置:")
     accounts = []
-    for account_file in sorted(account_files):
-        try:
-            with open(account_file, 'r', encoding='utf-8') as f:
-                config = json.load(f)
-            
-            account_name = account_file.stem
-            account_id = config.get('tokens', {}).get('account_id', '未知ID')
-            saved_at = config.get('saved_at', '未知时间')
-            
-            print(f"  🔹 {account_name}")
-            print(f"     ID: {account_id}")
-            print(f"     保存时间: {saved_at}")
-            accounts.append(account_name)
-        except:
-            account_name = account_file.stem
+    for entry in entries:
+        account_name = entry['name']
+        if entry.get('error'):
             print(f"  - {account_name}")
-            accounts.append(account_name)
+        else:
+            print(f"  🔹 {account_name}")
+            print(f"     ID: {entry.get('account_id') or '未知ID'}")
+            print(f"     保存时间: {entry.get('saved_at') or '未知时间'}")
+        accounts.append(account_name)
     
     return accounts
 
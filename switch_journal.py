@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+账号切换日志
+
+每次切换账号时向 switch_journal.jsonl 追加一条带时间戳的记录，
+并提供按时间二分查找当时活跃账号的索引，用于把历史 session 中的
+token_count 事件归属到正确的账号。
+"""
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_right
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from config_utils import get_config_paths
+
+
+def parse_event_timestamp(timestamp) -> Optional[float]:
+    """将 session 事件的 ISO 时间戳转换为 Unix 时间（秒）"""
+    if not isinstance(timestamp, str) or not timestamp:
+        return None
+    try:
+        return datetime.fromisoformat(timestamp.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+
+class SwitchJournal:
+    """账号切换日志及其时间索引"""
+
+    def __init__(self, journal_file=None):
+        self.journal_file = Path(journal_file) if journal_file else get_config_paths()['switch_journal_file']
+        self._times = []
+        self._entries = []
+        self._loaded_size = 0
+        self._loaded_inode = None
+        # Web 服务的多个请求线程共用同一个实例
+        self._lock = threading.Lock()
+
+    def record(self, account_name: str, email: Optional[str] = None,
+               account_id: Optional[str] = None, timestamp: float = None) -> bool:
+        """追加一条切换记录（单行追加写入，多进程同时写入也不会交错）"""
+        timestamp = time.time() if timestamp is None else timestamp
+        entry = {
+            'ts': timestamp,
+            'time': datetime.fromtimestamp(timestamp).isoformat(),
+            'account_name': account_name,
+            'email': email,
+            'account_id': account_id
+        }
+        try:
+            self.journal_file.parent.mkdir(parents=True, exist_ok=True)
+            line = (json.dumps(entry, ensure_ascii=False) + "\n").encode('utf-8')
+            fd = os.open(self.journal_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+            return True
+        except OSError:
+            return False
+
+    def refresh(self):
+        """增量读取日志新追加的部分；文件被替换或截断时重新加载"""
+        with self._lock:
+            self._refresh()
+
+    def _refresh(self):
+        # 调用方已持有 self._lock
+        try:
+            stat_result = os.stat(self.journal_file)
+        except OSError:
+            self._times, self._entries, self._loaded_size, self._loaded_inode = [], [], 0, None
+            return
+        if stat_result.st_ino != self._loaded_inode or stat_result.st_size < self._loaded_size:
+            self._times, self._entries, self._loaded_size = [], [], 0
+            self._loaded_inode = stat_result.st_ino
+        if stat_result.st_size == self._loaded_size:
+            return
+
+        with open(self.journal_file, 'rb') as f:
+            f.seek(self._loaded_size)
+            chunk = f.read(stat_result.st_size - self._loaded_size)
+        complete = chunk.rfind(b"\n") + 1
+        self._loaded_size += complete
+
+        appended = []
+        for line in chunk[:complete].splitlines():
+            try:
+                entry = json.loads(line)
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                continue
+            if isinstance(entry, dict) and isinstance(entry.get('ts'), (int, float)):
+                appended.append(entry)
+        if not appended:
+            return
+        if self._times and appended[0]['ts'] < self._times[-1]:
+            # 时钟回拨等导致乱序时整体重新排序
+            self._entries.extend(appended)
+            self._entries.sort(key=lambda entry: entry['ts'])
+            self._times = [entry['ts'] for entry in self._entries]
+        else:
+            appended.sort(key=lambda entry: entry['ts'])
+            self._entries.extend(appended)
+            self._times.extend(entry['ts'] for entry in appended)
+
+    def entries(self) -> List[Dict]:
+        with self._lock:
+            self._refresh()
+            return list(self._entries)
+
+    def latest(self) -> Optional[Dict]:
+        with self._lock:
+            self._refresh()
+            return self._entries[-1] if self._entries else None
+
+    def account_at(self, timestamp: float, refresh: bool = True) -> Optional[Dict]:
+        """二分查找 timestamp 时刻活跃的账号记录，早于第一条记录时返回 None
+
+        批量查询时可先调用一次 refresh()，再以 refresh=False 逐条查找，避免每条记录都 stat 日志文件。
+        """
+        with self._lock:
+            if refresh:
+                self._refresh()
+            index = bisect_right(self._times, timestamp) - 1
+            return self._entries[index] if index >= 0 else None
+
+    def intervals_for(self, email: str) -> List[Tuple[float, Optional[float]]]:
+        """返回 email 作为活跃账号的时间区间 [start, end)，从新到旧排列；end 为 None 表示至今"""
+        with self._lock:
+            self._refresh()
+            intervals = []
+            for index, entry in enumerate(self._entries):
+                if entry.get('email') != email:
+                    continue
+                end = self._times[index + 1] if index + 1 < len(self._times) else None
+                intervals.append((entry['ts'], end))
+        intervals.reverse()
+        return intervals
+
+
+def record_switch(account_name: str, config: Dict = None, email: str = None, account_id: str = None) -> bool:
+    """记录一次账号切换，config 为切换到的账号配置；已知邮箱和 account_id 时可直接传入"""
+    from usage_checker import extract_email_from_auth
+
+    if isinstance(config, dict):
+        email = config.get('email') or extract_email_from_auth(config)
+        account_id = (config.get('tokens') or {}).get('account_id')
+    return SwitchJournal().record(account_name, email, account_id)
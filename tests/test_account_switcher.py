@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""AccountSwitcher 的回归测试"""
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from account_switcher import AUTH_FIELDS, AccountSwitcher  # noqa: E402
+from atomic_io import LOCK_DIR_ENV  # noqa: E402
+
+
+def write_account(accounts_dir: Path, name: str, account_id: str):
+    config = {
+        "OPENAI_API_KEY": None,
+        "tokens": {"id_token": "", "access_token": "", "account_id": account_id},
+        "last_refresh": "2025-06-30T00:00:00Z",
+        "account_name": name,
+        "email": f"{name}@example.com"
+    }
+    with open(accounts_dir / f"{name}.json", 'w', encoding='utf-8') as f:
+        json.dump(config, f)
+
+
+class AccountSwitcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+        self.accounts_dir = root / "accounts"
+        self.accounts_dir.mkdir()
+        self.payload_dir = root / "auth_payloads"
+        self.auth_file = root / "codex" / "auth.json"
+        patcher = mock.patch.dict(os.environ, {LOCK_DIR_ENV: str(root / "locks")})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_account_named_index(self):
+        """名为 index 的账号不能与生成记录混在一起"""
+        write_account(self.accounts_dir, "index", "account-index")
+        write_account(self.accounts_dir, "work", "account-work")
+        switcher = AccountSwitcher(self.accounts_dir, self.payload_dir)
+        self.assertEqual(switcher.materialize(), 2)
+
+        record = switcher.switch("index", [self.auth_file])
+        self.assertEqual(record['account_id'], "account-index")
+        with open(self.auth_file, 'r', encoding='utf-8') as f:
+            auth = json.load(f)
+        self.assertEqual(set(auth), set(AUTH_FIELDS))
+        self.assertEqual(auth['tokens']['account_id'], "account-index")
+
+        # 再次全量生成不会把 auth.json 字段当作账号，也不会删除任何账号的内容
+        switcher.materialize()
+        self.assertEqual(set(json.loads(switcher.index_file.read_text())), {"index", "work"})
+        self.assertEqual(switcher.switch("work", [self.auth_file])['account_id'], "account-work")
+
+    def test_deleted_account_payload_removed(self):
+        write_account(self.accounts_dir, "work", "account-work")
+        switcher = AccountSwitcher(self.accounts_dir, self.payload_dir)
+        switcher.materialize()
+        (self.accounts_dir / "work.json").unlink()
+        switcher.materialize(["work"])
+        self.assertFalse((self.payload_dir / "work.json").exists())
+        self.assertIsNone(switcher.switch("work", [self.auth_file]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""TokenEventStore 的回归测试"""
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from atomic_io import LOCK_DIR_ENV  # noqa: E402
+from token_event_store import TokenEventStore  # noqa: E402
+
+
+def write_rollout(path: Path, totals):
+    """写入只包含 token_count 事件的 rollout 文件"""
+    with open(path, 'w', encoding='utf-8') as f:
+        for index, total in enumerate(totals):
+            f.write(json.dumps({
+                "timestamp": f"2025-06-30T00:00:{index:02d}.000Z",
+                "type": "event_msg",
+                "payload": {
+                    "type": "token_count",
+                    "info": {"total_token_usage": {
+                        "input_tokens": total, "cached_input_tokens": 0, "output_tokens": 0
+                    }},
+                    "rate_limits": None
+                }
+            }) + "\n")
+
+
+class TokenEventStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+        self.sessions_dir = root / "sessions"
+        self.sessions_dir.mkdir()
+        patcher = mock.patch.dict(os.environ, {LOCK_DIR_ENV: str(root / "locks")})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.store = TokenEventStore(root / "token_events")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_corrupt_archive_does_not_duplicate_rows(self):
+        write_rollout(self.sessions_dir / "rollout-a.jsonl", [10, 20])
+        (self.sessions_dir / "rollout-b.jsonl.xz").write_bytes(b"\xfd7zXZ\x00" + b"corrupt" * 20)
+        write_rollout(self.sessions_dir / "rollout-c.jsonl", [5])
+
+        self.assertEqual(self.store.ingest_all(self.sessions_dir), 3)
+        # 再次导入时既不重复追加，也不会因为损坏的归档抛出异常
+        self.assertEqual(self.store.ingest_all(self.sessions_dir), 0)
+        self.assertEqual(self.store.row_count(), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""UsageStore 与 Tauri 端 JSON 缓存文件的兼容测试"""
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import usage_store  # noqa: E402
+from atomic_io import LOCK_DIR_ENV  # noqa: E402
+from usage_store import UsageStore, legacy_cache_file  # noqa: E402
+
+
+def write_tauri_cache(cache_dir: Path, email: str, usage_data: dict, last_updated: datetime):
+    """按 Tauri 端 saveCachedUsage 的格式写入缓存文件"""
+    with open(legacy_cache_file(cache_dir, email), 'w', encoding='utf-8') as f:
+        json.dump({
+            "email": email,
+            "last_updated": last_updated.isoformat(timespec='milliseconds').replace('+00:00', 'Z'),
+            "usage_data": usage_data
+        }, f)
+
+
+class UsageStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_dir = Path(self.tmp.name)
+        self.db_file = self.cache_dir / "usage.sqlite3"
+        patcher = mock.patch.dict(os.environ, {LOCK_DIR_ENV: str(self.cache_dir / "locks")})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_save_writes_tauri_cache(self):
+        with UsageStore(self.db_file) as store:
+            store.save("a.b+c@example.com", {"rate_limits": {}})
+        with open(self.cache_dir / "a_b_plus_c_at_example_com_usage.json", 'r', encoding='utf-8') as f:
+            cache_data = json.load(f)
+        self.assertEqual(cache_data["email"], "a.b+c@example.com")
+        self.assertEqual(cache_data["usage_data"], {"rate_limits": {}})
+
+    def test_newer_tauri_cache_imported(self):
+        with UsageStore(self.db_file) as store:
+            store.save("user@example.com", {"source": "python"})
+            write_tauri_cache(self.cache_dir, "user@example.com", {"source": "tauri"},
+                              datetime.now(timezone.utc) + timedelta(seconds=5))
+            self.assertEqual(store.load("user@example.com"), {"source": "tauri"})
+
+            # 较旧的 JSON 文件不会覆盖数据库中的记录
+            store.save("other@example.com", {"source": "python"})
+            write_tauri_cache(self.cache_dir, "other@example.com", {"source": "stale"},
+                              datetime.now(timezone.utc) - timedelta(hours=1))
+            self.assertEqual(store.load("other@example.com"), {"source": "python"})
+
+    def test_save_visible_within_same_signature(self):
+        # 模拟同一时间刻度内的两次写入：数据库文件签名保持不变
+        original = usage_store.file_signature
+        usage_store.file_signature = lambda paths: ('frozen',)
+        try:
+            with UsageStore(self.db_file) as store:
+                store.save("user@example.com", {"version": 1})
+                self.assertEqual(store.load("user@example.com"), {"version": 1})
+                store.save("user@example.com", {"version": 2})
+                self.assertEqual(store.load("user@example.com"), {"version": 2})
+        finally:
+            usage_store.file_signature = original
+
+    def test_unreadable_database_falls_back(self):
+        self.db_file.write_bytes(b"not a database" * 100)
+        with UsageStore(self.db_file) as store:
+            self.assertTrue(store.in_memory)
+            self.assertTrue(store.save("user@example.com", {"source": "python"}))
+        with UsageStore(self.db_file) as store:
+            self.assertEqual(store.load("user@example.com"), {"source": "python"})
+
+
+if __name__ == "__main__":
+    unittest.main()
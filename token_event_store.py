@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""
+Codex token 事件列式存储
+
+将 rollout 中的每个 token_count 事件追加写入 usage_cache_dir/token_events
+下的一组并行列文件（int64 / float64），查询时通过内存映射读取。
+安装了 NumPy 时范围查询与分组聚合使用向量化计算，否则使用纯 array 实现。
+
+用法:
+  python3 token_event_store.py ingest               # 导入全部 session 历史
+  python3 token_event_store.py query --days 30      # 最近 30 天按日汇总
+"""
+
+import argparse
+import json
+import mmap
+import os
+import sys
+import time
+from array import array
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    import numpy as np
+except ImportError:  # NumPy 为可选依赖
+    np = None
+
+from atomic_io import atomic_write_json, file_lock
+from session_archive import ARCHIVE_READ_ERRORS, is_compressed_rollout, is_rollout_name, open_rollout
+
+
+STORE_DIRNAME = "token_events"
+STATE_FILENAME = "state.json"
+
+# 列名 -> array 类型码（q: int64, d: float64）
+COLUMNS = {
+    'timestamp_ms': 'q',
+    'input_tokens': 'q',
+    'cached_input_tokens': 'q',
+    'output_tokens': 'q',
+    'primary_used_percent': 'd',
+    'secondary_used_percent': 'd',
+}
+TOKEN_FIELDS = ('input_tokens', 'cached_input_tokens', 'output_tokens')
+TOKEN_COUNT_MARKER = b'"token_count"'
+
+
+def _rollout_id(session_file) -> str:
+    """rollout 文件的标识（去掉 .jsonl/.jsonl.gz/.jsonl.xz 后缀），归档后保持不变"""
+    name = Path(session_file).name
+    return name[:name.index('.jsonl')] if '.jsonl' in name else name
+
+
+def _timestamp_ms(timestamp) -> Optional[int]:
+    if not isinstance(timestamp, str) or not timestamp:
+        return None
+    try:
+        return int(datetime.fromisoformat(timestamp.replace('Z', '+00:00')).timestamp() * 1000)
+    except ValueError:
+        return None
+
+
+def _used_percent(rate_limits, name) -> float:
+    limit = (rate_limits or {}).get(name)
+    if isinstance(limit, dict) and isinstance(limit.get('used_percent'), (int, float)):
+        return float(limit['used_percent'])
+    return float('nan')
+
+
+class TokenEventStore:
+    """追加写入的 token_count 事件列式存储"""
+
+    def __init__(self, store_dir=None):
+        if store_dir is None:
+            from config_utils import get_config_paths
+            store_dir = get_config_paths()['usage_cache_dir'] / STORE_DIRNAME
+        self.store_dir = Path(store_dir)
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        self.state_file = self.store_dir / STATE_FILENAME
+
+    def _column_file(self, name: str) -> Path:
+        return self.store_dir / f"{name}.{COLUMNS[name]}"
+
+    @contextmanager
+    def _locked(self):
+        """写入时持有目录锁，避免多个进程同时追加导致列错位"""
+        with file_lock(self.state_file, timeout=60):
+            yield
+
+    def _load_state(self) -> Dict:
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if isinstance(state, dict) and isinstance(state.get('files'), dict):
+                return state
+        except (OSError, IOError, json.JSONDecodeError, ValueError):
+            pass
+        return {'files': {}}
+
+    def _save_state(self, state: Dict):
+        # 调用方已持有目录锁
+        atomic_write_json(self.state_file, state, lock=False, indent=None, separators=(',', ':'))
+
+    def row_count(self) -> int:
+        """完整写入的行数（各列长度的最小值，忽略中断写入留下的残行）"""
+        counts = []
+        for name, typecode in COLUMNS.items():
+            try:
+                size = self._column_file(name).stat().st_size
+            except FileNotFoundError:
+                size = 0
+            counts.append(size // array(typecode).itemsize)
+        return min(counts)
+
+    def _truncate_partial_rows(self, rows: int):
+        for name, typecode in COLUMNS.items():
+            column_file = self._column_file(name)
+            expected = rows * array(typecode).itemsize
+            if column_file.exists() and column_file.stat().st_size > expected:
+                os.truncate(column_file, expected)
+
+    def _append(self, columns: Dict[str, array]):
+        for name in COLUMNS:
+            with open(self._column_file(name), 'ab') as f:
+                columns[name].tofile(f)
+
+    def _parse_events(self, stream, previous_totals):
+        """解析事件流，返回新增列数据、读取的字节数与最后的累计值"""
+        columns = {name: array(typecode) for name, typecode in COLUMNS.items()}
+        consumed = 0
+        for line in stream:
+            if not line.endswith(b"\n"):
+                # 尚未写完的末行留到下次导入
+                break
+            consumed += len(line)
+            if TOKEN_COUNT_MARKER not in line:
+                continue
+            try:
+                data = json.loads(line)
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                continue
+            payload = data.get('payload') or {}
+            info = payload.get('info')
+            if payload.get('type') != 'token_count':
+                continue
+            timestamp_ms = _timestamp_ms(data.get('timestamp'))
+            if timestamp_ms is None:
+                continue
+
+            delta = [0, 0, 0]
+            total = info.get('total_token_usage') if isinstance(info, dict) else None
+            if isinstance(total, dict):
+                current = [int(total.get(field) or 0) for field in TOKEN_FIELDS]
+                if previous_totals is None or any(c < p for c, p in zip(current, previous_totals)):
+                    delta = current
+                else:
+                    delta = [c - p for c, p in zip(current, previous_totals)]
+                previous_totals = current
+
+            rate_limits = payload.get('rate_limits')
+            columns['timestamp_ms'].append(timestamp_ms)
+            for field, value in zip(TOKEN_FIELDS, delta):
+                columns[field].append(value)
+            columns['primary_used_percent'].append(_used_percent(rate_limits, 'primary'))
+            columns['secondary_used_percent'].append(_used_percent(rate_limits, 'secondary'))
+        return columns, consumed, previous_totals
+
+    def ingest(self, session_files) -> int:
+        """导入 rollout 文件中尚未写入的 token_count 事件，返回新增行数"""
+        added = 0
+        changed = False
+        with self._locked():
+            state = self._load_state()
+            rows = self.row_count()
+            self._truncate_partial_rows(rows)
+
+            for session_file in session_files:
+                rollout_id = _rollout_id(session_file)
+                entry = state['files'].get(rollout_id, {'offset': 0, 'totals': None})
+                try:
+                    if is_compressed_rollout(session_file):
+                        if rollout_id in state['files']:
+                            # 归档文件不会再追加，已导入过的直接跳过
+                            continue
+                        with open_rollout(session_file) as stream:
+                            columns, consumed, totals = self._parse_events(stream, None)
+                    else:
+                        size = os.stat(session_file).st_size
+                        if size < entry['offset']:
+                            # 文件被截断或重写，从头重新导入
+                            entry = {'offset': 0, 'totals': None}
+                        elif size == entry['offset']:
+                            continue
+                        with open(session_file, 'rb') as stream:
+                            stream.seek(entry['offset'])
+                            columns, consumed, totals = self._parse_events(stream, entry['totals'])
+                except (*ARCHIVE_READ_ERRORS, ValueError):
+                    if is_compressed_rollout(session_file) and os.path.exists(session_file):
+                        # 损坏的归档无法恢复，记为已导入，避免每次都重新读取
+                        state['files'][rollout_id] = {'offset': 0, 'totals': None}
+                        changed = True
+                    continue
+
+                state['files'][rollout_id] = {'offset': entry['offset'] + consumed, 'totals': totals}
+                if columns['timestamp_ms']:
+                    self._append(columns)
+                    added += len(columns['timestamp_ms'])
+                    # 写入列后立即记录进度，避免后续文件出错时重复追加
+                    self._save_state(state)
+                    changed = False
+                else:
+                    changed = True
+
+            if changed:
+                self._save_state(state)
+        return added
+
+    def ingest_all(self, sessions_dir=None) -> int:
+        """导入 sessions 目录下全部 rollout"""
+        sessions_dir = Path(sessions_dir) if sessions_dir else Path.home() / ".codex" / "sessions"
+        if not sessions_dir.exists():
+            return 0
+        session_files = [path for path in sessions_dir.rglob("rollout-*") if is_rollout_name(path.name)]
+        session_files.sort(key=lambda path: path.stat().st_mtime)
+        return self.ingest(session_files)
+
+    @contextmanager
+    def columns(self):
+        """以内存映射方式打开全部列，产出 {列名: 只读视图}
+
+        有 NumPy 时为 ndarray，否则为 memoryview（均不复制数据）。
+        """
+        rows = self.row_count()
+        handles = []
+        views = {}
+        try:
+            for name, typecode in COLUMNS.items():
+                if rows == 0:
+                    views[name] = np.empty(0, dtype=typecode) if np is not None else memoryview(array(typecode))
+                    continue
+                f = open(self._column_file(name), 'rb')
+                mapped = mmap.mmap(f.fileno(), rows * array(typecode).itemsize, access=mmap.ACCESS_READ)
+                handles.append((f, mapped))
+                if np is not None:
+                    views[name] = np.frombuffer(mapped, dtype=typecode, count=rows)
+                else:
+                    views[name] = memoryview(mapped).cast(typecode)[:rows]
+            yield views
+        finally:
+            views.clear()
+            for f, mapped in handles:
+                try:
+                    mapped.close()
+                except BufferError:
+                    # 仍有外部引用时交给垃圾回收关闭
+                    pass
+                f.close()
+
+    def aggregate(self, start_ms: int = None, end_ms: int = None, bucket: str = 'day') -> List[Dict]:
+        """按 day/hour 汇总 [start_ms, end_ms) 范围内的 tokens，并给出各窗口最大使用率"""
+        bucket_seconds = 86400 if bucket == 'day' else 3600
+        # 使用当前时区偏移把时间戳对齐到本地日期/小时
+        utc_offset = datetime.now().astimezone().utcoffset() or timedelta(0)
+        offset_ms = int(utc_offset.total_seconds() * 1000)
+        start_ms = -2 ** 63 if start_ms is None else start_ms
+        end_ms = 2 ** 63 - 1 if end_ms is None else end_ms
+
+        with self.columns() as cols:
+            if np is not None:
+                return self._aggregate_numpy(cols, start_ms, end_ms, bucket_seconds, offset_ms)
+            return self._aggregate_array(cols, start_ms, end_ms, bucket_seconds, offset_ms)
+
+    @staticmethod
+    def _bucket_label(key: int, bucket_seconds: int) -> str:
+        moment = datetime.fromtimestamp(key * bucket_seconds, timezone.utc)
+        return moment.strftime('%Y-%m-%d' if bucket_seconds == 86400 else '%Y-%m-%d %H:00')
+
+    def _aggregate_numpy(self, cols, start_ms, end_ms, bucket_seconds, offset_ms) -> List[Dict]:
+        timestamps = cols['timestamp_ms']
+        mask = (timestamps >= start_ms) & (timestamps < end_ms)
+        if not mask.any():
+            return []
+        keys = (timestamps[mask] + offset_ms) // (bucket_seconds * 1000)
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        sums = {field: np.bincount(inverse, weights=cols[field][mask], minlength=len(unique_keys))
+                for field in TOKEN_FIELDS}
+        maxima = {}
+        for field in ('primary_used_percent', 'secondary_used_percent'):
+            values = np.where(np.isnan(cols[field][mask]), -np.inf, cols[field][mask])
+            result = np.full(len(unique_keys), -np.inf)
+            np.maximum.at(result, inverse, values)
+            maxima[field] = result
+        rows = []
+        for index, key in enumerate(unique_keys.tolist()):
+            row = {'bucket': self._bucket_label(key, bucket_seconds)}
+            for field in TOKEN_FIELDS:
+                row[field] = int(sums[field][index])
+            for field, values in maxima.items():
+                value = float(values[index])
+                row[f"max_{field}"] = None if value == -np.inf else value
+            rows.append(row)
+        return rows
+
+    def _aggregate_array(self, cols, start_ms, end_ms, bucket_seconds, offset_ms) -> List[Dict]:
+        groups = {}
+        bucket_ms = bucket_seconds * 1000
+        timestamps = cols['timestamp_ms']
+        inputs, cached, outputs = (cols[field] for field in TOKEN_FIELDS)
+        primary, secondary = cols['primary_used_percent'], cols['secondary_used_percent']
+        for index in range(len(timestamps)):
+            timestamp = timestamps[index]
+            if timestamp < start_ms or timestamp >= end_ms:
+                continue
+            key = (timestamp + offset_ms) // bucket_ms
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = [0, 0, 0, None, None]
+            group[0] += inputs[index]
+            group[1] += cached[index]
+            group[2] += outputs[index]
+            for slot, value in ((3, primary[index]), (4, secondary[index])):
+                if value == value and (group[slot] is None or value > group[slot]):
+                    group[slot] = value
+        return [
+            {
+                'bucket': self._bucket_label(key, bucket_seconds),
+                'input_tokens': group[0],
+                'cached_input_tokens': group[1],
+                'output_tokens': group[2],
+                'max_primary_used_percent': group[3],
+                'max_secondary_used_percent': group[4]
+            }
+            for key, group in sorted(groups.items())
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Codex token 事件列式存储")
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.add_parser('ingest', help='导入全部 session 历史中的 token_count 事件')
+    query_parser = subparsers.add_parser('query', help='按日/小时汇总用量')
+    query_parser.add_argument('--days', type=int, default=30, help='统计最近多少天（默认30）')
+    query_parser.add_argument('--by', choices=['day', 'hour'], default='day', help='汇总粒度')
+    args = parser.parse_args()
+
+    store = TokenEventStore()
+    if args.command == 'ingest':
+        added = store.ingest_all()
+        print(f"✅ 新增 {added} 个事件，共 {store.row_count()} 个")
+    elif args.command == 'query':
+        start_ms = int((time.time() - args.days * 86400) * 1000)
+        started = time.perf_counter()
+        rows = store.aggregate(start_ms=start_ms, bucket=args.by)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        for row in rows:
+            primary = row['max_primary_used_percent']
+            secondary = row['max_secondary_used_percent']
+            print(f"{row['bucket']:<16} 输入 {row['input_tokens']:>12,} 缓存 {row['cached_input_tokens']:>12,} "
+                  f"输出 {row['output_tokens']:>10,} 5h峰值 {'-' if primary is None else f'{primary:.1f}%':>6} "
+                  f"周峰值 {'-' if secondary is None else f'{secondary:.1f}%':>6}")
+        print(f"\n共 {store.row_count()} 个事件，查询耗时 {elapsed_ms:.1f} ms"
+              f"（{'NumPy' if np is not None else 'array'}）")
+    else:
+        parser.print_help()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
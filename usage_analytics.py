@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Codex 历史用量统计模块
+
+遍历全部 rollout 文件，根据相邻 token_count 事件的 total_token_usage 差值
+计算每轮用量，并按日期、模型、工作目录汇总 input/cached/output tokens。
+单个文件的统计结果按 (mtime, size) 缓存，重复运行时只处理新增或变化的文件。
+"""
+
+import json
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from atomic_io import update_json_entries
+from session_archive import ARCHIVE_READ_ERRORS, is_rollout_name, open_rollout
+
+
+ANALYTICS_CACHE_FILENAME = "analytics_cache.json"
+ANALYTICS_CACHE_VERSION = 1
+USAGE_FIELDS = ('input_tokens', 'cached_input_tokens', 'output_tokens')
+GROUP_KEYS = {'day': 0, 'model': 1, 'cwd': 2}
+# 待处理文件少于该数量时不启动进程池
+PROCESS_POOL_MIN_FILES = 16
+
+SESSION_META_MARKER = b'"session_meta"'
+TURN_CONTEXT_MARKER = b'"turn_context"'
+TOKEN_COUNT_MARKER = b'"token_count"'
+
+
+def _event_day(timestamp) -> str:
+    """将事件时间戳转换为本地日期字符串"""
+    if not isinstance(timestamp, str) or not timestamp:
+        return "未知"
+    try:
+        return datetime.fromisoformat(timestamp.replace('Z', '+00:00')).astimezone().strftime('%Y-%m-%d')
+    except ValueError:
+        return timestamp[:10]
+
+
+def analyze_rollout(session_file) -> List[list]:
+    """统计单个 rollout 文件，返回 [日期, 模型, 工作目录, input, cached, output] 行列表"""
+    totals = defaultdict(lambda: [0, 0, 0])
+    model = "未知"
+    cwd = "未知"
+    previous = None
+
+    with open_rollout(session_file) as stream:
+        for line in stream:
+            if SESSION_META_MARKER in line or TURN_CONTEXT_MARKER in line:
+                try:
+                    data = json.loads(line)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    continue
+                payload = data.get('payload') or {}
+                if data.get('type') == 'turn_context':
+                    model = payload.get('model') or model
+                    cwd = payload.get('cwd') or cwd
+                elif data.get('type') == 'session_meta':
+                    cwd = payload.get('cwd') or cwd
+                continue
+            if TOKEN_COUNT_MARKER not in line:
+                continue
+
+            try:
+                data = json.loads(line)
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                continue
+            payload = data.get('payload') or {}
+            info = payload.get('info')
+            if payload.get('type') != 'token_count' or not isinstance(info, dict):
+                continue
+            total = info.get('total_token_usage')
+            if not isinstance(total, dict):
+                continue
+
+            current = [int(total.get(field) or 0) for field in USAGE_FIELDS]
+            if previous is None or any(c < p for c, p in zip(current, previous)):
+                # 第一个事件或累计值被重置时，以当前累计值作为本轮用量
+                delta = current
+            else:
+                delta = [c - p for c, p in zip(current, previous)]
+            previous = current
+            if not any(delta):
+                continue
+
+            bucket = totals[(_event_day(data.get('timestamp')), model, cwd)]
+            for index, value in enumerate(delta):
+                bucket[index] += value
+
+    return [[day, model, cwd, *values] for (day, model, cwd), values in totals.items()]
+
+
+def _safe_analyze(session_file: str):
+    """进程池工作函数：返回 (路径, 统计行)，读取失败时统计行为 None"""
+    try:
+        return session_file, analyze_rollout(session_file)
+    except (*ARCHIVE_READ_ERRORS, ValueError) as e:
+        # 损坏的归档（lzma.LZMAError / zlib.error）只跳过该文件，不中断整个进程池统计
+        print(f"⚠️ 统计 {Path(session_file).name} 失败: {e}")
+        return session_file, None
+
+
+class UsageAnalytics:
+    """全部 session 历史的用量统计"""
+
+    def __init__(self, sessions_dir=None, cache_dir=None):
+        from config_utils import get_config_paths
+
+        self.sessions_dir = Path(sessions_dir) if sessions_dir else Path.home() / ".codex" / "sessions"
+        cache_dir = Path(cache_dir) if cache_dir else get_config_paths()['usage_cache_dir']
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        self.cache_file = cache_dir / ANALYTICS_CACHE_FILENAME
+
+    def _load_cache(self) -> Dict[str, Dict]:
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+            if isinstance(cache, dict) and cache.get('version') == ANALYTICS_CACHE_VERSION:
+                return cache.get('files') or {}
+        except (OSError, IOError, json.JSONDecodeError, ValueError):
+            pass
+        return {}
+
+    def _save_cache(self, updates: Dict[str, Dict], removed: List[str]):
+        """只把本次新统计和已删除的文件合并进缓存，不覆盖其他进程的写入"""
+        try:
+            update_json_entries(self.cache_file, 'files', ANALYTICS_CACHE_VERSION, updates, removed)
+        except (OSError, IOError, TimeoutError) as e:
+            print(f"⚠️ 保存统计缓存失败: {e}")
+
+    def _iter_rollouts(self):
+        if not self.sessions_dir.exists():
+            return
+        for session_file in self.sessions_dir.rglob("rollout-*"):
+            if is_rollout_name(session_file.name):
+                yield session_file
+
+    def collect(self, workers: Optional[int] = None) -> Dict:
+        """统计全部 rollout，返回各文件的统计行以及处理情况"""
+        cached = self._load_cache()
+        files = {}
+        pending = []
+
+        for session_file in self._iter_rollouts():
+            path = str(session_file)
+            try:
+                stat_result = session_file.stat()
+            except OSError:
+                continue
+            entry = cached.get(path)
+            if (entry and entry.get('mtime_ns') == stat_result.st_mtime_ns
+                    and entry.get('size') == stat_result.st_size):
+                files[path] = entry
+            else:
+                files[path] = {'mtime_ns': stat_result.st_mtime_ns, 'size': stat_result.st_size, 'rows': []}
+                pending.append(path)
+
+        if len(pending) < PROCESS_POOL_MIN_FILES:
+            results = map(_safe_analyze, pending)
+        else:
+            executor = ProcessPoolExecutor(max_workers=workers)
+            chunksize = max(1, len(pending) // ((workers or os.cpu_count() or 1) * 4))
+            results = executor.map(_safe_analyze, pending, chunksize=chunksize)
+
+        failed = 0
+        updates = {}
+        try:
+            for path, rows in results:
+                if rows is None:
+                    failed += 1
+                    # 读取失败的文件不写入缓存，下次重新处理
+                    del files[path]
+                else:
+                    files[path]['rows'] = rows
+                    updates[path] = files[path]
+        finally:
+            if len(pending) >= PROCESS_POOL_MIN_FILES:
+                executor.shutdown()
+
+        removed = [path for path in cached if path not in files]
+        if updates or removed:
+            self._save_cache(updates, removed)
+        return {'files': files, 'processed': len(pending) - failed, 'failed': failed}
+
+    def report(self, group_by: str = 'day', since: str = None, until: str = None,
+               workers: Optional[int] = None) -> Dict:
+        """按 day/model/cwd 汇总用量，since/until 为 YYYY-MM-DD 日期范围"""
+        collected = self.collect(workers)
+        key_index = GROUP_KEYS[group_by]
+        groups = defaultdict(lambda: [0, 0, 0])
+
+        for entry in collected['files'].values():
+            for row in entry.get('rows', []):
+                day = row[0]
+                if since and day < since:
+                    continue
+                if until and day > until:
+                    continue
+                bucket = groups[row[key_index]]
+                for index in range(3):
+                    bucket[index] += row[3 + index]
+
+        rows = [
+            {
+                group_by: key,
+                'input_tokens': values[0],
+                'cached_input_tokens': values[1],
+                'output_tokens': values[2]
+            }
+            for key, values in sorted(groups.items())
+        ]
+        return {
+            'group_by': group_by,
+            'rows': rows,
+            'files': len(collected['files']),
+            'processed': collected['processed'],
+            'failed': collected['failed']
+        }
+
+
+def format_report(report: Dict) -> str:
+    """格式化统计报告为表格文本"""
+    group_by = report['group_by']
+    titles = {'day': '日期', 'model': '模型', 'cwd': '工作目录'}
+    headers = [titles[group_by], "输入tokens", "缓存tokens", "输出tokens"]
+    rows = [
+        [row[group_by], f"{row['input_tokens']:,}", f"{row['cached_input_tokens']:,}", f"{row['output_tokens']:,}"]
+        for row in report['rows']
+    ]
+    if rows:
+        totals = [sum(row[field] for row in report['rows']) for field in USAGE_FIELDS]
+        rows.append(["合计", *[f"{value:,}" for value in totals]])
+
+    col_widths = [len(h) for h in headers]
+    for row in rows:
+        for idx, cell in enumerate(row):
+            col_widths[idx] = max(col_widths[idx], len(str(cell)))
+    lines = [
+        " | ".join(h.ljust(col_widths[idx]) for idx, h in enumerate(headers)),
+        "-+-".join("-" * width for width in col_widths),
+        *[" | ".join(str(cell).ljust(col_widths[idx]) for idx, cell in enumerate(row)) for row in rows]
+    ]
+    lines.append(f"\n共 {report['files']} 个 session 文件，本次解析 {report['processed']} 个")
+    if report['failed']:
+        lines.append(f"⚠️ {report['failed']} 个文件解析失败")
+    return "\n".join(lines)
@@ -4,12 +4,199 @@ Codex CLI 用量查询模块
 """
 
 import json
+import mmap
 import os
-import glob
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from itertools import islice
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Callable, Dict, List, Optional, Tuple
 from config_utils import get_config_paths
+from session_index import SessionIndex, INDEX_FILENAME
+from usage_store import UsageStore, USAGE_DB_FILENAME
+from rate_limits import normalize_rate_limits, project_rate_limits, project_usage_data, parse_check_time
+from session_summary import load_session_summary
+from switch_journal import SwitchJournal, parse_event_timestamp
+from session_archive import (ARCHIVE_READ_ERRORS, is_compressed_rollout, is_rollout_name, open_rollout,
+                             read_archived_usage_event)
+from jwt_claims import email_from_auth
+
+
+# 反向读取 session 文件时每次读取的块大小
+REVERSE_READ_BLOCK_SIZE = 64 * 1024
+
+# token_count 事件在原始字节中的特征，用于在解码 JSON 前预先过滤
+TOKEN_COUNT_MARKER = b'"token_count"'
+
+# 切换账号前快照用量时，每个文件最多读取的末尾字节数，以及最多检查的最新文件数
+SNAPSHOT_TAIL_BYTES = 256 * 1024
+SNAPSHOT_MAX_FILES = 3
+
+# 查找最新 session 时，一次扫描的日期分区达到该数量才使用线程池并行
+PARALLEL_SCAN_MIN_PARTITIONS = 8
+PARALLEL_SCAN_MAX_WORKERS = 8
+
+# 可从 session 重建的派生缓存最多占用量缓存大小上限的比例，超出时从大到小收缩
+DERIVED_CACHE_RATIO = 0.5
+
+
+def iter_lines_reverse(f, block_size: int = REVERSE_READ_BLOCK_SIZE):
+    """从文件末尾开始按块反向读取，逐行产出 (行起始偏移, 行内容 bytes)
+
+    f 必须是以二进制模式打开的文件对象。只产出完整的行（不含换行符），
+    内存占用与块大小和单行长度相关，而与文件总大小无关。
+    """
+    f.seek(0, os.SEEK_END)
+    position = f.tell()
+    remainder = b""
+    while position > 0:
+        read_size = min(block_size, position)
+        position -= read_size
+        f.seek(position)
+        block = f.read(read_size) + remainder
+        lines = block.split(b"\n")
+        # 第一段可能是被块边界截断的行，留到下一轮与更早的数据拼接
+        remainder = lines[0]
+        line_end = position + len(block)
+        for line in reversed(lines[1:]):
+            line_end -= len(line) + 1
+            if line.strip():
+                yield line_end + 1, line
+    if remainder.strip():
+        yield 0, remainder
+
+
+def _decode_json_line(line: bytes) -> Optional[Dict]:
+    """解码单行 JSONL，失败时返回 None"""
+    try:
+        data = json.loads(line)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def find_last_usage_event(buffer, end: int = None) -> Tuple[Optional[int], Optional[Dict]]:
+    """在 bytes/mmap 缓冲区中从 end 处向前查找最新的带 rate_limits 的 token_count 事件
+
+    先用 rfind 定位 b'"token_count"'，只对命中的行做 JSON 解码，
+    中间大量的 response_item 行不会产生任何 str 分配。返回 (行起始偏移, 事件)。
+    """
+    if end is None:
+        end = len(buffer)
+    while end > 0:
+        position = buffer.rfind(TOKEN_COUNT_MARKER, 0, end)
+        if position < 0:
+            break
+        line_start = buffer.rfind(b"\n", 0, position) + 1
+        line_end = buffer.find(b"\n", position, end)
+        if line_end < 0:
+            line_end = end
+        data = _decode_json_line(buffer[line_start:line_end])
+        if _is_usage_event(data):
+            return line_start, data
+        end = line_start
+    return None, None
+
+
+def read_tail_usage_event(session_file, max_bytes: int = SNAPSHOT_TAIL_BYTES) -> Optional[Dict]:
+    """只读取文件末尾 max_bytes 字节查找最新的 token_count 事件，压缩归档直接返回 None"""
+    if is_compressed_rollout(session_file):
+        return None
+    with open(session_file, 'rb') as f:
+        size = f.seek(0, os.SEEK_END)
+        start = max(0, size - max_bytes)
+        f.seek(start)
+        buffer = f.read(size - start)
+    if start:
+        # 丢弃被截断的第一行
+        buffer = buffer[buffer.find(b"\n") + 1:]
+    _, event = find_last_usage_event(buffer)
+    return event
+
+
+def scan_last_usage_event(session_file) -> Tuple[Optional[int], Optional[Dict]]:
+    """查找 rollout 文件中最新的 token_count 事件，返回 (字节偏移, 事件)
+
+    已结束的 session 优先读取摘要旁路文件；压缩归档（.jsonl.gz / .jsonl.xz）
+    读取索引旁路文件，否则流式解压。
+    """
+    summary = load_session_summary(session_file)
+    if summary is not None:
+        return summary.get('offset'), summary.get('last_token_count')
+    
+    if is_compressed_rollout(session_file):
+        return read_archived_usage_event(session_file)
+    
+    with open(session_file, 'rb') as f:
+        try:
+            # 内存映射文件，直接在字节视图上查找，不逐行解码
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return find_last_usage_event(mapped)
+        except ValueError:
+            # 空文件无法映射
+            return None, None
+        except OSError:
+            pass
+        
+        # 不支持 mmap 的文件系统：按块反向读取，遇到最新的 token_count 事件即停止
+        for offset, line in iter_lines_reverse(f):
+            if TOKEN_COUNT_MARKER not in line:
+                continue
+            data = _decode_json_line(line)
+            if _is_usage_event(data):
+                return offset, data
+    
+    return None, None
+
+
+def scan_usage_event_between(session_file, start_ts: float, end_ts: Optional[float]) -> Optional[Dict]:
+    """查找 rollout 中时间戳位于 [start_ts, end_ts) 的最后一个用量事件"""
+    def in_range(data):
+        event_ts = parse_event_timestamp(data.get('timestamp'))
+        if event_ts is None:
+            return False
+        if event_ts < start_ts:
+            return None
+        return end_ts is None or event_ts < end_ts
+    
+    if is_compressed_rollout(session_file):
+        found = None
+        with open_rollout(session_file) as stream:
+            for line in stream:
+                if TOKEN_COUNT_MARKER not in line:
+                    continue
+                data = _decode_json_line(line)
+                if _is_usage_event(data) and in_range(data):
+                    found = data
+        return found
+    
+    with open(session_file, 'rb') as f:
+        try:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            return None
+        with buffer:
+            end = len(buffer)
+            while end > 0:
+                offset, data = find_last_usage_event(buffer, end)
+                if data is None:
+                    return None
+                matched = in_range(data)
+                if matched is None:
+                    # 事件按时间顺序写入，更早的事件都在区间之前
+                    return None
+                if matched:
+                    return data
+                end = offset
+    return None
+
+
+def _is_usage_event(data: Optional[Dict]) -> bool:
+    """判断是否为带 rate_limits 的 token_count 事件"""
+    if not data:
+        return False
+    payload = data.get('payload') or {}
+    return payload.get('type') == 'token_count' and 'rate_limits' in payload
 
 
 class CodexUsageChecker:
@@ -34,114 +221,297 @@ class CodexUsageChecker:
             self.cache_ttl_hours = int(os.getenv("CODEX_USAGE_CACHE_TTL_HOURS", "720"))
         except ValueError:
             self.cache_ttl_hours = 720
-    
-    def find_latest_session_file(self) -> Optional[Path]:
-        """查找最新的有用量数据的 session 文件"""
-        if not self.codex_sessions_dir.exists():
-            return None
         
-        pattern = str(self.codex_sessions_dir / "**" / "rollout-*.jsonl")
-        session_files = glob.glob(pattern, recursive=True)
+        # 用量缓存总大小上限（MB），超出时按最近更新时间淘汰账号
+        # 例如：export CODEX_USAGE_CACHE_MAX_MB=16
+        try:
+            self.cache_max_mb = float(os.getenv("CODEX_USAGE_CACHE_MAX_MB", "64"))
+        except ValueError:
+            self.cache_max_mb = 64.0
         
-        if not session_files:
-            return None
+        # 用量缓存（SQLite，按真实邮箱保存）
+        self.usage_store = UsageStore(self.usage_cache_dir / USAGE_DB_FILENAME)
         
-        # 按修改时间排序，检查最近的文件
-        session_files.sort(key=lambda x: Path(x).stat().st_mtime, reverse=True)
+        # session 扫描索引：未变化的 rollout 文件直接从索引读取解析结果
+        self.session_index = SessionIndex(self.usage_cache_dir / INDEX_FILENAME)
         
-        for session_file in session_files[:10]:  # 只检查最近10个文件
-            if self._has_token_count_data(Path(session_file)):
-                return Path(session_file)
+        # 账号切换日志，用于把 session 用量归属到对应账号
+        self.switch_journal = SwitchJournal()
+    
+    def close(self):
+        """关闭用量数据库连接"""
+        self.usage_store.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def _iter_session_partitions(self):
+        """按日期从新到旧产出 sessions/YYYY/MM/DD 分区目录"""
+        def numeric_subdirs(directory):
+            try:
+                with os.scandir(directory) as it:
+                    names = [item.name for item in it
+                             if item.name.isdigit() and item.is_dir(follow_symlinks=False)]
+            except OSError:
+                return []
+            return [os.path.join(directory, name) for name in sorted(names, key=int, reverse=True)]
         
-        return Path(session_files[0]) if session_files else None
+        for year_dir in numeric_subdirs(self.codex_sessions_dir):
+            for month_dir in numeric_subdirs(year_dir):
+                yield from numeric_subdirs(month_dir)
+    
+    def _iter_unpartitioned_files(self):
+        """产出不在日期分区中的 rollout 文件（如旧版本直接写在 sessions 下的文件）"""
+        for session_file in self.codex_sessions_dir.rglob("rollout-*"):
+            if not is_rollout_name(session_file.name):
+                continue
+            parts = session_file.relative_to(self.codex_sessions_dir).parts[:-1]
+            if len(parts) == 3 and all(part.isdigit() for part in parts):
+                continue
+            yield str(session_file)
     
-    def _has_token_count_data(self, session_file: Path) -> bool:
-        """检查 session 文件是否包含 token_count 数据"""
+    @staticmethod
+    def _stat_rollouts(directory) -> List[Tuple[str, os.stat_result]]:
+        """列出目录中的 rollout 文件（包括压缩归档）及其 stat 结果"""
+        results = []
         try:
-            with open(session_file, 'r', encoding='utf-8') as f:
-                # 只读取最后几行来快速检查
-                lines = f.readlines()
-                for line in reversed(lines[-20:]):  # 检查最后20行
+            with os.scandir(directory) as it:
+                for item in it:
+                    if is_rollout_name(item.name):
+                        try:
+                            results.append((item.path, item.stat()))
+                        except OSError:
+                            continue
+        except OSError:
+            pass
+        return results
+    
+    def _stat_partitions(self, partitions) -> List[Tuple[str, os.stat_result]]:
+        """统计一批分区中的文件，分区较多时使用线程池并行扫描"""
+        if len(partitions) < PARALLEL_SCAN_MIN_PARTITIONS:
+            batches = [self._stat_rollouts(directory) for directory in partitions]
+        else:
+            workers = min(PARALLEL_SCAN_MAX_WORKERS, len(partitions))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                batches = list(executor.map(self._stat_rollouts, partitions))
+        return [entry for batch in batches for entry in batch]
+    
+    def find_latest_session_file(self) -> Optional[Path]:
+        """查找最新的有用量数据的 session 文件
+
+        从最新的日期分区开始按窗口逐步向前扩大搜索范围（1、2、4... 个分区），
+        窗口内按修改时间检查，找到第一个带 rate_limits 的 token_count 即停止。
+        """
+        if not self.codex_sessions_dir.exists():
+            return None
+        
+        def iter_windows():
+            # 第一个窗口包含两个分区，覆盖跨越午夜仍在写入的 session
+            partitions = self._iter_session_partitions()
+            size = 2
+            while True:
+                window = list(islice(partitions, size))
+                if not window:
+                    break
+                yield window
+                size *= 2
+            # 最后检查不在日期分区中的文件
+            yield None
+        
+        newest = None
+        found = None
+        for window in iter_windows():
+            if window is None:
+                entries = []
+                for session_file in self._iter_unpartitioned_files():
                     try:
-                        data = json.loads(line.strip())
-                        if data.get('payload', {}).get('type') == 'token_count':
-                            return True
-                    except json.JSONDecodeError:
+                        entries.append((session_file, os.stat(session_file)))
+                    except OSError:
                         continue
-            return False
-        except (OSError, IOError):
-            return False
+            else:
+                entries = self._stat_partitions(window)
+            entries.sort(key=lambda entry: entry[1].st_mtime_ns, reverse=True)
+            
+            if newest is None and entries:
+                newest = Path(entries[0][0])
+            for session_file, stat_result in entries:
+                if self._lookup_usage_event(Path(session_file), stat_result):
+                    found = Path(session_file)
+                    break
+            if found:
+                break
+        
+        self.session_index.save()
+        # 都没有用量数据时返回最新的文件
+        return found or newest
     
     def parse_session_file(self, session_file: Path) -> Optional[Dict]:
         """解析 session 文件，查找最新的 token_count 事件"""
         try:
-            with open(session_file, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-            
-            # 从后往前查找最新的 token_count 事件
-            for line in reversed(lines):
-                try:
-                    data = json.loads(line.strip())
-                    payload = data.get('payload', {})
-                    
-                    if payload.get('type') == 'token_count' and 'rate_limits' in payload:
-                        return data
-                except json.JSONDecodeError:
-                    continue
-            
-            return None
-        except (OSError, IOError):
+            stat_result = os.stat(session_file)
+        except OSError:
             return None
+        
+        data = self._lookup_usage_event(session_file, stat_result)
+        self.session_index.save()
+        return data
+    
+    def _lookup_usage_event(self, session_file: Path, stat_result: os.stat_result) -> Optional[Dict]:
+        """优先从索引读取文件最新的 token_count 事件，文件有变化时重新解析并更新索引"""
+        # 文件未变化时直接使用索引中的解析结果，无需打开文件
+        entry = self.session_index.lookup(session_file, stat_result)
+        if entry is not None:
+            return entry.get('event')
+        
+        try:
+            offset, data = self._scan_session_file(session_file)
+        except ARCHIVE_READ_ERRORS:
+            if not is_compressed_rollout(session_file):
+                return None
+            # 损坏或截断的归档记为没有用量事件，文件变化之前不再重复解压
+            offset, data = None, None
+        
+        self.session_index.update(session_file, stat_result, offset, data)
+        return data
+    
+    def _scan_session_file(self, session_file: Path) -> Tuple[Optional[int], Optional[Dict]]:
+        """从文件末尾反向查找最新的 token_count 事件，返回 (字节偏移, 事件)"""
+        return scan_last_usage_event(session_file)
     
     def save_usage_data(self, email: str, usage_data: Dict) -> bool:
         """保存用量数据到缓存"""
         if not email:
             return False
-        
-        try:
-            safe_email = email.replace('@', '_at_').replace('.', '_').replace('+', '_plus_')
-            cache_file = self.usage_cache_dir / f"{safe_email}_usage.json"
-            
-            cache_data = {
-                "email": email,
-                "last_updated": datetime.now().isoformat(),
-                "usage_data": usage_data
-            }
-            
-            with open(cache_file, 'w', encoding='utf-8') as f:
-                json.dump(cache_data, f, indent=2, ensure_ascii=False)
-            
-            return True
-        except (OSError, IOError):
-            return False
+        if isinstance(usage_data.get('rate_limits'), dict):
+            # 保存绝对重置时间，读取时才能按当前时间推算
+            captured_at = parse_check_time(usage_data.get('check_time'))
+            usage_data = dict(usage_data, rate_limits=normalize_rate_limits(usage_data['rate_limits'], captured_at))
+        return self.usage_store.save(email, usage_data)
     
     def load_usage_data(self, email: str) -> Optional[Dict]:
-        """从缓存加载用量数据"""
+        """从缓存加载用量数据（超过配置的TTL视为过期，默认30天），rate_limits 按当前时间推算"""
         if not email:
             return None
-        
-        try:
-            safe_email = email.replace('@', '_at_').replace('.', '_').replace('+', '_plus_')
-            cache_filename = f"{safe_email}_usage.json"
-            cache_file = self.usage_cache_dir / cache_filename
-            
-            if not cache_file.exists():
-                return None
-            
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                cache_data = json.load(f)
-            
-            # 检查数据是否过期（超过配置的TTL，默认30天）
-            last_updated = datetime.fromisoformat(cache_data.get('last_updated', ''))
-            if datetime.now() - last_updated > timedelta(hours=self.cache_ttl_hours):
-                return None
-            
-            return cache_data.get('usage_data')
-        except (OSError, IOError, json.JSONDecodeError, ValueError):
+        return project_usage_data(self.usage_store.load(email, self.cache_ttl_hours))
+    
+    def load_usage_many(self, emails: List[str]) -> Dict[str, Dict]:
+        """一次查询批量加载多个账号的缓存用量数据，返回 {email: usage_data}"""
+        return {
+            email: project_usage_data(usage_data)
+            for email, usage_data in self.usage_store.load_many(emails, self.cache_ttl_hours).items()
+        }
+    
+    def _saved_account_emails(self) -> Optional[set]:
+        """已保存账号及当前系统账号的邮箱；没有任何已保存账号时返回 None"""
+        paths = get_config_paths()
+        emails = set()
+        account_files = list(paths['accounts_dir'].glob("*.json")) if paths['accounts_dir'].exists() else []
+        if not account_files:
             return None
+        for config_file in [*account_files, paths['system_auth_file']]:
+            try:
+                with open(config_file, 'r', encoding='utf-8') as f:
+                    config = json.load(f)
+            except (OSError, IOError, json.JSONDecodeError):
+                continue
+            if isinstance(config, dict):
+                emails.update(filter(None, (config.get('email'), extract_email_from_auth(config))))
+        return emails
+    
+    def prune_session_index(self) -> int:
+        """移除 session 索引中已不存在的 rollout 文件，返回移除的索引项数"""
+        existing = (str(session_file) for session_file in self.codex_sessions_dir.rglob("rollout-*")
+                    if is_rollout_name(session_file.name))
+        pruned = self.session_index.prune(existing)
+        self.session_index.save()
+        return pruned
+    
+    def _derived_caches(self) -> List[Tuple[Path, Callable[[int], None]]]:
+        """usage_cache_dir 下可从 session 重建的缓存：[(缓存文件, 收缩到指定字节数的函数)]
+
+        token 事件存储不在其中：rollout 被清理后无法重建，它不计入大小上限。
+        """
+        from session_catalog import CATALOG_FILENAME
+        from usage_analytics import ANALYTICS_CACHE_FILENAME
+        
+        def trim_index(max_bytes: int):
+            self.session_index.trim(max_bytes)
+            self.session_index.save()
+        
+        def remover(path):
+            def remove(max_bytes: int):
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+            return remove
+        
+        analytics_file = self.usage_cache_dir / ANALYTICS_CACHE_FILENAME
+        catalog_file = self.usage_cache_dir / CATALOG_FILENAME
+        return [
+            (self.session_index.index_file, trim_index),
+            (analytics_file, remover(analytics_file)),
+            (catalog_file, remover(catalog_file)),
+        ]
     
-    def get_usage_summary(self, email: str = None) -> Dict:
-        """获取用量摘要"""
+    def collect_usage_garbage(self) -> Dict:
+        """回收过期、已删除账号以及超出大小上限的用量缓存，返回回收情况
+        
+        大小上限包含 session 索引、统计缓存和 session 目录等派生缓存，它们超过上限的
+        DERIVED_CACHE_RATIO 时从大到小收缩：session 索引淘汰最久未用的索引项，
+        其他缓存整体删除（之后按需重建）。剩余额度留给用量数据库。
+        """
+        index_pruned = self.prune_session_index()
+        max_bytes = int(self.cache_max_mb * 1024 * 1024)
+        
+        def file_size(path) -> int:
+            try:
+                return os.path.getsize(path)
+            except OSError:
+                return 0
+        
+        derived = sorted(((file_size(path), path, shrink) for path, shrink in self._derived_caches()),
+                         key=lambda item: item[0], reverse=True)
+        derived_bytes = sum(size for size, _, _ in derived)
+        cleared = cleared_bytes = 0
+        for size, path, shrink in derived:
+            excess = derived_bytes - int(max_bytes * DERIVED_CACHE_RATIO)
+            if excess <= 0 or not size:
+                break
+            try:
+                shrink(max(size - excess, 0))
+            except (OSError, IOError, TimeoutError):
+                continue
+            freed = size - file_size(path)
+            derived_bytes -= freed
+            cleared += 1
+            cleared_bytes += freed
+        
+        report = self.usage_store.collect_garbage(
+            valid_emails=self._saved_account_emails(),
+            max_age_hours=self.cache_ttl_hours,
+            max_bytes=max(max_bytes - derived_bytes, 0)
+        )
+        report['caches_shrunk'] = cleared
+        report['index_pruned'] = index_pruned
+        report['bytes_reclaimed'] += cleared_bytes
+        return report
+    
+    def load_usage_history(self, email: str, since: float = None, until: float = None) -> List[Dict]:
+        """读取账号 used_percent 的历史采样（旧数据已按层级降采样）"""
+        if not email:
+            return []
+        return self.usage_store.load_history(email, since, until)
+    
+    def get_usage_summary(self, email: str = None, follower: 'SessionFollower' = None) -> Dict:
+        """获取用量摘要
+
+        传入 follower 时只解析最新 session 文件自上次调用以来追加的内容，
+        并且仅在用量数据发生变化时才重写缓存。
+        """
         summary = {
             "check_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             "status": "checking...",
@@ -150,19 +520,53 @@ class CodexUsageChecker:
             "errors": []
         }
         
-        session_file = self.find_latest_session_file()
+        if follower is not None:
+            token_data = follower.poll()
+            session_file = follower.session_file
+        else:
+            session_file = self.find_latest_session_file()
+            token_data = self.parse_session_file(session_file) if session_file else None
+        
         if not session_file:
             summary["errors"].append("未找到 Codex CLI session 文件")
             summary["status"] = "failed"
             return summary
         
-        token_data = self.parse_session_file(session_file)
         if not token_data:
             summary["errors"].append("未找到有效的用量数据，请先在当前账号下使用 codex 发送消息")
             summary["status"] = "failed"
             return summary
         
-        # 提取数据
+        self._fill_summary(summary, token_data)
+        
+        # 根据切换日志核对事件归属：事件早于切换到当前账号的时间时，属于之前的账号
+        owner_email = self._attribute_event(email, token_data)
+        if owner_email:
+            self.save_usage_data(owner_email, {
+                "check_time": summary["check_time"],
+                "token_usage": summary["token_usage"],
+                "rate_limits": summary["rate_limits"]
+            })
+            summary["status"] = "failed"
+            summary["errors"].append(f"最新的用量数据产生于切换账号之前（属于 {owner_email}），请先在当前账号下使用 codex 发送消息")
+            return summary
+        
+        # 保存到缓存（跟随模式下数据未变化时跳过写入）
+        if follower is not None and not follower.changed:
+            return summary
+        if email and summary["status"] == "success":
+            self.save_usage_data(email, {
+                "check_time": summary["check_time"],
+                "token_usage": summary["token_usage"],
+                "rate_limits": summary["rate_limits"]
+            })
+            if follower is not None:
+                follower.changed = False
+        
+        return summary
+    
+    def _fill_summary(self, summary: Dict, token_data: Dict):
+        """从 token_count 事件中提取用量数据填入摘要"""
         payload = token_data.get('payload', {})
         info = payload.get('info')
         
@@ -170,18 +574,131 @@ class CodexUsageChecker:
             summary["token_usage"] = info['total_token_usage']
         
         if 'rate_limits' in payload:
-            summary["rate_limits"] = payload['rate_limits']
+            # resets_in_seconds 相对事件发生时刻，换算为绝对重置时间
+            captured_at = parse_event_timestamp(token_data.get('timestamp'))
+            summary["rate_limits"] = normalize_rate_limits(payload['rate_limits'], captured_at)
         
         summary["status"] = "success"
-        
-        # 保存到缓存
-        if email and summary["status"] == "success":
-            self.save_usage_data(email, {
+    
+    def _attribute_event(self, email: Optional[str], token_data: Dict) -> Optional[str]:
+        """事件发生时活跃的账号不是 email 时返回该账号邮箱，否则返回 None
+
+        只有切换日志最新一条记录就是 email 时才做判断，
+        避免在日志之外（如直接 codex login）切换账号时误判。
+        """
+        if not email:
+            return None
+        latest = self.switch_journal.latest()
+        if not latest or latest.get('email') != email:
+            return None
+        event_ts = parse_event_timestamp(token_data.get('timestamp'))
+        if event_ts is None or event_ts >= latest['ts']:
+            return None
+        owner = self.switch_journal.account_at(event_ts)
+        if owner and owner.get('email') and owner['email'] != email:
+            return owner['email']
+        return None
+    
+    def _event_belongs_to(self, email: str, token_data: Dict) -> bool:
+        """切换日志确认事件发生在 email 作为活跃账号的区间内时返回 True"""
+        event_ts = parse_event_timestamp(token_data.get('timestamp'))
+        if event_ts is None:
+            return False
+        owner = self.switch_journal.account_at(event_ts)
+        return bool(owner) and owner.get('email') == email
+    
+    def find_account_usage_event(self, email: str) -> Optional[Dict]:
+        """根据切换日志，在 email 作为活跃账号期间写入的 session 中查找最新的用量事件"""
+        for start, end in self.switch_journal.intervals_for(email):
+            # session 按开始日期分区，往前多看一天以覆盖跨越午夜的 session
+            start_day = (datetime.fromtimestamp(start) - timedelta(days=1)).strftime('%Y%m%d')
+            candidates = []
+            for partition in self._iter_session_partitions():
+                parts = Path(partition).parts[-3:]
+                if ''.join(part.zfill(2) for part in parts) < start_day:
+                    break
+                candidates.extend(entry for entry in self._stat_rollouts(partition)
+                                  if entry[1].st_mtime >= start)
+            candidates.sort(key=lambda entry: entry[1].st_mtime_ns, reverse=True)
+            
+            best_ts, best_event = None, None
+            for session_file, stat_result in candidates:
+                if best_ts is not None and stat_result.st_mtime < best_ts:
+                    # 文件最后写入时间早于已找到的事件，不可能包含更新的事件
+                    break
+                event = self._lookup_usage_event(Path(session_file), stat_result)
+                event_ts = parse_event_timestamp((event or {}).get('timestamp'))
+                if event_ts is None or event_ts < start:
+                    continue
+                if end is not None and event_ts >= end:
+                    # 文件最新事件已属于后续账号，在文件内继续向前查找
+                    event = scan_usage_event_between(session_file, start, end)
+                    event_ts = parse_event_timestamp((event or {}).get('timestamp'))
+                    if event_ts is None:
+                        continue
+                if best_ts is None or event_ts > best_ts:
+                    best_ts, best_event = event_ts, event
+            
+            self.session_index.save()
+            if best_event:
+                return best_event
+        return None
+    
+    def snapshot_account_usage(self, email: str) -> bool:
+        """切换账号前调用：从最近写入的几个 session 末尾读取最新用量并写入缓存
+
+        只列出最新的两个日期分区、每个文件只读取末尾 SNAPSHOT_TAIL_BYTES 字节，
+        耗时与 session 历史的规模无关。只有切换日志确认最新事件发生在 email 作为活跃账号期间时
+        才保存，无法确认时跳过，避免其他账号的旧用量覆盖 email 的缓存。
+        """
+        if not email:
+            return False
+        partitions = list(islice(self._iter_session_partitions(), 2))
+        candidates = sorted(self._stat_partitions(partitions), key=lambda entry: entry[1].st_mtime_ns, reverse=True)
+        for session_file, _ in candidates[:SNAPSHOT_MAX_FILES]:
+            try:
+                token_data = read_tail_usage_event(session_file)
+            except (OSError, IOError):
+                continue
+            if not token_data:
+                continue
+            if not self._event_belongs_to(email, token_data):
+                return False
+            summary = {
+                "check_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "token_usage": {},
+                "rate_limits": {}
+            }
+            self._fill_summary(summary, token_data)
+            return self.save_usage_data(email, {
                 "check_time": summary["check_time"],
                 "token_usage": summary["token_usage"],
                 "rate_limits": summary["rate_limits"]
             })
+        return False
+    
+    def get_account_usage_from_history(self, email: str) -> Dict:
+        """从该账号活跃期间的历史 session 中获取用量（用于非当前账号），成功时写入缓存"""
+        summary = {
+            "check_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "status": "checking...",
+            "token_usage": {},
+            "rate_limits": {},
+            "errors": []
+        }
         
+        token_data = self.find_account_usage_event(email) if email else None
+        if not token_data:
+            summary["errors"].append("切换记录中没有该账号活跃期间的用量数据")
+            summary["status"] = "failed"
+            return summary
+        
+        self._fill_summary(summary, token_data)
+        self.save_usage_data(email, {
+            "check_time": summary["check_time"],
+            "token_usage": summary["token_usage"],
+            "rate_limits": summary["rate_limits"]
+        })
         return summary
     
     def format_usage_summary(self, summary: Dict) -> str:
@@ -225,8 +742,9 @@ class CodexUsageChecker:
         output_tokens = f"{usage.get('output_tokens', 0):,}"
         total_tokens = f"{usage.get('total_tokens', 0):,}"
 
-        # 速率限制（选取最关键的 5 小时与周窗口）
-        limits = summary.get("rate_limits") or {}
+        # 速率限制（选取最关键的 5 小时与周窗口），已过重置时间的窗口按 0% 计
+        limits = project_rate_limits(summary.get("rate_limits") or {},
+                                     parse_check_time(summary.get("check_time")))
         five_hour_limit = None
         weekly_limit = None
 
@@ -275,9 +793,13 @@ class CodexUsageChecker:
                 if weekly_limit is None or used_percent > get_used_percent(weekly_limit):
                     weekly_limit = limit
 
-        five_hour_used = f"{get_used_percent(five_hour_limit):.1f}%" if five_hour_limit else "暂无"
+        def format_used(limit):
+            used = f"{get_used_percent(limit):.1f}%"
+            return f"{used} (已重置)" if limit.get("reset_elapsed") else used
+
+        five_hour_used = format_used(five_hour_limit) if five_hour_limit else "暂无"
         five_hour_reset = format_reset(five_hour_limit) if five_hour_limit else "暂无"
-        weekly_used = f"{get_used_percent(weekly_limit):.1f}%" if weekly_limit else "暂无"
+        weekly_used = format_used(weekly_limit) if weekly_limit else "暂无"
         weekly_reset = format_reset(weekly_limit) if weekly_limit else "暂无"
 
         combined_headers = [
@@ -302,25 +824,160 @@ class CodexUsageChecker:
         return "\n".join(lines)
 
 
+class SessionFollower:
+    """跟随最新 rollout 文件的追加内容，每次只解析新写入的字节
+
+    changed 在用量数字变化时置为 True，由使用方处理（如写入缓存）后清除。
+    """
+    
+    def __init__(self, checker: CodexUsageChecker):
+        self.checker = checker
+        self.session_file = None
+        self.offset = 0
+        self.event = None
+        self.changed = False
+        self._mtime_ns = None
+    
+    def _usage_key(self, event: Optional[Dict]):
+        """用于判断用量数字是否变化的比较键"""
+        if not event:
+            return None
+        payload = event.get('payload') or {}
+        info = payload.get('info') if isinstance(payload.get('info'), dict) else {}
+        return (
+            json.dumps(info.get('total_token_usage'), sort_keys=True),
+            json.dumps(payload.get('rate_limits'), sort_keys=True)
+        )
+    
+    def _find_newer_file(self) -> Optional[Path]:
+        """只检查当前文件所在目录和今天的日期目录，查找是否有更新的 rollout 文件"""
+        today = datetime.now()
+        candidate_dirs = {
+            self.session_file.parent,
+            self.checker.codex_sessions_dir / today.strftime('%Y') / today.strftime('%m') / today.strftime('%d')
+        }
+        newest = None
+        newest_mtime = self._mtime_ns
+        for directory in candidate_dirs:
+            try:
+                with os.scandir(directory) as it:
+                    for item in it:
+                        if not (item.name.startswith('rollout-') and item.name.endswith('.jsonl')):
+                            continue
+                        if item.path == str(self.session_file):
+                            continue
+                        try:
+                            mtime_ns = item.stat().st_mtime_ns
+                        except OSError:
+                            continue
+                        if newest_mtime is None or mtime_ns > newest_mtime:
+                            newest, newest_mtime = Path(item.path), mtime_ns
+            except OSError:
+                continue
+        return newest
+    
+    def _attach(self, session_file: Path):
+        """切换到新的 rollout 文件：反向读取最新事件，并从文件末尾开始跟随"""
+        self.session_file = session_file
+        try:
+            stat_result = os.stat(session_file)
+            _, event = self.checker._scan_session_file(session_file)
+        except (OSError, IOError):
+            self.offset = 0
+            self._mtime_ns = None
+            return
+        # 新文件还没有用量事件时保留上一个文件的最新数据
+        if event:
+            self.event = event
+        self.offset = self._complete_size(session_file, stat_result.st_size)
+        self._mtime_ns = stat_result.st_mtime_ns
+    
+    def _complete_size(self, session_file: Path, size: int) -> int:
+        """返回最后一个完整行结束处的偏移，尚未写完的末行留到下次读取"""
+        if is_compressed_rollout(session_file):
+            # 归档文件不会再追加内容
+            return size
+        with open(session_file, 'rb') as f:
+            for offset, line in iter_lines_reverse(f):
+                end = offset + len(line)
+                return end + 1 if end < size else offset
+        return 0
+    
+    def _read_appended(self):
+        """解析自上次偏移以来追加的完整行"""
+        with open(self.session_file, 'rb') as f:
+            f.seek(self.offset)
+            chunk = f.read()
+        last_newline = chunk.rfind(b"\n")
+        if last_newline < 0:
+            return
+        # 只需要追加内容中最新的用量事件，直接在字节上反向查找
+        _, event = find_last_usage_event(chunk, last_newline)
+        if event:
+            self.event = event
+        self.offset += last_newline + 1
+    
+    def poll(self) -> Optional[Dict]:
+        """返回当前最新的 token_count 事件"""
+        previous_key = self._usage_key(self.event)
+        
+        if self.session_file is None:
+            session_file = self.checker.find_latest_session_file()
+            if session_file:
+                self._attach(session_file)
+        else:
+            newer_file = self._find_newer_file()
+            if newer_file:
+                self._attach(newer_file)
+            else:
+                try:
+                    stat_result = os.stat(self.session_file)
+                    if stat_result.st_size < self.offset:
+                        # 文件被截断或重写，重新定位
+                        self._attach(self.session_file)
+                    elif stat_result.st_size > self.offset and not is_compressed_rollout(self.session_file):
+                        self._read_appended()
+                        self._mtime_ns = stat_result.st_mtime_ns
+                except (OSError, IOError):
+                    # 当前文件已不存在，重新查找最新文件
+                    self.session_file = None
+                    session_file = self.checker.find_latest_session_file()
+                    if session_file:
+                        self._attach(session_file)
+        
+        if self._usage_key(self.event) != previous_key:
+            self.changed = True
+        return self.event
+
+
 def extract_email_from_auth(auth_data: Dict) -> Optional[str]:
     """从认证数据中提取邮箱地址"""
+    return email_from_auth(auth_data)
+
+
+def format_gc_report(report: Dict) -> str:
+    """格式化用量缓存回收结果"""
+    return (f"过期 {report['expired']} 个账号，已删除账号 {report['orphaned']} 个，"
+            f"超出上限淘汰 {report['evicted']} 个，历史记录 {report['history_rows']} 条，"
+            f"session 索引 {report.get('index_pruned', 0)} 条，"
+            f"收缩派生缓存 {report.get('caches_shrunk', 0)} 个，释放 {report['bytes_reclaimed'] / 1024:.1f} KB")
+
+
+def snapshot_outgoing_account(auth_file=None, checker: 'CodexUsageChecker' = None) -> bool:
+    """切换账号前保存当前（即将切出）账号的最新用量，任何失败都不影响切换"""
     try:
-        import base64
-        id_token = auth_data.get("tokens", {}).get("id_token", "")
-        if id_token:
-            parts = id_token.split(".")
-            if len(parts) >= 2:
-                payload = parts[1]
-                payload += "=" * (4 - len(payload) % 4)
-                try:
-                    decoded = base64.b64decode(payload)
-                    token_data = json.loads(decoded)
-                    return token_data.get("email")
-                except (ValueError, json.JSONDecodeError):
-                    pass
-    except (KeyError, TypeError, AttributeError):
-        pass
-    return None
+        auth_file = auth_file or get_config_paths()['system_auth_file']
+        with open(auth_file, 'r', encoding='utf-8') as f:
+            current_config = json.load(f)
+        email = current_config.get('email') or extract_email_from_auth(current_config)
+        if not email:
+            return False
+        if checker is not None:
+            return checker.snapshot_account_usage(email)
+        with CodexUsageChecker() as checker:
+            return checker.snapshot_account_usage(email)
+    except Exception:
+        return False
 
 
 # 兼容性别名
@@ -353,6 +1010,6 @@ def extract_access_token_from_auth(auth_data: Dict) -> Optional[str]:
 
 
 if __name__ == "__main__":
-    checker = CodexUsageChecker()
-    summary = checker.get_usage_summary()
-    print(checker.format_usage_summary(summary))
+    with CodexUsageChecker() as checker:
+        summary = checker.get_usage_summary()
+        print(checker.format_usage_summary(summary))
@@ -0,0 +1,551 @@
+#!/usr/bin/env python3
+"""
+账号用量缓存存储
+
+使用标准库 sqlite3（WAL 模式）按真实邮箱保存每个账号最近一次的用量数据，
+支持一次查询批量读取多个账号。WAL 模式下读写进程互不阻塞。
+读取结果按数据库及其 WAL 文件的签名缓存在进程内，数据库未变化时不再查询。
+
+Tauri 端仍读写 usage_cache/<safe_email>_usage.json，因此保存时同时写出该 JSON 文件，
+读取时发现 JSON 文件比数据库中的记录更新（Tauri 端写入）则导入数据库。
+数据库无法打开时退回内存数据库，用量仍通过 JSON 文件持久化。
+
+每次保存同时向 usage_history 追加各限额窗口的 used_percent 采样，
+压缩时按保留层级把旧采样合并为 5 分钟、1 小时的 min/max/last 桶。
+"""
+
+import copy
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from atomic_io import atomic_write_json
+from stat_cache import file_signature, shared_cache
+
+
+USAGE_DB_FILENAME = "usage.sqlite3"
+# 旧版 JSON 缓存文件名后缀
+LEGACY_CACHE_SUFFIX = "_usage.json"
+# 数据库被其他进程锁定时的最长等待时间（毫秒）
+BUSY_TIMEOUT_MS = 5000
+# SQLite 单条语句的参数个数上限较低，批量查询时分批
+QUERY_BATCH_SIZE = 500
+
+# 回收后空闲页超过数据库的该比例时执行 VACUUM 收缩文件
+VACUUM_FREE_RATIO = 0.25
+
+# 估算行大小时每行数值列、记录头与主键索引的固定开销（字节）
+USAGE_ROW_OVERHEAD = 32
+HISTORY_ROW_OVERHEAD = 96
+
+# 用量历史保留层级：(层级, 桶宽秒数, 本层保留秒数)
+# 原始采样保留 48 小时，之后合并为 5 分钟桶；5 分钟桶保留 14 天，之后合并为小时桶
+HISTORY_TIERS = (
+    (0, 0, 48 * 3600),
+    (1, 300, 14 * 86400),
+    (2, 3600, 365 * 86400),
+)
+
+
+def legacy_cache_file(cache_dir, email: str) -> Path:
+    """与 Tauri 端一致的 JSON 缓存文件路径"""
+    safe_email = email.replace('@', '_at_').replace('.', '_').replace('+', '_plus_')
+    return Path(cache_dir) / f"{safe_email}{LEGACY_CACHE_SUFFIX}"
+
+
+def _read_legacy_file(cache_file) -> Optional[tuple]:
+    """读取 JSON 缓存文件，返回 (email, updated_ts, last_updated, usage_data)，无效时返回 None"""
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            cache_data = json.load(f)
+        email = cache_data.get('email')
+        last_updated = cache_data.get('last_updated', '')
+        # Tauri 端使用 toISOString()，带 Z 后缀
+        updated_ts = datetime.fromisoformat(last_updated.replace('Z', '+00:00')).timestamp()
+        usage_data = cache_data['usage_data']
+    except (OSError, IOError, json.JSONDecodeError, ValueError, KeyError, AttributeError, TypeError):
+        return None
+    if not email or not isinstance(usage_data, dict):
+        return None
+    return email, updated_ts, last_updated, usage_data
+
+
+class UsageStore:
+    """按邮箱保存用量数据的 SQLite 存储"""
+
+    def __init__(self, db_file=None):
+        if db_file is None:
+            from config_utils import get_config_paths
+            db_file = get_config_paths()['usage_cache_dir'] / USAGE_DB_FILENAME
+        self.db_file = Path(db_file)
+        self.db_file.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.in_memory = False
+        try:
+            self._open(str(self.db_file))
+            self._migrate_json_cache()
+        except sqlite3.Error as e:
+            # 数据库损坏、被锁定或目录只读时不影响用量查询
+            print(f"⚠️ 无法打开用量数据库 {self.db_file}（{e}），改用 JSON 缓存文件")
+            try:
+                self._conn.close()
+            except (AttributeError, sqlite3.Error):
+                pass
+            self.in_memory = True
+            self._open(":memory:")
+            self._migrate_json_cache()
+
+    def _open(self, database: str):
+        self._conn = sqlite3.connect(database, timeout=BUSY_TIMEOUT_MS / 1000,
+                                     check_same_thread=False, isolation_level=None)
+        self._conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS usage ("
+            " email TEXT PRIMARY KEY,"
+            " updated_ts REAL NOT NULL,"
+            " last_updated TEXT NOT NULL,"
+            " usage_data TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS usage_history ("
+            " email TEXT NOT NULL,"
+            " tier INTEGER NOT NULL,"
+            " bucket_ts REAL NOT NULL,"
+            " limit_name TEXT NOT NULL,"
+            " window_minutes INTEGER,"
+            " used_min REAL NOT NULL,"
+            " used_max REAL NOT NULL,"
+            " used_last REAL NOT NULL,"
+            " last_ts REAL NOT NULL,"
+            " samples INTEGER NOT NULL,"
+            " PRIMARY KEY (email, tier, bucket_ts, limit_name))"
+        )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _upsert(self, rows):
+        """写入 (email, updated_ts, last_updated, usage_data) 行，只保留更新时间较新的一条"""
+        self._conn.executemany(
+            "INSERT INTO usage (email, updated_ts, last_updated, usage_data) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(email) DO UPDATE SET updated_ts = excluded.updated_ts,"
+            " last_updated = excluded.last_updated, usage_data = excluded.usage_data "
+            "WHERE excluded.updated_ts >= usage.updated_ts",
+            rows
+        )
+
+    def _migrate_json_cache(self):
+        """首次打开时导入同目录下全部 *_usage.json 缓存文件
+
+        JSON 文件保留不删除（Tauri 端仍直接读写这些文件），之后的变化由 load_many 按账号导入。
+        """
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM meta WHERE key = 'json_migrated'").fetchone():
+                return
+            rows = []
+            for cache_file in self.db_file.parent.glob(f"*{LEGACY_CACHE_SUFFIX}"):
+                record = _read_legacy_file(cache_file)
+                if record:
+                    email, updated_ts, last_updated, usage_data = record
+                    rows.append((email, updated_ts, last_updated, json.dumps(usage_data, ensure_ascii=False)))
+
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._upsert(rows)
+                self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('json_migrated', ?)",
+                                   (datetime.now().isoformat(),))
+                self._conn.execute("COMMIT")
+            except sqlite3.Error:
+                self._conn.execute("ROLLBACK")
+                raise
+        if rows and not self.in_memory:
+            print(f"📦 已导入 {len(rows)} 个旧版用量缓存文件")
+
+    def _upsert_history(self, rows):
+        """写入 (email, tier, bucket_ts, limit_name, window_minutes, min, max, last, last_ts, samples)，
+        桶已存在时合并"""
+        self._conn.executemany(
+            "INSERT INTO usage_history (email, tier, bucket_ts, limit_name, window_minutes,"
+            " used_min, used_max, used_last, last_ts, samples) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(email, tier, bucket_ts, limit_name) DO UPDATE SET"
+            " used_min = MIN(used_min, excluded.used_min),"
+            " used_max = MAX(used_max, excluded.used_max),"
+            " used_last = CASE WHEN excluded.last_ts >= last_ts THEN excluded.used_last ELSE used_last END,"
+            " window_minutes = CASE WHEN excluded.last_ts >= last_ts THEN excluded.window_minutes ELSE window_minutes END,"
+            " last_ts = MAX(last_ts, excluded.last_ts),"
+            " samples = samples + excluded.samples",
+            rows
+        )
+
+    @staticmethod
+    def _history_samples(email: str, usage_data: Dict, timestamp: float) -> List[tuple]:
+        samples = []
+        rate_limits = usage_data.get('rate_limits') if isinstance(usage_data, dict) else None
+        for limit_name, limit in (rate_limits or {}).items():
+            if not isinstance(limit, dict) or not isinstance(limit.get('used_percent'), (int, float)):
+                continue
+            used = float(limit['used_percent'])
+            window_minutes = limit.get('window_minutes')
+            window_minutes = int(window_minutes) if isinstance(window_minutes, (int, float)) else None
+            samples.append((email, 0, timestamp, limit_name, window_minutes, used, used, used, timestamp, 1))
+        return samples
+
+    def save(self, email: str, usage_data: Dict) -> bool:
+        """保存账号的用量数据，并向用量历史追加一条原始采样
+
+        同时写出 Tauri 端使用的 JSON 缓存文件，数据库或 JSON 文件任一写入成功即返回 True。
+        """
+        now = time.time()
+        last_updated = datetime.fromtimestamp(now).isoformat()
+        row = (email, now, last_updated, json.dumps(usage_data, ensure_ascii=False))
+        saved = True
+        try:
+            with self._lock:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    self._upsert([row])
+                    self._upsert_history(self._history_samples(email, usage_data, now))
+                    self._conn.execute("COMMIT")
+                except sqlite3.Error:
+                    self._conn.execute("ROLLBACK")
+                    raise
+        except sqlite3.Error:
+            saved = False
+        # 同一时间刻度内的写入不一定改变数据库文件签名，直接丢弃该账号的缓存行
+        shared_cache.invalidate(('usage', str(self.db_file), email))
+        try:
+            atomic_write_json(legacy_cache_file(self.db_file.parent, email),
+                              {"email": email, "last_updated": last_updated, "usage_data": usage_data},
+                              lock=False)
+        except (OSError, IOError, TypeError, ValueError):
+            return saved
+        return True
+
+    def _import_legacy(self, emails, rows: Dict[str, Optional[tuple]]):
+        """导入比数据库记录更新的 JSON 缓存文件（Tauri 端写入），直接更新 rows"""
+        newer = []
+        for email in emails:
+            cache_file = legacy_cache_file(self.db_file.parent, email)
+            record = shared_cache.get(('usage_json', str(cache_file)), [cache_file],
+                                      lambda: _read_legacy_file(cache_file))
+            if not record or record[0] != email:
+                continue
+            row = rows.get(email)
+            # 本进程写出的 JSON 与数据库记录时间相同，只导入明显更新的文件
+            if row is None or record[1] > row[0] + 1e-3:
+                newer.append(record)
+        if not newer:
+            return
+        try:
+            with self._lock:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    self._upsert([
+                        (email, updated_ts, last_updated, json.dumps(usage_data, ensure_ascii=False))
+                        for email, updated_ts, last_updated, usage_data in newer
+                    ])
+                    for email, updated_ts, _, usage_data in newer:
+                        self._upsert_history(self._history_samples(email, usage_data, updated_ts))
+                    self._conn.execute("COMMIT")
+                except sqlite3.Error:
+                    self._conn.execute("ROLLBACK")
+                    raise
+        except sqlite3.Error:
+            pass
+        for email, updated_ts, _, usage_data in newer:
+            shared_cache.invalidate(('usage', str(self.db_file), email))
+            rows[email] = (updated_ts, usage_data)
+
+    def compact_history(self, now: float = None) -> Dict[str, int]:
+        """按 HISTORY_TIERS 把超出保留期的记录合并到下一层级，最后一层超期后删除
+
+        返回 {'compacted': 合并的记录数, 'deleted': 删除的记录数}。
+        """
+        now = time.time() if now is None else now
+        result = {'compacted': 0, 'deleted': 0}
+        try:
+            with self._lock:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    for index, (tier, _, retention) in enumerate(HISTORY_TIERS):
+                        cutoff = now - retention
+                        if index + 1 == len(HISTORY_TIERS):
+                            cursor = self._conn.execute(
+                                "DELETE FROM usage_history WHERE tier = ? AND bucket_ts < ?", (tier, cutoff))
+                            result['deleted'] += cursor.rowcount
+                            continue
+
+                        next_tier, width, _ = HISTORY_TIERS[index + 1]
+                        rows = self._conn.execute(
+                            "SELECT email, limit_name, window_minutes, bucket_ts, used_min, used_max,"
+                            " used_last, last_ts, samples FROM usage_history"
+                            " WHERE tier = ? AND bucket_ts < ? ORDER BY last_ts",
+                            (tier, cutoff)
+                        ).fetchall()
+                        if not rows:
+                            continue
+                        buckets = {}
+                        for (email, limit_name, window_minutes, bucket_ts, used_min, used_max,
+                             used_last, last_ts, samples) in rows:
+                            key = (email, bucket_ts // width * width, limit_name)
+                            bucket = buckets.get(key)
+                            if bucket is None:
+                                buckets[key] = [window_minutes, used_min, used_max, used_last, last_ts, samples]
+                            else:
+                                # 按 last_ts 升序遍历，后出现的即为最新值
+                                bucket[0] = window_minutes
+                                bucket[1] = min(bucket[1], used_min)
+                                bucket[2] = max(bucket[2], used_max)
+                                bucket[3] = used_last
+                                bucket[4] = last_ts
+                                bucket[5] += samples
+                        self._upsert_history([
+                            (email, next_tier, bucket_ts, limit_name, *values)
+                            for (email, bucket_ts, limit_name), values in buckets.items()
+                        ])
+                        self._conn.execute(
+                            "DELETE FROM usage_history WHERE tier = ? AND bucket_ts < ?", (tier, cutoff))
+                        result['compacted'] += len(rows)
+                    self._conn.execute("COMMIT")
+                except sqlite3.Error:
+                    self._conn.execute("ROLLBACK")
+                    raise
+        except sqlite3.Error as e:
+            print(f"⚠️ 压缩用量历史失败: {e}")
+        return result
+
+    def load_history(self, email: str, since: float = None, until: float = None) -> List[Dict]:
+        """读取账号的用量历史，各层级合并后按时间排序
+
+        每条记录为 {'ts', 'limit', 'window_minutes', 'min', 'max', 'last', 'samples', 'resolution'}，
+        resolution 为桶宽秒数，原始采样为 0。
+        """
+        widths = {tier: width for tier, width, _ in HISTORY_TIERS}
+        try:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT tier, bucket_ts, limit_name, window_minutes, used_min, used_max, used_last, samples"
+                    " FROM usage_history WHERE email = ? AND bucket_ts >= ? AND bucket_ts <= ?"
+                    " ORDER BY bucket_ts",
+                    (email, since if since is not None else float('-inf'),
+                     until if until is not None else float('inf'))
+                ).fetchall()
+        except sqlite3.Error:
+            return []
+        return [
+            {
+                'ts': bucket_ts,
+                'limit': limit_name,
+                'window_minutes': window_minutes,
+                'min': used_min,
+                'max': used_max,
+                'last': used_last,
+                'samples': samples,
+                'resolution': widths.get(tier, 0)
+            }
+            for tier, bucket_ts, limit_name, window_minutes, used_min, used_max, used_last, samples in rows
+        ]
+
+    def _query_many(self, emails) -> Dict[str, tuple]:
+        """查询数据库，返回 {email: (updated_ts, usage_data)}"""
+        found = {}
+        with self._lock:
+            for start in range(0, len(emails), QUERY_BATCH_SIZE):
+                batch = emails[start:start + QUERY_BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT email, updated_ts, usage_data FROM usage WHERE email IN ({placeholders})",
+                    batch
+                ).fetchall()
+                for email, updated_ts, usage_data in rows:
+                    try:
+                        found[email] = (updated_ts, json.loads(usage_data))
+                    except json.JSONDecodeError:
+                        continue
+        return found
+
+    def load_many(self, emails: Iterable[str], max_age_hours: Optional[float] = None) -> Dict[str, Dict]:
+        """批量读取多个账号的用量数据，返回 {email: usage_data}，省略不存在或已过期的账号"""
+        emails = list(dict.fromkeys(email for email in emails if email))
+        min_ts = time.time() - max_age_hours * 3600 if max_age_hours is not None else float('-inf')
+        # 任何进程提交写入都会改变数据库或 WAL 文件的签名
+        signature = file_signature((self.db_file, str(self.db_file) + "-wal"))
+
+        rows = {}
+        pending = []
+        for email in emails:
+            # 内存数据库没有可用的文件签名，每次直接查询
+            row = False if self.in_memory else shared_cache.lookup(('usage', str(self.db_file), email), signature, False)
+            if row is False:
+                pending.append(email)
+            else:
+                rows[email] = row
+        if pending:
+            try:
+                found = self._query_many(pending)
+            except sqlite3.Error:
+                return {}
+            for email in pending:
+                # 不存在的账号也缓存，避免重复查询
+                rows[email] = found.get(email)
+                shared_cache.store(('usage', str(self.db_file), email), signature, rows[email])
+        self._import_legacy(emails, rows)
+
+        return {
+            email: copy.deepcopy(row[1])
+            for email, row in rows.items()
+            if row is not None and row[0] >= min_ts
+        }
+
+    def load(self, email: str, max_age_hours: Optional[float] = None) -> Optional[Dict]:
+        """读取单个账号的用量数据"""
+        return self.load_many([email], max_age_hours).get(email)
+
+    def _database_bytes(self) -> int:
+        total = 0
+        for suffix in ("", "-wal"):
+            try:
+                total += os.path.getsize(str(self.db_file) + suffix)
+            except OSError:
+                pass
+        return total
+
+    def _used_bytes(self) -> int:
+        """数据库中实际使用的字节数（不含空闲页）"""
+        page_size = self._conn.execute("PRAGMA page_size").fetchone()[0]
+        page_count = self._conn.execute("PRAGMA page_count").fetchone()[0]
+        free_pages = self._conn.execute("PRAGMA freelist_count").fetchone()[0]
+        return (page_count - free_pages) * page_size
+
+    def _account_bytes(self) -> Dict[str, int]:
+        """按行大小估算每个账号（用量快照 + 历史记录）占用的字节数
+
+        估算值按比例缩放到数据库实际使用的字节数。删除行后页面通常只是变得不满，
+        页数在 VACUUM 之前几乎不变，因此淘汰时按行大小而不是页数计算释放的空间。
+        """
+        sizes = {}
+        for email, size in self._conn.execute(
+                "SELECT email, length(CAST(email AS BLOB)) * 2 + length(CAST(last_updated AS BLOB))"
+                " + length(CAST(usage_data AS BLOB)) FROM usage"):
+            sizes[email] = size + USAGE_ROW_OVERHEAD
+        for email, size in self._conn.execute(
+                "SELECT email, SUM((length(CAST(email AS BLOB)) + length(CAST(limit_name AS BLOB))) * 2 + ?)"
+                " FROM usage_history GROUP BY email", (HISTORY_ROW_OVERHEAD,)):
+            sizes[email] = sizes.get(email, 0) + size
+        total = sum(sizes.values())
+        if total:
+            scale = self._used_bytes() / total
+            sizes = {email: size * scale for email, size in sizes.items()}
+        return sizes
+
+    def _delete_accounts(self, emails) -> int:
+        """删除账号的用量快照和全部历史，返回删除的历史记录数"""
+        history_rows = 0
+        for email in emails:
+            shared_cache.invalidate(('usage', str(self.db_file), email))
+            self._conn.execute("DELETE FROM usage WHERE email = ?", (email,))
+            history_rows += self._conn.execute("DELETE FROM usage_history WHERE email = ?", (email,)).rowcount
+        return history_rows
+
+    def _remove_legacy_files(self, keep) -> int:
+        """删除不再需要的 JSON 缓存文件，keep(email, updated_ts) 返回 False 时删除"""
+        removed = 0
+        for cache_file in self.db_file.parent.glob(f"*{LEGACY_CACHE_SUFFIX}"):
+            record = _read_legacy_file(cache_file)
+            if record is None:
+                continue
+            email, updated_ts = record[0], record[1]
+            if not keep(email, updated_ts):
+                try:
+                    removed += cache_file.stat().st_size
+                    cache_file.unlink()
+                except OSError:
+                    continue
+        return removed
+
+    def collect_garbage(self, valid_emails: Optional[Iterable[str]] = None,
+                        max_age_hours: Optional[float] = None, max_bytes: Optional[int] = None) -> Dict:
+        """回收用量缓存
+
+        - 删除超过 max_age_hours 未更新的账号
+        - valid_emails 不为 None 时，删除不在其中的账号（已删除账号的缓存）
+        - 数据库使用量超过 max_bytes 时，按最近更新时间从旧到新淘汰账号，直到低于上限
+
+        返回各项回收的账号数、历史记录数以及回收的字节数。
+        """
+        now = time.time()
+        min_ts = now - max_age_hours * 3600 if max_age_hours is not None else None
+        valid = set(valid_emails) if valid_emails is not None else None
+        report = {'expired': 0, 'orphaned': 0, 'evicted': 0, 'history_rows': 0, 'bytes_reclaimed': 0}
+        evicted = set()
+        size_before = self._database_bytes()
+
+        try:
+            with self._lock:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    accounts = self._conn.execute(
+                        "SELECT email, updated_ts FROM usage ORDER BY updated_ts").fetchall()
+                    history_only = [row[0] for row in self._conn.execute(
+                        "SELECT DISTINCT email FROM usage_history WHERE email NOT IN (SELECT email FROM usage)")]
+
+                    expired = [email for email, updated_ts in accounts if min_ts is not None and updated_ts < min_ts]
+                    orphaned = []
+                    if valid is not None:
+                        orphaned = [email for email, _ in accounts if email not in valid and email not in expired]
+                        orphaned += [email for email in history_only if email not in valid]
+                    report['expired'] = len(expired)
+                    report['orphaned'] = len(orphaned)
+                    account_bytes = self._account_bytes() if max_bytes is not None else {}
+                    report['history_rows'] += self._delete_accounts(expired + orphaned)
+
+                    if max_bytes is not None:
+                        removed = set(expired + orphaned)
+                        used = sum(size for email, size in account_bytes.items() if email not in removed)
+                        # 最久未更新的账号最先淘汰，至少保留最近更新的一个
+                        candidates = [email for email, _ in accounts if email not in removed][:-1]
+                        for email in candidates:
+                            if used <= max_bytes:
+                                break
+                            report['history_rows'] += self._delete_accounts([email])
+                            used -= account_bytes.get(email, 0)
+                            report['evicted'] += 1
+                            evicted.add(email)
+                    self._conn.execute("COMMIT")
+                except sqlite3.Error:
+                    self._conn.execute("ROLLBACK")
+                    raise
+
+                self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                page_count = self._conn.execute("PRAGMA page_count").fetchone()[0]
+                free_pages = self._conn.execute("PRAGMA freelist_count").fetchone()[0]
+                if page_count and free_pages / page_count > VACUUM_FREE_RATIO:
+                    self._conn.execute("VACUUM")
+        except sqlite3.Error as e:
+            print(f"⚠️ 回收用量缓存失败: {e}")
+            return report
+
+        def keep_legacy(email, updated_ts):
+            # 淘汰账号的 JSON 文件也要删除，否则下次读取时会被重新导入
+            if email in evicted or (min_ts is not None and updated_ts < min_ts):
+                return False
+            return valid is None or email in valid
+
+        report['bytes_reclaimed'] = max(size_before - self._database_bytes(), 0)
+        report['bytes_reclaimed'] += self._remove_legacy_files(keep_legacy)
+        return report